@@ -0,0 +1,211 @@
+#!/usr/bin/env python
+# file created 10/18/2026
+
+__author__ = "Will Van Treuren"
+__copyright__ = "Copyright 2013, Will Van Treuren"
+__credits__ = ["Will Van Treuren, Sophie Weiss"]
+__license__ = "GPL"
+__url__ = ''
+__version__ = ".9-Dev"
+__maintainer__ = "Will Van Treuren"
+__email__ = "wdwvt1@gmail.com"
+
+'''
+Out of core naive correlation for tables too large for the otus X otus
+result (or the table itself) to fit in memory.
+
+The table is written to a .npy memmap one otu at a time, its rows are
+standardized block by block into a second memmap, and correlations are
+calculated in tiles (block of otus i X block of otus j, j >= i) as products
+of standardized blocks. Only two blocks of rows and one tile are in memory
+at once. Each tile either appends its significant edges to a text or binary
+(see edge_list) edge list, or writes its scores into a condensed float32
+memmap.
+
+After every tile the number of completed tiles (and the length of the edge
+list) is written to a progress file, so an interrupted run picks up after
+the last completed tile; edges written by a partially completed tile are
+truncated. The progress file also records the parameters and table shape of
+the run, and resuming with different ones is an error rather than mixing
+incompatible tiles.
+'''
+
+import os
+from numpy import float32, float64, load, errstate
+from numpy.lib.format import open_memmap
+from correlations.eval.naive_matrix import standardize_rows, naive_pval_matrix
+from correlations.eval.bray_curtis import condensed_index
+from correlations.eval.edge_list import write_edges, append_edges
+
+EDGE_HEADER = 'OTU1\tOTU2\tscore\tpval\n'
+
+def biom_to_memmap(bt, fp, dtype=float64):
+    '''Write the observations of a biom table to a .npy memmap row by row.
+
+    The dense table is never built in memory. Returns the memmap and the
+    observation ids.
+    '''
+    otu_ids = list(bt.ids(axis='observation'))
+    samples = len(bt.ids(axis='sample'))
+    data = open_memmap(fp, mode='w+', dtype=dtype,
+        shape=(len(otu_ids), samples))
+    for k, otu_id in enumerate(otu_ids):
+        data[k] = bt.data(otu_id, axis='observation')
+    data.flush()
+    return data, otu_ids
+
+def standardize_memmap(data, fp, corr_method, block_size=2048):
+    '''Write standardized rows of data (see standardize_rows) to a memmap.'''
+    out = open_memmap(fp, mode='w+', dtype=float64, shape=data.shape)
+    for a in range(0, data.shape[0], block_size):
+        standardize_rows(data[a:a+block_size], corr_method,
+            out[a:a+block_size])
+    out.flush()
+    return out
+
+def tiles(n, block_size):
+    '''Return (i start, i stop, j start, j stop) of every tile with j >= i.'''
+    starts = range(0, n, block_size)
+    return [(a, min(a+block_size, n), c, min(c+block_size, n)) for a in
+        starts for c in starts if c >= a]
+
+def run_params(data, corr_method, pval_assignment_method, sig_lvl, output,
+    block_size):
+    '''Return a str describing everything a run's tiles depend on.'''
+    params = [('block_size', block_size), ('corr_method', corr_method),
+        ('output', output), ('pval_assignment_method', pval_assignment_method),
+        ('shape', '%sx%s' % data.shape), ('sig_lvl', repr(sig_lvl))]
+    return '\t'.join(['%s=%s' % p for p in params])
+
+def read_progress(fp):
+    '''Return (completed tiles, edge list bytes, run params) from a file.'''
+    if not os.path.exists(fp):
+        return 0, 0, ''
+    o = open(fp, 'U')
+    lines = o.read().split('\n')
+    o.close()
+    done, offset = map(int, lines[0].split())
+    return done, offset, lines[1] if len(lines) > 1 else ''
+
+def write_progress(fp, done, offset, params=''):
+    '''Atomically record the completed tiles, edge list length and params.'''
+    tmp_fp = fp + '.tmp'
+    o = open(tmp_fp, 'w')
+    o.write('%s\t%s\n%s\n' % (done, offset, params))
+    o.flush()
+    os.fsync(o.fileno())
+    o.close()
+    os.rename(tmp_fp, fp)
+
+def blockwise_correlation(data, otu_ids, corr_method, pval_assignment_method,
+    out_dir, sig_lvl=.001, output='edges', block_size=2048, resume=True,
+    max_tiles=None):
+    '''Calculate naive correlations tile by tile with bounded memory.
+
+    Inputs:
+     data - 2d array or memmap, otus X samples (see biom_to_memmap).
+     otu_ids - list of str, ids of the rows of data.
+     corr_method - str, one of pearson or spearman.
+     pval_assignment_method - str, one of parametric_t_distribution or
+     fisher_z_transform.
+     out_dir - str, directory for the standardized table, results and
+     progress file. created if it doesn't exist.
+     sig_lvl - float, edges with pval <= sig_lvl are written if output is
+     'edges'.
+     output - str, 'edges' appends significant edges to out_dir/edges.txt
+     (OTU1, OTU2, score, pval), 'binary' appends them to the binary edge list
+     out_dir/edges.bin, 'condensed' writes every score to the
+     condensed float32 memmap out_dir/ccs.npy (pvals follow from the scores
+     and the number of samples).
+     block_size - int, otus per block; a tile holds block_size**2 scores.
+     resume - boolean, if True continue from out_dir/progress.txt. a
+     ValueError is raised if that run had different parameters or a
+     different table shape; pass False to start over.
+     max_tiles - int or None, stop after this many tiles are calculated, so
+     a long run can be split over several jobs.
+    Outputs:
+     result_fp - str, path of the edge list or condensed memmap.
+     complete - boolean, True if every tile has been calculated.
+    '''
+    if output not in ['edges', 'binary', 'condensed']:
+        raise ValueError('output must be edges, binary or condensed.')
+    if not os.path.exists(out_dir):
+        os.makedirs(out_dir)
+    n, samples = data.shape
+    progress_fp = os.path.join(out_dir, 'progress.txt')
+    std_fp = os.path.join(out_dir, 'standardized.npy')
+    params = run_params(data, corr_method, pval_assignment_method, sig_lvl,
+        output, block_size)
+    done, offset, old_params = read_progress(progress_fp) if resume else \
+        (0, 0, '')
+    if done and old_params != params:
+        raise ValueError('%s was written by a run with different parameters '
+            '(%s, not %s). Pass resume=False to start over.' % (progress_fp,
+            old_params, params))
+    if done and os.path.exists(std_fp):
+        std = load(std_fp, mmap_mode='r')
+    else:
+        done, offset = 0, 0
+        std = standardize_memmap(data, std_fp, corr_method, block_size)
+    if output == 'edges':
+        result_fp = os.path.join(out_dir, 'edges.txt')
+        if done:
+            # discard anything written after the last completed tile
+            f = open(result_fp, 'r+')
+            f.truncate(offset)
+            f.seek(offset)
+        else:
+            f = open(result_fp, 'w')
+            f.write(EDGE_HEADER)
+            f.flush()
+            offset = f.tell()
+    elif output == 'binary':
+        result_fp = os.path.join(out_dir, 'edges.bin')
+        if done:
+            f = open(result_fp, 'r+b')
+            f.truncate(offset)
+            f.close()
+        else:
+            write_edges(result_fp, otu_ids, [], [], [], [], [])
+            offset = os.path.getsize(result_fp)
+    else:
+        result_fp = os.path.join(out_dir, 'ccs.npy')
+        mode = 'r+' if done else 'w+'
+        ccs = open_memmap(result_fp, mode=mode, dtype=float32,
+            shape=(n*(n-1)//2,))
+    write_progress(progress_fp, done, offset, params)
+    all_tiles = tiles(n, block_size)
+    stop = len(all_tiles) if max_tiles is None else min(done + max_tiles,
+        len(all_tiles))
+    for t in range(done, stop):
+        a, b, c, d = all_tiles[t]
+        tile = std[a:b].dot(std[c:d].T)
+        if output in ['edges', 'binary']:
+            ps = naive_pval_matrix(tile, samples, pval_assignment_method)
+            # nan pvals are never significant
+            with errstate(invalid='ignore'):
+                rows, cols = (ps <= sig_lvl).nonzero()
+            # diagonal tiles hold both triangles, keep j > i only
+            upper = rows + a < cols + c
+            rows, cols = rows[upper], cols[upper]
+        if output == 'edges':
+            f.writelines(['%s\t%s\t%r\t%r\n' % (otu_ids[a+i], otu_ids[c+j],
+                tile[i, j], ps[i, j]) for i, j in zip(rows, cols)])
+            f.flush()
+            os.fsync(f.fileno())
+            offset = f.tell()
+        elif output == 'binary':
+            scores = tile[rows, cols]
+            offset = append_edges(result_fp, rows + a, cols + c, scores,
+                ps[rows, cols], (scores >= 0)*2 - 1)
+        else:
+            for r in range(b-a):
+                lo = max(c, a+r+1)
+                if lo < d:
+                    start = condensed_index(a+r, lo, n)
+                    ccs[start:start+d-lo] = tile[r, lo-c:]
+            ccs.flush()
+        write_progress(progress_fp, t+1, offset, params)
+    if output == 'edges':
+        f.close()
+    return result_fp, stop == len(all_tiles)
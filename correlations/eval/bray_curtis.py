@@ -0,0 +1,182 @@
+#!/usr/bin/env python
+# file created 10/18/2026
+
+__author__ = "Will Van Treuren"
+__copyright__ = "Copyright 2013, Will Van Treuren"
+__credits__ = ["Will Van Treuren, Sophie Weiss"]
+__license__ = "GPL"
+__url__ = ''
+__version__ = ".9-Dev"
+__maintainer__ = "Will Van Treuren"
+__email__ = "wdwvt1@gmail.com"
+
+'''
+Native calculation of the Bray-Curtis dissimilarity between features (otus) so
+that a _dists.txt file doesn't have to be produced externally and parsed.
+
+The dissimilarity between otus i and j is
+ 1 - 2*sum_k min(x_ik, x_jk) / (sum_k x_ik + sum_k x_jk)
+so the only pairwise work is the sum of the elementwise minimum. Rows are
+processed in blocks, and each block is compared against chunks of the later
+rows in tiles of at most tile_size elements so the work array stays in cache
+and memory is bounded regardless of the number of otus. Only samples where
+both otus are nonzero contribute to the minimum, so sparse tables (most biom
+tables) are processed by gathering co-occurrences from the csc form of the
+table rather than comparing every pair in every sample. Tables can be dense
+arrays or scipy.sparse matrices.
+
+Results are written in condensed form (the upper triangle in row order, the
+layout of scipy.spatial.distance.pdist) as float32, either in memory or to a
+.npy memmap, and passed to BrayCurtisResults.fromCondensed. A 20000 otu table
+has ~2e8 pairs, i.e. 800MB condensed float32 rather than 3.2GB for a square
+float64 matrix.
+'''
+
+from numpy import (asarray, empty, zeros, float32, minimum, divide, diff,
+    repeat, arange, bincount, searchsorted, count_nonzero)
+from numpy.lib.format import open_memmap
+from scipy.sparse import issparse, csr_matrix
+from correlations.eval.parse import BrayCurtisResults
+
+def condensed_index(i, j, n):
+    '''Return the index of (i,j), i<j, in a condensed array for n otus.'''
+    return n*i - i*(i+1)//2 + j - i - 1
+
+def _rows(data, start, stop, cols=None):
+    '''Return rows start:stop of data (optionally only cols) as dense float32.
+    '''
+    block = data[start:stop]
+    if cols is not None:
+        block = block[:, cols]
+    if issparse(block):
+        block = block.toarray()
+    return asarray(block, dtype=float32)
+
+def _write_tile(out, mins, sums, a, c, n):
+    '''Write the j > i dissimilarities of a tile into condensed out.
+
+    mins holds sum_k min(x_ik, x_jk) for rows a:a+len(mins) and columns
+    c:c+mins.shape[1].
+    '''
+    mins = asarray(mins, dtype=float32)
+    b, d = a + mins.shape[0], c + mins.shape[1]
+    denom = sums[a:b, None] + sums[None, c:d]
+    bc = 1. - divide(2*mins, denom, out=mins, where=denom > 0)
+    # otus with no counts share nothing, rather than being identical
+    bc[denom == 0] = 1.
+    for r in range(b-a):
+        i = a + r
+        lo = max(c, i+1)
+        if lo >= d:
+            continue
+        start = condensed_index(i, lo, n)
+        out[start:start+d-lo] = bc[r, lo-c:]
+
+def _dense_tiles(data, out, sums, rows_per_block, tile_size):
+    '''Fill out comparing row blocks to chunks of later rows with minimum.
+
+    Samples where every otu of the block is zero are skipped.
+    '''
+    n = data.shape[0]
+    work = empty(tile_size, dtype=float32)
+    for a in range(0, n-1, rows_per_block):
+        b = min(a+rows_per_block, n-1)
+        block = _rows(data, a, b)
+        cols = block.any(0).nonzero()[0]
+        block = block[:, cols]
+        nc = max(len(cols), 1)
+        step = max(1, tile_size//(nc*(b-a)))
+        for c in range(a+1, n, step):
+            d = min(c+step, n)
+            if len(cols) and (b-a)*(d-c)*nc <= tile_size:
+                w = work[:(b-a)*(d-c)*nc].reshape(b-a, d-c, nc)
+                minimum(block[:, None, :], _rows(data, c, d, cols)[None, :, :],
+                    out=w)
+                mins = w.sum(-1)
+            elif len(cols):
+                # a single row block wider than tile_size
+                mins = minimum(block[:, None, :],
+                    _rows(data, c, d, cols)[None, :, :]).sum(-1)
+            else:
+                mins = zeros((b-a, d-c), dtype=float32)
+            _write_tile(out, mins, sums, a, c, n)
+
+def _sparse_tiles(data, out, sums, tile_size):
+    '''Fill out using only the samples where both otus of a pair are nonzero.
+
+    For each nonzero x_ik of a row block every nonzero x_jk of column k is
+    gathered from the csc form of data, so the work done is proportional to
+    the number of co-occurrences rather than otus**2 X samples. Rows are
+    grouped so a block has at most tile_size co-occurrences and its
+    rows X otus result has at most tile_size elements.
+    '''
+    n = data.shape[0]
+    csr = data.tocsr()
+    csc = data.tocsc()
+    col_nnz = diff(csc.indptr)
+    row_of_nz = repeat(arange(n), diff(csr.indptr))
+    cost = bincount(row_of_nz, weights=col_nnz[csr.indices], minlength=n)
+    max_rows = max(1, tile_size//n)
+    a = 0
+    while a < n-1:
+        # as many rows as fit in tile_size, but at least one
+        b = searchsorted(cost[a:].cumsum(), tile_size, 'right') + a
+        b = min(max(b, a+1), a+max_rows, n-1)
+        block = csr[a:b].tocoo()
+        starts = csc.indptr[block.col]
+        counts = csc.indptr[block.col+1] - starts
+        src = repeat(arange(len(counts)), counts)
+        pos = starts[src] + arange(len(src)) - repeat(counts.cumsum()-counts,
+            counts)
+        mins = minimum(csc.data[pos], block.data[src])
+        mins = bincount(block.row[src]*n + csc.indices[pos], weights=mins,
+            minlength=(b-a)*n).reshape(b-a, n)
+        _write_tile(out, mins[:, a+1:], sums, a, a+1, n)
+        a = b
+
+def bray_curtis_condensed(data, out_fp=None, sparse_density=.1,
+    rows_per_block=4, tile_size=2**18, sums=None):
+    '''Calculate condensed Bray-Curtis dissimilarities between rows of data.
+
+    Pairs where both otus have no counts (0/0, nan in scipy) are given a 
+    dissimilarity of 1 so they are never the most significant edges.
+    Inputs:
+     data - 2d array or scipy.sparse matrix, otus X samples, nonnegative.
+     out_fp - str or None, if passed results are written to a .npy memmap at
+     this path, otherwise they are held in memory.
+     sparse_density - float, tables with a smaller fraction of nonzero entries
+     are processed by co-occurrence (_sparse_tiles), others by dense tiles.
+     rows_per_block - int, number of otus compared at once by dense tiles.
+     tile_size - int, maximum number of elements in the work arrays. the
+     default (1MB of float32) is sized for cache.
+     sums - 1d array or None, row sums of data if the caller already has them.
+    Outputs:
+     float32 array (or memmap) of length n*(n-1)/2.
+    '''
+    n = data.shape[0]
+    if sums is None:
+        sums = data.sum(1)
+    sums = asarray(sums, dtype=float32).ravel()
+    size = n*(n-1)//2
+    if out_fp is None:
+        out = empty(size, dtype=float32)
+    else:
+        out = open_memmap(out_fp, mode='w+', dtype=float32, shape=(size,))
+    nnz = data.nnz if issparse(data) else count_nonzero(data)
+    if nnz < sparse_density*n*data.shape[1]:
+        _sparse_tiles(csr_matrix(data, dtype=float32), out, sums, tile_size)
+    else:
+        if issparse(data):
+            data = data.tocsr()
+        _dense_tiles(data, out, sums, rows_per_block, tile_size)
+    if out_fp is not None:
+        out.flush()
+    return out
+
+def bray_curtis_results(data, otu_ids, sig_lvl=.001, out_fp=None, **kwargs):
+    '''Return a BrayCurtisResults object for the otus (rows) of data.
+
+    kwargs are passed to bray_curtis_condensed.
+    '''
+    dissims = bray_curtis_condensed(data, out_fp, **kwargs)
+    return BrayCurtisResults.fromCondensed(dissims, otu_ids, sig_lvl)
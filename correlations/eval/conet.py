@@ -0,0 +1,241 @@
+#!/usr/bin/env python
+# file created 10/18/2026
+
+__author__ = "Will Van Treuren"
+__copyright__ = "Copyright 2013, Will Van Treuren"
+__credits__ = ["Will Van Treuren, Sophie Weiss"]
+__license__ = "GPL"
+__url__ = ''
+__version__ = ".9-Dev"
+__maintainer__ = "Will Van Treuren"
+__email__ = "wdwvt1@gmail.com"
+
+'''
+Native multi metric scoring in the style of CoNet. All the pairwise measures
+CoNet reports (correl_pearson, correl_spearman, dist_bray,
+dist_kullbackleibler, sim_brownian) are calculated for every pair of otus
+together, rather than running each metric separately and parsing a per edge
+string of scores.
+
+The table is normalized (samples to relative abundance) once, and the
+precomputation each metric needs is shared:
+ - correl_pearson and correl_spearman are products of standardized rows (of
+ the table and of its ranks).
+ - dist_bray uses the row sums of the normalized table (bray_curtis engine).
+ - dist_kullbackleibler is the symmetric KL divergence of row profiles,
+ sum (p - q)(log p - log q), which expands to entropies plus two products of
+ profiles with log profiles. Profiles reuse the row sums dist_bray uses.
+ - sim_brownian is the distance correlation (Szekely et al. 2007). Each otu's
+ double centered sample distance matrix is flattened, so distance covariances
+ are products of those.
+Pairs are scored in blocks of otus: every metric but dist_bray (which has its
+own tiled engine) is calculated for a block of pairs and written straight
+into the scores, so no otus X otus matrix is made per metric. Blocks are
+sized to a memory budget; with sim_brownian a block holds
+rows X samples**2 centered distances, so the number of rows falls as samples
+grow. Scores are returned as a pairs X metrics matrix in the alphabetical
+order CoNetResults.methods uses, so methodVals works on the results.
+'''
+
+from numpy import (array, empty, sqrt, log, triu_indices, arange,
+    where, zeros, abs as np_abs, errstate, argsort, float64)
+from correlations.eval.naive_matrix import standardize_rows
+from correlations.eval.bray_curtis import bray_curtis_condensed, condensed_index
+from correlations.eval.parse import CoNetResults
+
+METHODS = ['correl_pearson', 'correl_spearman', 'dist_bray',
+    'dist_kullbackleibler', 'sim_brownian']
+
+def normalize_samples(data):
+    '''Return data with every sample (column) scaled to sum to 1.'''
+    sums = data.sum(0).astype(float64)
+    sums[sums == 0] = 1.
+    return data/sums
+
+def _kl_profiles(data, pseudocount=None, sums=None):
+    '''Return profiles, log profiles and entropy terms p_i . log p_i.'''
+    if pseudocount is None:
+        nz = data[data > 0]
+        pseudocount = nz.min()/2. if len(nz) else 1.
+    if sums is None:
+        sums = data.sum(1)
+    p = (data + pseudocount)/(sums + pseudocount*data.shape[1])[:, None]
+    lp = log(p)
+    return p, lp, (p*lp).sum(1)
+
+def kullback_leibler_matrix(data, pseudocount=None):
+    '''Return the symmetric KL divergence between all row profiles of data.
+
+    Rows are converted to profiles p_i = (x_i + pseudocount)/sum. The
+    divergence sum_k (p_ik - p_jk)(log p_ik - log p_jk) is
+    h_i + h_j - (p_i . log p_j) - (p_j . log p_i) with h_i = p_i . log p_i.
+    Inputs:
+     data - 2d array, otus X samples.
+     pseudocount - float or None, added to avoid log(0). defaults to half the
+     smallest nonzero value of data.
+    '''
+    p, lp, h = _kl_profiles(data, pseudocount)
+    cross = p.dot(lp.T)
+    return h[:, None] + h[None, :] - cross - cross.T
+
+def _centered_distances(rows):
+    '''Return flattened double centered |x_s - x_t| matrices of each row.'''
+    d = np_abs(rows[:, :, None] - rows[:, None, :])
+    d -= d.mean(1)[:, None, :]
+    d -= d.mean(2)[:, :, None]
+    return d.reshape(len(rows), -1)
+
+def _block_rows(n, s, num_methods, dcor, max_block_bytes):
+    '''Return how many otus to score at once to stay near max_block_bytes.
+
+    Centered distances of two blocks (and the temporary one is built in) take
+    3*8*s**2 bytes per row, and each metric holds a rows X rows block.
+    '''
+    rows = n
+    if dcor:
+        rows = max_block_bytes//(3*8*s*s)
+    rows = min(rows, int(sqrt(max_block_bytes/(8.*num_methods))))
+    return max(1, rows)
+
+def _dcor(dcov, dvar_i, dvar_j):
+    '''Return distance correlations from distance (co)variances.'''
+    den = sqrt(dvar_i*dvar_j)
+    # constant rows have no distance variance, their dcor is 0
+    with errstate(invalid='ignore', divide='ignore'):
+        return sqrt(where(den > 0, dcov/where(den > 0, den, 1.), 0.).clip(0))
+
+def distance_correlation_matrix(data, rows_per_block=None,
+    max_block_bytes=2**28):
+    '''Return the distance correlation between all rows of data.
+
+    The squared distance covariance of rows i, j is the mean of the elementwise
+    product of their double centered distance matrices, so blocks of
+    flattened matrices give blocks of covariances with one matrix product.
+    Memory is bounded by two blocks of rows_per_block X samples**2, where
+    rows_per_block defaults to what fits in max_block_bytes.
+    '''
+    n, s = data.shape
+    if rows_per_block is None:
+        rows_per_block = _block_rows(n, s, 1, True, max_block_bytes)
+    dcov = empty((n, n))
+    for a in range(0, n, rows_per_block):
+        A = _centered_distances(data[a:a+rows_per_block])
+        for b in range(a, n, rows_per_block):
+            B = A if b == a else _centered_distances(
+                data[b:b+rows_per_block])
+            block = A.dot(B.T)/float(s*s)
+            dcov[a:a+len(A), b:b+len(B)] = block
+            dcov[b:b+len(B), a:a+len(A)] = block.T
+    dvar = dcov.diagonal().copy()
+    return _dcor(dcov, dvar[:, None], dvar[None, :])
+
+def multi_metric_scores(data, methods=METHODS, normalize=True,
+    pseudocount=None, rows_per_block=None, max_block_bytes=2**28):
+    '''Calculate every requested metric for all pairs of otus (rows).
+
+    Inputs:
+     data - 2d array, otus X samples.
+     methods - list of str, a subset of METHODS.
+     normalize - boolean, if True samples are scaled to relative abundance
+     once before any metric is calculated.
+     pseudocount - see kullback_leibler_matrix.
+     rows_per_block - int or None, number of otus scored at once. defaults to
+     what fits in max_block_bytes.
+     max_block_bytes - int, approximate memory for the blocks of one step.
+    Outputs:
+     i, j - arrays, rows of each pair (i < j) in triu_indices order.
+     scores - pairs X metrics array, columns in sorted method order.
+     methods - sorted list of methods.
+    '''
+    methods = sorted(methods)
+    unknown = set(methods) - set(METHODS)
+    if unknown:
+        raise ValueError('Unknown methods: %s' % ', '.join(sorted(unknown)))
+    table = normalize_samples(data) if normalize else data.astype(float64)
+    n, s = table.shape
+    i, j = triu_indices(n, 1)
+    scores = empty((len(i), len(methods)))
+    cols = dict((m, k) for k, m in enumerate(methods))
+    sums = table.sum(1)
+    if 'dist_bray' in cols:
+        # condensed order is the triu_indices order
+        scores[:, cols['dist_bray']] = bray_curtis_condensed(table, sums=sums)
+    # per otu arrays shared by every block
+    std = dict((m, standardize_rows(table, m[7:])) for m in
+        ['correl_pearson', 'correl_spearman'] if m in cols)
+    if 'dist_kullbackleibler' in cols:
+        p, lp, h = _kl_profiles(table, pseudocount, sums)
+    dcor = 'sim_brownian' in cols
+    if dcor:
+        dvar = empty(n)
+    if rows_per_block is None:
+        rows_per_block = _block_rows(n, s, len(methods), dcor, max_block_bytes)
+    for a in range(0, n, rows_per_block):
+        ra = arange(a, min(a+rows_per_block, n))
+        if dcor:
+            A = _centered_distances(table[ra])
+        for b in range(a, n, rows_per_block):
+            rb = arange(b, min(b+rows_per_block, n))
+            # condensed positions of the block's pairs with row < column
+            upper = ra[:, None] < rb[None, :]
+            pos = condensed_index(ra[:, None], rb[None, :], n)[upper]
+            for m, z in std.items():
+                scores[pos, cols[m]] = z[ra].dot(z[rb].T)[upper]
+            if 'dist_kullbackleibler' in cols:
+                kl = h[ra, None] + h[None, rb] - p[ra].dot(lp[rb].T) - \
+                    lp[ra].dot(p[rb].T)
+                scores[pos, cols['dist_kullbackleibler']] = kl[upper]
+            if dcor:
+                B = A if b == a else _centered_distances(table[rb])
+                dcov = A.dot(B.T)/float(s*s)
+                if b == a:
+                    dvar[ra] = dcov.diagonal()
+                scores[pos, cols['sim_brownian']] = dcov[upper]
+    if dcor:
+        k = cols['sim_brownian']
+        scores[:, k] = _dcor(scores[:, k], dvar[i], dvar[j])
+    return i, j, scores, methods
+
+def _tail_votes(vals, method, edge_fraction):
+    '''Return +1/-1/0 votes for copresence/exclusion from one metric.
+
+    The edge_fraction of pairs in each tail of a metric vote. High
+    correlations and similarities and low distances are copresences, low
+    correlations and high distances are exclusions. Similarities can't
+    indicate exclusion.
+    '''
+    votes = zeros(len(vals), dtype=int)
+    num = int(edge_fraction*len(vals))
+    if num == 0:
+        return votes
+    order = argsort(vals, kind='mergesort')
+    low, high = order[:num], order[-num:]
+    if method.startswith('dist'):
+        votes[low], votes[high] = 1, -1
+    elif method.startswith('correl'):
+        votes[high] = where(vals[high] > 0, 1, 0)
+        votes[low] = where(vals[low] < 0, -1, 0)
+    else:
+        votes[high] = 1
+    return votes
+
+def conet_results(data, otu_ids, edge_fraction=.01, min_support=3, **kwargs):
+    '''Return a CoNetResults object for the otus (rows) of data.
+
+    As in CoNet's ensemble mode, each metric votes for the edge_fraction of
+    pairs in its tails and pairs with at least min_support agreeing votes
+    are edges. p-values, q-values and significances are not calculated and
+    are nan. kwargs are passed to multi_metric_scores.
+    '''
+    i, j, scores, methods = multi_metric_scores(data, **kwargs)
+    votes = array([_tail_votes(scores[:, k], m, edge_fraction) for k, m in
+        enumerate(methods)])
+    pos = (votes == 1).sum(0)
+    neg = (votes == -1).sum(0)
+    # conflicting votes are discarded rather than counted
+    keep = ((pos >= min_support) & (neg == 0)) | \
+        ((neg >= min_support) & (pos == 0))
+    interactions = ['copresence' if pos[k] else 'mutualExclusion' for k in
+        keep.nonzero()[0]]
+    return CoNetResults.fromArrays([otu_ids[k] for k in i[keep]],
+        [otu_ids[k] for k in j[keep]], interactions, scores[keep], methods)
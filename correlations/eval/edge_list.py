@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# file created 10/18/2026
+
+__author__ = "Will Van Treuren"
+__copyright__ = "Copyright 2013, Will Van Treuren"
+__credits__ = ["Will Van Treuren, Sophie Weiss"]
+__license__ = "GPL"
+__url__ = ''
+__version__ = ".9-Dev"
+__maintainer__ = "Will Van Treuren"
+__email__ = "wdwvt1@gmail.com"
+
+'''
+Compact binary edge lists for storing only the significant edges of a
+network rather than full otus X otus matrices.
+
+A file is a header followed by fixed size records:
+ header - 8 byte magic string, little endian int64 length of the otu id
+ table, the otu ids joined by newlines.
+ records - packed (int32 i, int32 j, float32 score, float32 pval, int8 sign),
+ 17 bytes each, where i and j index the otu id table and sign is 1 for
+ copresence, -1 for mutual exclusion and 0 if unknown.
+Records can be appended to an existing file (e.g. one tile of a blockwise
+calculation at a time) and any range of them can be read through a memmap
+without loading the rest. A partially written last record is ignored.
+'''
+
+import os
+from struct import pack, unpack
+from numpy import dtype, empty, memmap
+
+MAGIC = 'CEDGES01'
+EDGE_DTYPE = dtype([('i', '<i4'), ('j', '<i4'), ('score', '<f4'),
+    ('pval', '<f4'), ('sign', 'i1')])
+
+def edge_records(i, j, scores, pvals, signs):
+    '''Return a record array of edges, see EDGE_DTYPE.'''
+    records = empty(len(i), dtype=EDGE_DTYPE)
+    records['i'] = i
+    records['j'] = j
+    records['score'] = scores
+    records['pval'] = pvals
+    records['sign'] = signs
+    return records
+
+def write_header(f, otu_ids):
+    '''Write the magic string and otu id table to open file f.'''
+    ids = '\n'.join(otu_ids)
+    f.write(MAGIC)
+    f.write(pack('<q', len(ids)))
+    f.write(ids)
+
+def read_header(fp):
+    '''Return the otu ids and the byte offset of the first record of fp.'''
+    f = open(fp, 'rb')
+    if f.read(len(MAGIC)) != MAGIC:
+        f.close()
+        raise ValueError('%s is not a binary edge list.' % fp)
+    size = unpack('<q', f.read(8))[0]
+    ids = f.read(size)
+    f.close()
+    return ids.split('\n') if size else [], len(MAGIC) + 8 + size
+
+def write_edges(fp, otu_ids, i, j, scores, pvals, signs):
+    '''Write a new binary edge list, replacing any file at fp.'''
+    f = open(fp, 'wb')
+    write_header(f, otu_ids)
+    edge_records(i, j, scores, pvals, signs).tofile(f)
+    f.close()
+
+def append_edges(fp, i, j, scores, pvals, signs):
+    '''Append edges to an existing binary edge list.
+
+    Returns the size of the file afterwards so callers can record where the
+    last complete append ended.
+    '''
+    f = open(fp, 'ab')
+    edge_records(i, j, scores, pvals, signs).tofile(f)
+    f.flush()
+    os.fsync(f.fileno())
+    size = f.tell()
+    f.close()
+    return size
+
+def num_edges(fp):
+    '''Return the number of complete records in fp.'''
+    offset = read_header(fp)[1]
+    return (os.path.getsize(fp) - offset)//EDGE_DTYPE.itemsize
+
+def load_edges(fp, start=0, stop=None):
+    '''Return the otu ids and a memmap of records start to stop of fp.'''
+    otu_ids, offset = read_header(fp)
+    count = (os.path.getsize(fp) - offset)//EDGE_DTYPE.itemsize
+    if count == 0:
+        return otu_ids, empty(0, dtype=EDGE_DTYPE)
+    records = memmap(fp, dtype=EDGE_DTYPE, mode='r', offset=offset,
+        shape=(count,))
+    return otu_ids, records[start:stop]
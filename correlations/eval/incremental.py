@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# file created 10/18/2026
+
+__author__ = "Will Van Treuren"
+__copyright__ = "Copyright 2013, Will Van Treuren"
+__credits__ = ["Will Van Treuren, Sophie Weiss"]
+__license__ = "GPL"
+__url__ = ''
+__version__ = ".9-Dev"
+__maintainer__ = "Will Van Treuren"
+__email__ = "wdwvt1@gmail.com"
+
+'''
+Incremental pearson correlation for tables that grow by appending samples.
+
+Rather than recalculating all pairwise correlations from every sample each
+time samples are added, the number of samples, the mean of each otu and the
+otus X otus matrix of co-moments (sums of products of deviations from the
+means) are kept. A batch of new samples is merged with the pairwise update
+of Chan et al. 1979:
+ C = C_a + C_b + (m_b - m_a)(m_b - m_a)^T * n_a*n_b/(n_a + n_b)
+where C_b and m_b are the co-moments and means of the batch alone. An update
+costs O(otus**2 X new samples), and because only deviations from means are
+summed it avoids the cancellation of the naive sum of squares formula.
+
+The state is saved to and loaded from a .npz file so updates can be run as
+separate jobs. Spearman correlation can't be updated this way since adding
+samples changes the ranks of all the old ones.
+'''
+
+from numpy import (array, zeros, sqrt, outer, errstate, nan, load, savez,
+    float64, asarray)
+from correlations.eval.naive_matrix import naive_pval_matrix
+
+
+class CorrelationAccumulator(object):
+    '''Keep running means and co-moments of otus as samples are added.'''
+
+    def __init__(self, otu_ids):
+        '''Start with no samples for the passed otus.'''
+        self.otu_ids = list(otu_ids)
+        n = len(self.otu_ids)
+        self.samples = 0
+        self.means = zeros(n)
+        self.comoments = zeros((n, n))
+
+    def update(self, data):
+        '''Add new samples to the state.
+
+        Inputs:
+         data - 2d array, otus X new samples, rows in the order of otu_ids.
+        '''
+        data = asarray(data, dtype=float64)
+        if data.shape[0] != len(self.otu_ids):
+            raise ValueError('data has %s rows but the accumulator has %s '
+                'otus.' % (data.shape[0], len(self.otu_ids)))
+        m = data.shape[1]
+        if m == 0:
+            return self
+        batch_means = data.mean(1)
+        dev = data - batch_means.reshape(-1, 1)
+        total = self.samples + m
+        delta = batch_means - self.means
+        # C_a + C_b + outer(delta, delta)*n_a*n_b/n, all in place
+        self.comoments += dev.dot(dev.T)
+        self.comoments += outer(delta, delta*(self.samples*m/float(total)))
+        self.means += delta*(m/float(total))
+        self.samples = total
+        return self
+
+    def correlations(self):
+        '''Return the otus X otus pearson correlation matrix of all samples.
+
+        Otus with no variance get nan scores.
+        '''
+        var = self.comoments.diagonal().copy()
+        with errstate(divide='ignore', invalid='ignore'):
+            norms = sqrt(var)
+            norms[var <= 0] = nan
+            ccs = self.comoments/norms.reshape(-1, 1)
+            ccs /= norms.reshape(1, -1)
+        return ccs
+
+    def pvals(self, pval_assignment_method, ccs=None):
+        '''Return pvals of the correlations (see naive_pval_matrix).'''
+        if ccs is None:
+            ccs = self.correlations()
+        return naive_pval_matrix(ccs, self.samples, pval_assignment_method)
+
+    def save(self, fp):
+        '''Write the state to a .npz file.'''
+        savez(fp, otu_ids=array(self.otu_ids), samples=self.samples,
+            means=self.means, comoments=self.comoments)
+
+    @classmethod
+    def load(cls, fp):
+        '''Return an accumulator with the state saved at fp.'''
+        state = load(fp)
+        acc = cls(state['otu_ids'].tolist())
+        acc.samples = int(state['samples'])
+        acc.means = state['means']
+        acc.comoments = state['comoments']
+        state.close()
+        return acc
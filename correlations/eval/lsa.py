@@ -0,0 +1,330 @@
+#!/usr/bin/env python
+# file created 10/18/2026
+
+__author__ = "Will Van Treuren"
+__copyright__ = "Copyright 2013, Will Van Treuren"
+__credits__ = ["Will Van Treuren, Sophie Weiss"]
+__license__ = "GPL"
+__url__ = ''
+__version__ = ".9-Dev"
+__maintainer__ = "Will Van Treuren"
+__email__ = "wdwvt1@gmail.com"
+
+'''
+Native local similarity analysis (LSA) so that time series tables (tables/ts*)
+don't have to be run through the external LSA tool and its output parsed.
+
+The local similarity of two normalized series x, y with delays up to D is
+found with the dynamic program of Ruan et al. 2006:
+ P_t = max(0, P_t-1 + x_t*y_t+d), N_t = max(0, N_t-1 - x_t*y_t+d)
+for every delay -D <= d <= D, and LS = max(P, N)/n with the sign of whichever
+is larger. The program is run for all pairs and delays at once, so the only
+python loop is over time points. Theoretical p-values use the approximation
+of Xia et al. 2013 (eLSA), permutation p-values shuffle the time points of
+the second series of every pair.
+
+Global and shifted (best over delays) Pearson and Spearman correlations are
+calculated alongside so that lsa_lines produces the columns of the external
+tool's output, which LSAResults parses. Pairs are processed in blocks which
+can be run in a process pool.
+'''
+
+from numpy import (array, zeros, empty, arange, sqrt, exp, pi, where, argmax,
+    argsort, minimum, maximum, clip, triu_indices, vstack, hstack,
+    apply_along_axis, newaxis, add, subtract, copyto, moveaxis,
+    ascontiguousarray)
+from numpy.random import RandomState
+from scipy.stats import rankdata, norm
+from scipy.special import stdtr
+from multiprocessing import Pool
+from correlations.eval.parse import LSAResults
+
+LSA_HEADER = ['X', 'Y', 'LS', 'lowCI', 'upCI', 'Xs', 'Ys', 'Len', 'Delay',
+    'P', 'PCC', 'Ppcc', 'SPCC', 'Pspcc', 'Dspcc', 'SCC', 'Pscc', 'SSCC',
+    'Psscc', 'Dsscc', 'Q', 'Qpcc', 'Qspcc', 'Qscc', 'Qsscc', 'Xi', 'Yi']
+
+def normalize_series(data, method='percentileZ'):
+    '''Normalize each row of data for the local similarity calculation.
+
+    Inputs:
+     data - 2d array, otus X time points.
+     method - str, 'percentileZ' replaces values with the normal quantile of
+     their rank percentile and then z-scores them (the default of the LSA
+     tool), 'zscore' centers and scales each row, 'none' leaves data
+     unchanged.
+    '''
+    if method == 'percentileZ':
+        ranks = apply_along_axis(rankdata, 1, data)
+        return normalize_series(norm.ppf(ranks/(data.shape[1]+1.)), 'zscore')
+    elif method == 'zscore':
+        sd = data.std(1)
+        sd[sd == 0] = 1.
+        return (data - data.mean(1)[:, newaxis])/sd[:, newaxis]
+    elif method == 'none':
+        return data
+    raise ValueError('Unknown normalization method: %s' % method)
+
+def delays(max_delay):
+    '''Return delays in the order ties are broken: 0, -1, 1, -2, 2, ...'''
+    return [0] + [s*d for d in range(1, max_delay+1) for s in (-1, 1)]
+
+def lagged_products(x, y, max_delay):
+    '''Return x_t*y_t+d for every delay as a (..., delays, n) array.
+
+    Products where t+d is outside the series are 0, which never changes the
+    maximum of the dynamic program. x and y are broadcast against each other.
+    '''
+    n = x.shape[-1]
+    shape = tuple(max(a, b) for a, b in zip(x.shape[:-1], y.shape[:-1]))
+    lags = delays(max_delay)
+    res = zeros(shape + (len(lags), n))
+    for k, d in enumerate(lags):
+        if d >= 0:
+            res[..., k, :n-d] = x[..., :n-d]*y[..., d:]
+        else:
+            res[..., k, -d:] = x[..., -d:]*y[..., :n+d]
+    return res
+
+def local_similarity(prods, positions=True):
+    '''Run the local similarity dynamic program along the last axis of prods.
+
+    Inputs:
+     prods - array, (..., delays, n) from lagged_products.
+     positions - boolean, if False only the scores are returned.
+    Outputs:
+     ls - array (...), signed local similarity scores normalized by n.
+     if positions, also start (0 based, in x), length and delay index (into
+     delays) of the best local alignment.
+    '''
+    n = prods.shape[-1]
+    shape = prods.shape[:-1]
+    # time first so each step reads a contiguous slice
+    prods = ascontiguousarray(moveaxis(prods, -1, 0))
+    P = zeros(shape)
+    N = zeros(shape)
+    best_P = zeros(shape)
+    best_N = zeros(shape)
+    if positions:
+        start_P = zeros(shape, dtype=int)
+        start_N = zeros(shape, dtype=int)
+        beg_P, end_P = zeros(shape, dtype=int), zeros(shape, dtype=int)
+        beg_N, end_N = zeros(shape, dtype=int), zeros(shape, dtype=int)
+    for t in range(n):
+        add(P, prods[t], out=P)
+        subtract(N, prods[t], out=N)
+        maximum(P, 0., out=P)
+        maximum(N, 0., out=N)
+        if positions:
+            copyto(start_P, t+1, where=P == 0)
+            copyto(start_N, t+1, where=N == 0)
+            better = P > best_P
+            copyto(beg_P, start_P, where=better)
+            copyto(end_P, t, where=better)
+            better = N > best_N
+            copyto(beg_N, start_N, where=better)
+            copyto(end_N, t, where=better)
+        maximum(best_P, P, out=best_P)
+        maximum(best_N, N, out=best_N)
+    neg = best_N > best_P
+    scores = where(neg, -best_N, best_P)
+    # best delay for each pair, first in delays order on ties
+    lag = argmax(abs(scores), -1)
+    ls = _pick(scores, lag)/float(n)
+    if not positions:
+        return ls
+    beg = _pick(where(neg, beg_N, beg_P), lag)
+    length = _pick(where(neg, end_N - beg_N, end_P - beg_P), lag) + 1
+    return ls, beg, length, lag
+
+def _pick(a, ind):
+    '''Return a[..., ind[...]], i.e. one entry of the last axis per row.'''
+    flat = a.reshape(-1, a.shape[-1])
+    return flat[arange(len(flat)), ind.ravel()].reshape(ind.shape)
+
+def theoretical_pvals(ls, n, max_delay, sigma=1.):
+    '''Return the eLSA approximation of P(|LS| >= |ls|).
+
+    P = 1 - (8*S)**(2D+1) with
+    S = sum_k (1/x**2 + 1/((2k-1)pi)**2) exp(-((2k-1)pi)**2/(2x**2))
+    and x = |ls|*sqrt(n)/sigma (Xia et al. 2013, Bioinformatics 29:230). For
+    D=0 this is the distribution of the range of a Brownian motion.
+    Inputs:
+     ls - array of local similarity scores.
+     n - int, length of the series.
+     max_delay - int, largest delay considered.
+     sigma - float or array, standard deviation of the products x_t*y_t. 1
+     for independent z-scored series, which is what lsa passes.
+    '''
+    x = abs(ls)*sqrt(n)/sigma
+    res = zeros(x.shape)
+    res.fill(1.)
+    pos = x > 0
+    if not pos.any():
+        return res
+    xp = x[pos][:, newaxis]
+    # terms decay once (2k-1)pi/x is large, so enough terms for the largest x
+    num_terms = int(2*xp.max()) + 20
+    c = ((2*arange(1, num_terms+1) - 1)*pi)**2
+    s = ((1./xp**2 + 1./c)*exp(-c/(2*xp**2))).sum(1)
+    res[pos] = 1 - (8*s)**(2*max_delay+1)
+    return clip(res, 0., 1.)
+
+def shifted_correlations(x, y, max_delay):
+    '''Return global and shifted correlations and p-values of rows of x, y.
+
+    The shifted correlation is the correlation with the largest absolute
+    value over the delays -D <= d <= D, computed on the overlapping part of
+    x_t and y_t+d. P-values are two sided from the t distribution.
+    Outputs:
+     r, p - global correlation and p-value.
+     sr, sp, sd - shifted correlation, p-value and delay (in the LSA
+     convention, Xs - Ys = -d).
+    '''
+    n = x.shape[-1]
+    lags = array(delays(max_delay))
+    rs = empty((len(lags),) + x.shape[:-1])
+    for k, d in enumerate(lags):
+        if d >= 0:
+            rs[k] = _pearson(x[..., :n-d], y[..., d:])
+        else:
+            rs[k] = _pearson(x[..., -d:], y[..., :n+d])
+    ms = n - abs(lags)
+    best = argmax(abs(rs), 0)
+    cols = arange(rs.shape[1])
+    sr = rs[best, cols]
+    r = rs[0]
+    return (r, _t_pval(r, n), sr, _t_pval(sr, ms[best]),
+        -lags[best])
+
+def _pearson(x, y):
+    '''Return the pearson correlation of corresponding rows of x and y.'''
+    xc = x - x.mean(-1)[..., newaxis]
+    yc = y - y.mean(-1)[..., newaxis]
+    den = sqrt((xc**2).sum(-1)*(yc**2).sum(-1))
+    num = (xc*yc).sum(-1)
+    # constant series have no correlation
+    return where(den > 0, num/where(den > 0, den, 1.), 0.)
+
+def _t_pval(r, m):
+    '''Return two sided p-values of correlations r from m observations.'''
+    r = clip(r, -1., 1.)
+    df = m - 2.
+    den = 1 - r**2
+    t = abs(r)*sqrt(df/where(den > 0, den, 1.))
+    return where(den > 0, 2*stdtr(df, -t), 0.)
+
+def bh_qvalues(pvals):
+    '''Return Benjamini-Hochberg adjusted p-values.'''
+    m = len(pvals)
+    if m == 0:
+        return array([])
+    order = argsort(pvals)
+    q = pvals[order]*m/arange(1., m+1)
+    q = minimum.accumulate(q[::-1])[::-1]
+    res = empty(m)
+    res[order] = clip(q, 0., 1.)
+    return res
+
+def _lsa_block(args):
+    '''Calculate LSA and correlation columns for one block of pairs.
+
+    Module level so Pool can pickle it. Returns a pairs X 18 array of the
+    numeric columns LS..Dsscc (without the q-values).
+    '''
+    (normed, raw, ranks, i, j, max_delay, pvalue_method, perm_seeds,
+        perm_chunk) = args
+    n = normed.shape[1]
+    lags = array(delays(max_delay))
+    x, y = normed[i], normed[j]
+    ls, beg, length, lag = local_similarity(lagged_products(x, y, max_delay))
+    if pvalue_method == 'theoretical':
+        # normalized rows have unit variance, so the products do as well
+        p = theoretical_pvals(ls, n, max_delay, 1.)
+    elif pvalue_method == 'permutation':
+        exceed = zeros(len(i))
+        abs_ls = abs(ls)
+        for c in range(0, len(perm_seeds), perm_chunk):
+            # one shuffle of the time points per permutation, shared by all
+            # pairs so results don't depend on how pairs are blocked
+            perms = array([RandomState(s).permutation(n) for s in
+                perm_seeds[c:c+perm_chunk]])
+            py = y[:, perms].transpose(1, 0, 2)
+            perm_ls = local_similarity(lagged_products(x[newaxis], py,
+                max_delay), positions=False)
+            exceed += (abs(perm_ls) >= abs_ls).sum(0)
+        p = exceed/float(len(perm_seeds))
+    else:
+        raise ValueError('Unknown pvalue_method: %s' % pvalue_method)
+    xs = beg + 1
+    ys = xs + lags[lag]
+    pcc, ppcc, spcc, pspcc, dspcc = shifted_correlations(raw[i], raw[j],
+        max_delay)
+    scc, pscc, sscc, psscc, dsscc = shifted_correlations(ranks[i], ranks[j],
+        max_delay)
+    # no bootstrap confidence interval, lowCI = upCI = LS
+    return vstack([ls, ls, ls, xs, ys, length, xs - ys, p, pcc, ppcc, spcc,
+        pspcc, dspcc, scc, pscc, sscc, psscc, dsscc]).T
+
+def lsa(data, max_delay=3, pvalue_method='theoretical', permutations=1000,
+    normalization='percentileZ', pairs_per_block=1000, procs=1, seed=None):
+    '''Calculate LSA statistics for every pair of otus (rows) of data.
+
+    Inputs:
+     data - 2d array, otus X time points.
+     max_delay - int, largest delay considered.
+     pvalue_method - str, 'theoretical' or 'permutation'.
+     permutations - int, number of permutations if pvalue_method is
+     'permutation'.
+     normalization - str, see normalize_series.
+     pairs_per_block - int, number of pairs in each job.
+     procs - int, number of processes to run blocks in.
+     seed - int or None, seed the permutation seeds are drawn from. results
+     are the same for any procs and pairs_per_block.
+    Outputs:
+     i, j - arrays of row indices of each pair (i < j).
+     res - pairs X 23 array of the columns LS through Qsscc of the external
+     LSA tool's output.
+    '''
+    normed = normalize_series(data, normalization)
+    ranks = apply_along_axis(rankdata, 1, data)
+    i, j = triu_indices(data.shape[0], 1)
+    perm_seeds = RandomState(seed).randint(0, 2**31-1, size=permutations)
+    # limit the permutation work array to ~2**22 elements per block
+    perm_chunk = max(1, 2**22//(pairs_per_block*(2*max_delay+1)*
+        data.shape[1]))
+    jobs = [(normed, data, ranks, i[k:k+pairs_per_block],
+        j[k:k+pairs_per_block], max_delay, pvalue_method, perm_seeds,
+        perm_chunk) for k in range(0, len(i), pairs_per_block)]
+    if procs > 1:
+        pool = Pool(procs)
+        blocks = pool.map(_lsa_block, jobs)
+        pool.close()
+        pool.join()
+    else:
+        blocks = map(_lsa_block, jobs)
+    res = vstack(blocks) if blocks else empty((0, 18))
+    # q-values of the P, Ppcc, Pspcc, Pscc and Psscc columns
+    qs = [bh_qvalues(res[:, k]) for k in [7, 9, 11, 14, 16]]
+    return i, j, hstack([res, array(qs).T])
+
+def lsa_lines(data, otu_ids, **kwargs):
+    '''Return LSA output lines (header + one line per pair) for data.
+
+    The columns are those of the external LSA tool with rtype 'unique', so
+    the lines can be written to a file or passed to LSAResults. kwargs are
+    passed to lsa.
+    '''
+    i, j, res = lsa(data, **kwargs)
+    lines = ['\t'.join(LSA_HEADER)]
+    int_cols = [3, 4, 5, 6, 12, 17]
+    for k in range(len(i)):
+        vals = [('%d' % v if c in int_cols else '%g' % v) for c, v in
+            enumerate(res[k])]
+        lines.append('\t'.join([otu_ids[i[k]], otu_ids[j[k]]] + vals +
+            [str(i[k]+1), str(j[k]+1)]))
+    return lines
+
+def lsa_results(data, otu_ids, filter_str='ls', sig_lvl=.001, **kwargs):
+    '''Return an LSAResults object for data. kwargs are passed to lsa.'''
+    return LSAResults(lsa_lines(data, otu_ids, **kwargs), filter_str, sig_lvl,
+        rtype='unique')
@@ -11,7 +11,8 @@ __status__ = "Development"
 
 from qiime.stats import (assign_correlation_pval)
 from qiime.otu_significance import (CORRELATION_TEST_CHOICES)
-from numpy import array, zeros
+from numpy import array, zeros, tril_indices, float64
+from correlations.eval.naive_matrix import naive_pval_matrix, sparse_cc_matrix
 
 """
 This library contains code for evaluating co-occurrence using a naive approach. 
@@ -44,12 +45,15 @@ def naive_cc_tool(bt, corr_method, pval_assignment_method, cval_fp, pval_fp):
                     pval_assignment_method, permutations=1000, 
                     perm_test_fn=test_fn, v1=data[o1], v2=data[o2])
                 ps[o1][o2] = pval
-    # write values
-    header = '#OTU ID\t'+'\t'.join(bt.ids(axis='observation'))
-    clines = [header]+[bt.ids(axis='observation')[i]+'\t'+'\t'.join(map(str,ccs[i])) \
-        for i in range(r)]
-    plines = [header]+[bt.ids(axis='observation')[i]+'\t'+'\t'.join(map(str,ps[i])) \
-        for i in range(r)]
+    write_naive_results(bt.ids(axis='observation'), ccs, ps, cval_fp, pval_fp)
+
+def write_naive_results(otu_ids, ccs, ps, cval_fp, pval_fp):
+    '''Write cval and pval matrices in the format naive_maker parses.'''
+    header = '#OTU ID\t'+'\t'.join(otu_ids)
+    clines = [header]+[otu_ids[i]+'\t'+'\t'.join(map(str,ccs[i])) \
+        for i in range(len(otu_ids))]
+    plines = [header]+[otu_ids[i]+'\t'+'\t'.join(map(str,ps[i])) \
+        for i in range(len(otu_ids))]
     o = open(cval_fp, 'w')
     o.writelines('\n'.join(clines))
     o.close()
@@ -57,3 +61,22 @@ def naive_cc_tool(bt, corr_method, pval_assignment_method, cval_fp, pval_fp):
     o.writelines('\n'.join(plines))
     o.close()
 
+def fast_naive_cc_tool(bt, corr_method, pval_assignment_method, cval_fp, 
+    pval_fp, sparse_density=.2, dtype=float64):
+    '''Calculate co-occurence using naive approach with matrix operations.
+
+    Produces the same output files as naive_cc_tool, but only for pearson or 
+    spearman correlation with parametric_t_distribution or fisher_z_transform 
+    pvals. The table's sparse matrix is used directly unless it has a larger
+    fraction of nonzero entries than sparse_density (see sparse_cc_matrix).
+    Scores and pvals are held (and written) at the precision of dtype.
+    '''
+    data = bt.matrix_data
+    r,c = data.shape
+    ccs = sparse_cc_matrix(data, corr_method, sparse_density, dtype=dtype)
+    ps = naive_pval_matrix(ccs, c, pval_assignment_method)
+    # naive_cc_tool only fills the upper triangle
+    lower = tril_indices(r, 0)
+    ccs[lower] = 0.
+    ps[lower] = 0.
+    write_naive_results(bt.ids(axis='observation'), ccs, ps, cval_fp, pval_fp)
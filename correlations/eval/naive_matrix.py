@@ -0,0 +1,202 @@
+#!/usr/bin/env python
+# file created 10/18/2026
+
+__author__ = "Will Van Treuren"
+__copyright__ = "Copyright 2013, Will Van Treuren"
+__credits__ = ["Will Van Treuren"]
+__license__ = "GPL"
+__url__ = ''
+__version__ = ".9-Dev"
+__maintainer__ = "Will Van Treuren"
+__email__ = "wdwvt1@gmail.com"
+
+from numpy import (empty, sqrt, arctanh, nan, errstate, apply_along_axis, 
+    divide, absolute, asarray, lexsort, diff, repeat, arange, r_, cumsum,
+    bincount, outer, count_nonzero, float64)
+from scipy.special import stdtr, ndtr
+from scipy.stats import rankdata
+from scipy.sparse import issparse, csr_matrix
+
+"""
+Matrix based versions of the naive co-occurrence calculations. Rather than 
+calling a test function once for each pair of otus, all pairwise scores and
+pvalues are calculated with whole array operations. Nothing here depends on 
+qiime, so these functions can be used inside other pipelines.
+"""
+
+def standardize_rows(data, corr_method, work=None):
+    '''Center rows of data (or their ranks) and scale them to unit length.
+
+    The dot product of two standardized rows is their correlation. Rows with
+    no variance become nan.
+    Inputs:
+     data - 2d array, otus X samples.
+     corr_method - str, one of pearson or spearman.
+     work - 2d array or None, float array the shape of data to write into.
+    '''
+    if work is None:
+        work = empty(data.shape)
+    if corr_method == 'pearson':
+        work[:] = data
+    elif corr_method == 'spearman':
+        work[:] = apply_along_axis(rankdata, 1, data)
+    else:
+        raise ValueError('corr_method must be pearson or spearman.')
+    work -= work.mean(1).reshape(-1, 1)
+    with errstate(divide='ignore', invalid='ignore'):
+        work /= sqrt((work**2).sum(1)).reshape(-1, 1)
+    return work
+
+def _blocked_product(a, b, out, rows_per_block):
+    '''Write a.dot(b.T) into out a block of rows at a time.
+
+    Products are accumulated in the precision of a and b and cast to the dtype
+    of out block by block, so a float32 out needs only a float64 block.
+    '''
+    for k in range(0, a.shape[0], rows_per_block):
+        out[k:k+rows_per_block] = a[k:k+rows_per_block].dot(b.T)
+    return out
+
+def naive_cc_matrix(data, corr_method, out=None, work=None, dtype=float64,
+    rows_per_block=1024):
+    '''Calculate correlation between all rows of data with matrix operations.
+
+    Rows are standardized once and all pairwise scores come from one matrix 
+    product, rather than calling the test function once per pair. Rows with no
+    variance get nan scores.
+    Inputs:
+     data - 2d array, otus X samples.
+     corr_method - str, one of pearson or spearman.
+     out - 2d array or None, otus X otus float array to write the result into.
+     work - 2d array or None, float array the shape of data used as scratch 
+     space. passing out and work lets repeated calls avoid allocating.
+     dtype - numpy float type of the result if out isn't passed. with float32
+     rows are still standardized and multiplied in float64, and the scores
+     are stored as float32 rows_per_block rows at a time.
+    '''
+    work = standardize_rows(data, corr_method, work)
+    if out is None:
+        out = empty((data.shape[0], data.shape[0]), dtype=dtype)
+    if out.dtype != work.dtype:
+        return _blocked_product(work, work, out, rows_per_block)
+    return work.dot(work.T, out=out)
+
+def sparse_ranks(data):
+    '''Return a csr matrix of the ranks of each row of nonnegative data.
+
+    Zeros tie for the lowest ranks, so every rank is shifted down by the rank
+    the zeros share. That keeps zeros at 0 and the sparsity pattern unchanged
+    without changing correlations. Ties get their average rank as rankdata
+    gives them.
+    '''
+    data = csr_matrix(data, dtype=float64, copy=True)
+    data.eliminate_zeros()
+    n, s = data.shape
+    counts = diff(data.indptr)
+    rows = repeat(arange(n), counts)
+    # order of entries sorted by value within each row
+    order = lexsort((data.data, rows))
+    vals = data.data[order]
+    # runs of tied values within a row
+    new_run = r_[True, (diff(vals) != 0) | (diff(rows) != 0)]
+    run_ids = cumsum(new_run) - 1
+    run_starts = new_run.nonzero()[0]
+    run_lens = bincount(run_ids)
+    # 1 based position of each entry among the nonzeros of its row
+    pos = arange(len(vals)) - repeat(data.indptr[:-1], counts) + 1.
+    avg = pos[run_starts] + (run_lens - 1)/2.
+    # rank is zeros + avg and the zeros share rank (zeros + 1)/2
+    zeros = (s - counts).astype(float64)
+    ranks = empty(len(vals))
+    ranks[order] = avg[run_ids] + (zeros[rows] - 1)/2.
+    data.data = ranks
+    return data
+
+def sparse_cc_matrix(data, corr_method, sparse_density=.2, out=None,
+    dtype=float64, rows_per_block=1024):
+    '''Calculate correlation between all rows of data without densifying.
+
+    Row sums and sums of squares come from the nonzero entries and cross
+    products from one sparse-sparse product, so a zero inflated table is never
+    centered (which would fill it in). cov_ij = x_i . x_j - S_i*S_j/s.
+    Spearman correlation ranks only the nonzeros (see sparse_ranks), so it
+    requires nonnegative data. Tables with a larger fraction of nonzero
+    entries than sparse_density (or spearman on tables with negative values)
+    are densified and passed to naive_cc_matrix. Rows with no variance get
+    nan scores.
+    Inputs:
+     data - 2d array or scipy.sparse matrix, otus X samples.
+     corr_method - str, one of pearson or spearman.
+     sparse_density - float, fraction of nonzero entries below which the
+     sparse calculation is used.
+     out - 2d array or None, otus X otus float array to write the result into.
+     dtype, rows_per_block - see naive_cc_matrix.
+    '''
+    if corr_method not in ['pearson', 'spearman']:
+        raise ValueError('corr_method must be pearson or spearman.')
+    n, s = data.shape
+    nnz = data.nnz if issparse(data) else count_nonzero(data)
+    if nnz >= sparse_density*n*s or (corr_method == 'spearman' and
+        nnz and data.min() < 0):
+        if issparse(data):
+            data = data.toarray()
+        return naive_cc_matrix(asarray(data), corr_method, out=out, 
+            dtype=dtype, rows_per_block=rows_per_block)
+    if corr_method == 'spearman':
+        data = sparse_ranks(data)
+    else:
+        data = csr_matrix(data, dtype=float64)
+    sums = asarray(data.sum(1)).ravel()
+    ss = asarray(data.multiply(data).sum(1)).ravel() - sums**2/s
+    if out is None:
+        out = empty((n, n), dtype=dtype)
+    with errstate(divide='ignore', invalid='ignore'):
+        norms = sqrt(ss)
+        norms[ss <= 0] = nan
+        # center and scale each block in float64 before it's stored
+        for k in range(0, n, rows_per_block):
+            block = data[k:k+rows_per_block].dot(data.T).toarray()
+            block -= outer(sums[k:k+rows_per_block], sums/s)
+            block /= norms[k:k+rows_per_block].reshape(-1, 1)
+            block /= norms.reshape(1, -1)
+            out[k:k+rows_per_block] = block
+    return out
+
+def naive_pval_matrix(ccs, n, pval_assignment_method, out=None):
+    '''Assign pvals to a matrix of correlation scores from n samples.
+
+    Vectorized version of the parametric_t_distribution and fisher_z_transform
+    methods of qiime's assign_correlation_pval. Scores of +-1 get nan pvals
+    just as they do there. pvals have the dtype of ccs unless out is passed.
+    '''
+    if out is None:
+        out = empty(ccs.shape, dtype=ccs.dtype)
+    with errstate(divide='ignore', invalid='ignore'):
+        if pval_assignment_method == 'parametric_t_distribution':
+            df = n-2
+            # out = -|t| where t = r*sqrt(df/(1-r**2))
+            out[:] = ccs
+            out **= 2
+            out *= -1
+            out += 1
+            out[out == 0] = nan
+            divide(df, out, out=out)
+            sqrt(out, out=out)
+            out *= -abs(ccs)
+            stdtr(df, out, out=out)
+        elif pval_assignment_method == 'fisher_z_transform':
+            if n <= 3:
+                out[:] = nan
+                return out
+            # out = -|z| where z = arctanh(r)*sqrt(n-3)
+            out[:] = ccs
+            out[abs(out) == 1] = nan
+            arctanh(out, out=out)
+            absolute(out, out=out)
+            out *= -((n-3)**.5)
+            ndtr(out, out=out)
+        else:
+            raise ValueError('pval_assignment_method must be one of '+\
+                'parametric_t_distribution, fisher_z_transform.')
+    out *= 2 #two tailed test because H0 is corr=0
+    return out
@@ -14,9 +14,9 @@ __email__ = "wdwvt1@gmail.com"
 import re
 from operator import itemgetter 
 from numpy import (array, bincount, arange, histogram, corrcoef, triu_indices,
-    where, vstack, logical_xor, searchsorted, zeros, linspace, tril, ones,
-    repeat, empty, floor, ceil, hstack, tril_indices, inf, unique, isnan, triu,
-    logical_or)
+    where, vstack, logical_xor, searchsorted, zeros, linspace, repeat, empty,
+    floor, ceil, hstack, tril_indices, inf, unique, isnan, triu, logical_or,
+    concatenate)
 from numpy.ma import masked_array as ma
 import matplotlib.pyplot as plt
 from mpl_toolkits.mplot3d import Axes3D
@@ -25,6 +25,8 @@ from matplotlib.pylab import matshow
 from numpy.ma import masked_array
 from linecache import getline
 from collections import Counter
+from correlations.eval.edge_list import write_edges, load_edges
+from correlations.util import kth_smallest
 
 
 """
@@ -71,6 +73,31 @@ class CorrelationCalcs(object):
         tmp = [(i,self.otu1.count(i)+self.otu2.count(i)) for i in nodes]
         return sorted(tmp, key=itemgetter(1), reverse=True)
 
+    def _edgeValues(self, attr):
+        '''Return attr as one float per edge, or nans if it isn't that.'''
+        vals = getattr(self, attr, None)
+        if vals is not None:
+            vals = array(vals, dtype=float)
+            if vals.shape == (len(self.edges),):
+                return vals
+        return repeat(float('nan'), len(self.edges))
+
+    def writeEdgeList(self, fp):
+        '''Write the significant edges to a binary edge list (see edge_list).
+
+        The otu id table is self.otu_ids if the results have it, otherwise the
+        sorted significant otus. Scores are cvals and pvals are pvals; results
+        without one value of either per edge get nans.
+        '''
+        otu_ids = getattr(self, 'otu_ids', None)
+        otu_ids = sorted(self.sig_otus) if otu_ids is None else list(otu_ids)
+        inds = dict((otu, k) for k, otu in enumerate(otu_ids))
+        signs = [1 if i == 'copresence' else -1 if i == 'mutualExclusion' 
+            else 0 for i in self.interactions]
+        write_edges(fp, otu_ids, [inds[o] for o in self.otu1], 
+            [inds[o] for o in self.otu2], self._edgeValues('cvals'), 
+            self._edgeValues('pvals'), signs)
+
 
 class CoNetResults(CorrelationCalcs):
     '''Derived class CoNetResults handles parsing and specific functions.'''
@@ -124,6 +151,31 @@ class CoNetResults(CorrelationCalcs):
             self.scores = array(sorted_scores).astype(float)
             self.methods = sorted_methods
 
+    @classmethod
+    def fromArrays(cls, otu1, otu2, interactions, scores, methods, pvals=None,
+                   qvals=None, sigs=None):
+        '''Initialize from an edges X methods score matrix rather than lines.
+
+        Used by the native multi metric scorer, whose scores are already in
+        columns so no per edge regex is needed. methods must be sorted.
+        pvals, qvals and sigs default to nan for every edge.
+        '''
+        ro = cls.__new__(cls)
+        ro.otu1 = list(otu1)
+        ro.otu2 = list(otu2)
+        ro.sig_otus = list(set(ro.otu1+ro.otu2))
+        ro.edges = zip(ro.otu1, ro.otu2)
+        ro.interactions = list(interactions)
+        nans = [float('nan')]*len(ro.edges)
+        ro.pvals = list(nans if pvals is None else pvals)
+        ro.qvals = list(nans if qvals is None else qvals)
+        ro.sigs = list(nans if sigs is None else sigs)
+        ro.cvals = map(lambda x: 1.0 if x=='copresence' else -1.0,
+                       ro.interactions)
+        ro.scores = scores
+        ro.methods = list(methods)
+        return ro
+
     def methodVals(self, method):
         '''Return vectors of values for passed method.'''
         try:
@@ -184,7 +236,7 @@ class SparCCResults(CorrelationCalcs):
     '''Derived class SparCCResults handles parsing and specific functions.'''
 
     def __init__(self, pval_lines, corr_lines, sig_lvl=.05,
-                 pearson_filter=None):
+                 pearson_filter=None, dtype=float):
         '''Initialize self by parsing input lines.
 
         Structure of this init is slightly different than the others because we
@@ -196,15 +248,31 @@ class SparCCResults(CorrelationCalcs):
         times a pvalue as extreme was seen in the bootstrapping trials SparCC 
         conducted as the one calculated from the estimated linear correlation 
         encoded in corr_lines.
+
+        dtype sets the precision pvals and correlations are stored at (see
+        parse_matrix_lines).
         '''
-        vals = array([line.strip().split('\t') for line in pval_lines])
-        self.data = vals[1:,1:].astype(float) #avoid row,col headers
-        self.otu_ids = vals[0,1:]
-        cvals = array([line.strip().split('\t') for line in corr_lines])
-        self.cdata = cvals[1:,1:].astype(float) #avoid row,col headers
+        self.otu_ids, self.data = parse_matrix_lines(pval_lines, dtype)
+        self.cdata = parse_matrix_lines(corr_lines, dtype)[1]
         self._getSignificantData(sig_lvl, pearson_filter)
         self._getLPSAndInteractions()
 
+    @classmethod
+    def fromArrays(cls, pdata, cdata, otu_ids, sig_lvl=.05, 
+                   pearson_filter=None):
+        '''Initialize from pval and correlation arrays rather than file lines.
+
+        Used by the native SparCC engine so its results don't have to be 
+        written to and parsed from text files.
+        '''
+        ro = cls.__new__(cls)
+        ro.data = pdata
+        ro.cdata = cdata
+        ro.otu_ids = array(otu_ids)
+        ro._getSignificantData(sig_lvl, pearson_filter)
+        ro._getLPSAndInteractions()
+        return ro
+
     def _getSignificantData(self, sig_lvl, pearson_filter):
         '''Find which edges significant at passed level and set self properties.
         '''
@@ -212,16 +280,15 @@ class SparCCResults(CorrelationCalcs):
         # be larger than sig_lvl means only upper triangle values get chosen.
         # data is nxn matrix
         rows,cols = self.data.shape
+        # compare in the dtype of data so float32 pvals that were written as 
+        # sig_lvl are still significant
+        se = self.data <= sig_lvl
+        se[tril_indices(rows, 0)] = False
         if pearson_filter is not None:
-            # find edges which are significant enough based on sig_lvl
-            se = (tril(10*ones((rows, cols)),0)+self.data)<=sig_lvl
             # find edges which are significant enough based on pearson_filter
-            pe = abs(triu(self.cdata, 1))>=pearson_filter
-            self.sig_edges = (se * pe).nonzero()
-        else: 
-            # sig edges is tuple of arrays corresponding to row,col indices
-            self.sig_edges = \
-                ((tril(10*ones((rows, cols)),0)+self.data)<=sig_lvl).nonzero()
+            se &= abs(self.cdata) >= pearson_filter
+        # sig edges is tuple of arrays corresponding to row,col indices
+        self.sig_edges = se.nonzero()
         self.otu1 = [self.otu_ids[i] for i in self.sig_edges[0]]
         self.otu2 = [self.otu_ids[i] for i in self.sig_edges[1]]
         self.sig_otus = list(set(self.otu1+self.otu2))
@@ -247,6 +314,23 @@ class SparCCResults(CorrelationCalcs):
         self._getLPSAndInteractions()
 
 
+def parse_matrix_lines(lines, dtype=float):
+    '''Parse lines of a square otu X otu matrix with row and column headers.
+
+    Each line is converted into a preallocated array of the passed dtype as it
+    is read, so the whole matrix is never held as strings. Passing float32
+    halves the memory of the result.
+    Outputs:
+     otu_ids - array of str, column headers.
+     data - 2d array of dtype.
+    '''
+    header = lines[0].strip().split('\t')
+    rows = [line for line in lines[1:] if line.strip()]
+    data = empty((len(rows), len(header)-1), dtype=dtype)
+    for k, line in enumerate(rows):
+        data[k] = line.strip().split('\t')[1:]
+    return array(header[1:]), data
+
 def triu_from_flattened(n, offset=0):
     '''Yield indices in flattened vector which construct upper triangular array.
 
@@ -363,20 +447,20 @@ class NaiveResults(CorrelationCalcs):
     '''Derived class handles calculations for naive correlation method.'''
 
     def __init__(self, cval_lines, pval_lines, sig_lvl, empirical=False, 
-                 corr_filter=None):
-        '''Init self by parsing cvals and calculating sig links.'''
-        vals = array([line.strip().split('\t') for line in pval_lines])
-        cvals = array([line.strip().split('\t') for line in cval_lines])
-        
-        self.pdata = vals[1:,1:].astype(float) #avoid row,col headers
-        self.cdata = cvals[1:,1:].astype(float) #avoid row,col headers
+                 corr_filter=None, dtype=float):
+        '''Init self by parsing cvals and calculating sig links.
+
+        dtype sets the precision cvals and pvals are stored at (see 
+        parse_matrix_lines).
+        '''
+        self.otu_ids, self.pdata = parse_matrix_lines(pval_lines, dtype)
+        self.cdata = parse_matrix_lines(cval_lines, dtype)[1]
         
         # nan data gets pval=1., cval=0 
         nan_indicies = logical_or(isnan(self.pdata), isnan(self.cdata))
         self.pdata[nan_indicies] = 1.
         self.cdata[nan_indicies] = 0.
         
-        self.otu_ids = vals[0,1:]
         self._getSignificantData(sig_lvl, empirical, corr_filter)
         self._getLPSAndInteractions()
 
@@ -525,6 +609,18 @@ class NaiveResults(CorrelationCalcs):
 #         self.edges = zip(self.otu1, self.otu2)
 #         self.cvals = mdata[self.sig_edges[0], self.sig_edges[1]]
 
+def dissimilarity_lower_bound(vals, sig_lvl, block_size=None):
+    '''Return the largest dissimilarity of the sig_lvl fraction of vals.
+
+    This is the round(sig_lvl*len(vals))th smallest value of vals (at least
+    the smallest). Every value tied with it is <= the bound, so more than 
+    sig_lvl of vals can be selected. The value is returned in the dtype of
+    vals rather than rounded, so comparing vals against it always selects 
+    it. block_size - int or None, see kth_smallest rows_per_block.
+    '''
+    k = max(int(round(sig_lvl*len(vals)))-1, 0)
+    return kth_smallest(vals, k, rows_per_block=block_size)
+
 class BrayCurtisResults(CorrelationCalcs):
     '''Derived class handles calculations for bray curtis correlation method.
 
@@ -534,15 +630,13 @@ class BrayCurtisResults(CorrelationCalcs):
     tail of the distribution.
     '''
 
-    def __init__(self, dissim_lines, sig_lvl):
+    def __init__(self, dissim_lines, sig_lvl, dtype=float):
         '''Init self by parsing dissim_lines and calculating sig links.'''
         # error check at the beginning avoids computation
         if sig_lvl==0.:
             raise ValueError('sig_lvl cannot be 0. pass sig_lvl > 0.')
         # begin parsing
-        vals = array([line.strip().split('\t') for line in dissim_lines])
-        self.data = vals[1:,1:].astype(float) #avoid row,col headers
-        self.otu_ids = vals[0,1:]
+        self.otu_ids, self.data = parse_matrix_lines(dissim_lines, dtype)
         self._getSignificantData(sig_lvl)
         # HACK
         # since there is no notion of mutual exclusion we have to assign our 
@@ -556,13 +650,7 @@ class BrayCurtisResults(CorrelationCalcs):
         '''Find which edges significant at passed level and set self properties.
         '''
         rows,cols = self.data.shape #rows = cols
-        vals = []
-        for row in range(rows):
-            for col in range(row + 1, cols):
-                vals.append(self.data[row][col])
-        vals = array(vals)
-        cvals = unique(vals)
-        # cvals is sorted
+        vals = self.data[triu_indices(rows, 1)]
         # calculate lower bound, i.e. what value in the distribution of values 
         # has sig_lvl fraction of the data lower than or equal to it. this is
         # not guaranteed to be precise because of repeated values. for instance 
@@ -573,10 +661,8 @@ class BrayCurtisResults(CorrelationCalcs):
         # second in the ordered list (of 10 elements, 2/10=.2). but, since there
         # is no a-priori way to tell which of the multiple .2 linkages are 
         # significant, we select all of them, forcing our lower bound to 
-        # encompass 50 percent of the data. the round call on the lb is to avoid
-        # documented numpy weirdness where it will misassign >= calls for long
-        # floats. 
-        lb = round(cvals[round(sig_lvl*len(cvals))-1],7) #-1 because 0 indexing
+        # encompass 50 percent of the data. fromCondensed uses the same bound.
+        lb = dissimilarity_lower_bound(vals, sig_lvl)
         self.actual_sig_lvl = (vals <= lb).sum()/float(rows * (rows -1)/2)
         tmp = where(self.data <= lb, 1, 0).nonzero()
         inds = tmp[0] < tmp[1]
@@ -587,6 +673,42 @@ class BrayCurtisResults(CorrelationCalcs):
         self.edges = zip(self.otu1, self.otu2)
         self.cvals = self.data[self.sig_edges[0], self.sig_edges[1]]
 
+    @classmethod
+    def fromCondensed(cls, dissims, otu_ids, sig_lvl, block_size=2**22):
+        '''Initialize from a condensed dissimilarity array.
+
+        dissims holds the upper triangle of the dissimilarity matrix in row
+        order (the layout of scipy.spatial.distance.pdist), so a large table
+        never has to be expanded to a square matrix. self.data is dissims.
+        The lower bound is the same as the one found from dissimilarity lines
+        (see dissimilarity_lower_bound), read block_size values at a time so a
+        memmapped dissims is never loaded or sorted whole.
+        '''
+        if sig_lvl==0.:
+            raise ValueError('sig_lvl cannot be 0. pass sig_lvl > 0.')
+        ro = cls.__new__(cls)
+        ro.data = dissims
+        ro.otu_ids = array(otu_ids)
+        n = len(ro.otu_ids)
+        lb = dissimilarity_lower_bound(dissims, sig_lvl, block_size)
+        sig = concatenate([(dissims[a:a+block_size] <= lb).nonzero()[0] + a 
+            for a in range(0, len(dissims), block_size)])
+        ro.actual_sig_lvl = len(sig)/float(len(dissims))
+        # condensed index of (i,j), i<j, is row_starts[i] + j - i - 1
+        rows = arange(n-1)
+        row_starts = n*rows - rows*(rows+1)//2
+        i = searchsorted(row_starts, sig, 'right') - 1
+        ro.sig_edges = i, sig - row_starts[i] + i + 1
+        ro.otu1 = [ro.otu_ids[k] for k in ro.sig_edges[0]]
+        ro.otu2 = [ro.otu_ids[k] for k in ro.sig_edges[1]]
+        ro.sig_otus = list(set(ro.otu1+ro.otu2))
+        ro.edges = zip(ro.otu1, ro.otu2)
+        ro.cvals = dissims[sig]
+        ro.interactions = ['copresence']* len(ro.edges)
+        if sig_lvl != ro.actual_sig_lvl:
+            print 'Warning: calculated sig_lvl is %s' % ro.actual_sig_lvl
+        return ro
+
 # original mic performing strangely 2/28/2015
 # class MICResults(CorrelationCalcs):
 #     """Derived class handles calculations for MIC correlation method."""
@@ -697,8 +819,11 @@ class MICResults(CorrelationCalcs):
 
 class EnsembleResults(CorrelationCalcs):
     '''Edge ensemble class used when building ensemble results objects.'''
-    def __init__(self, results_objects):
-        '''Combine the result objects.'''
+    def __init__(self, results_objects, dtype=float):
+        '''Combine the result objects.
+
+        cvals and pvals of the shared edges are stored as dtype.
+        '''
         self.edges = []
         self.interactions = []
         self.cdata = []
@@ -754,11 +879,14 @@ class EnsembleResults(CorrelationCalcs):
         try:
             tmp_ind = 0
             num_ros = len(results_objects)
-            self.cvals = [empty(len(self.edges)) for _ in range(num_ros)]
-            self.pvals = [empty(len(self.edges)) for _ in range(num_ros)]
+            self.cvals = [empty(len(self.edges), dtype=dtype) for _ in 
+                range(num_ros)]
+            self.pvals = [empty(len(self.edges), dtype=dtype) for _ in 
+                range(num_ros)]
+            otu_inds = dict((otu, k) for k, otu in enumerate(self.otu_ids))
             for e1, e2 in self.edges:
-                i1 = int(where(self.otu_ids == e1)[0])
-                i2 = int(where(self.otu_ids == e2)[0])
+                i1 = otu_inds[e1]
+                i2 = otu_inds[e2]
                 if i1 > i2:
                     i2, i1 = i1, i2
                 for k in range(num_ros):
@@ -772,7 +900,31 @@ class EnsembleResults(CorrelationCalcs):
 
 
 
-def sparcc_maker(cval_fp, pval_fp, sig_lvl=.001, pearson_filter=None):
+class EdgeListResults(CorrelationCalcs):
+    '''Results read back from a binary edge list.'''
+
+    def __init__(self, otu_ids, records):
+        '''Init self from the otu id table and edge records of an edge list.'''
+        self.otu_ids = array(otu_ids)
+        self.records = records
+        self.otu1 = [otu_ids[i] for i in records['i']]
+        self.otu2 = [otu_ids[j] for j in records['j']]
+        self.sig_otus = list(set(self.otu1+self.otu2))
+        self.edges = zip(self.otu1, self.otu2)
+        self.cvals = records['score'].tolist()
+        self.pvals = records['pval'].tolist()
+        self.interactions = ['copresence' if s == 1 else 'mutualExclusion' if
+            s == -1 else 'unknown' for s in records['sign']]
+
+def load_result(edges_fp, start=0, stop=None):
+    """convenience function, read results written by writeEdgeList.
+
+    Only edges start to stop are read from the file."""
+    otu_ids, records = load_edges(edges_fp, start, stop)
+    return EdgeListResults(otu_ids, records)
+
+def sparcc_maker(cval_fp, pval_fp, sig_lvl=.001, pearson_filter=None, 
+    dtype=float):
     """convenience function, automate creation of sparcc object."""
     o = open(cval_fp)
     cval_lines = o.readlines()
@@ -780,7 +932,8 @@ def sparcc_maker(cval_fp, pval_fp, sig_lvl=.001, pearson_filter=None):
     o = open(pval_fp)
     pval_lines = o.readlines()
     o.close()
-    return SparCCResults(pval_lines, cval_lines, sig_lvl, pearson_filter)
+    return SparCCResults(pval_lines, cval_lines, sig_lvl, pearson_filter, 
+        dtype)
 
 def conet_maker(ensemble_fp):
     """convenience function, automate creation of conet object."""
@@ -803,7 +956,8 @@ def lsa_maker(lsa_fp, filter_str='ls', sig_lvl=.001, rtype='autodetect'):
     o.close()
     return LSAResults(lines, filter_str, sig_lvl, rtype=rtype)
 
-def naive_maker(cval_fp, pval_fp, sig_lvl=.001, empirical=False, corr_filter=None):
+def naive_maker(cval_fp, pval_fp, sig_lvl=.001, empirical=False, corr_filter=None,
+    dtype=float):
     """convenience function, automate creation of naive object."""
     o = open(cval_fp, 'U')
     clines = o.readlines()
@@ -811,14 +965,14 @@ def naive_maker(cval_fp, pval_fp, sig_lvl=.001, empirical=False, corr_filter=Non
     o = open(pval_fp, 'U')
     plines = o.readlines()
     o.close()
-    return NaiveResults(clines, plines, sig_lvl, empirical, corr_filter)
+    return NaiveResults(clines, plines, sig_lvl, empirical, corr_filter, dtype)
 
-def bray_curtis_maker(dists_fp, sig_lvl=.001):
+def bray_curtis_maker(dists_fp, sig_lvl=.001, dtype=float):
     """convenience function, automate creation of bray curtis object."""
     o = open(dists_fp, 'U')
     lines = o.readlines()
     o.close()
-    return BrayCurtisResults(lines, sig_lvl)
+    return BrayCurtisResults(lines, sig_lvl, dtype)
 
 def mic_maker(mic_fp, feature_names, sig_lvl=.3):
     """convenience function, automate creation of mic results object."""
@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+# file created 10/18/2026
+
+__author__ = "Will Van Treuren"
+__copyright__ = "Copyright 2013, Will Van Treuren"
+__credits__ = ["Will Van Treuren, Sophie Weiss"]
+__license__ = "GPL"
+__url__ = ''
+__version__ = ".9-Dev"
+__maintainer__ = "Will Van Treuren"
+__email__ = "wdwvt1@gmail.com"
+
+'''
+Code for assessing edge stability across rarefactions of a table in a single
+process.
+
+The file based procedure is to rarefy a biom table N times, run a correlation
+tool on each rarefied table, parse each set of results and then pass the
+results objects to result_eval.shared_pairs. Here the table is rarefied in
+memory, correlated with the naive matrix engine, and the significant edges of
+each rarefaction are merged directly into a shared edge counter. All the work
+arrays are allocated once and reused for every rarefaction.
+'''
+
+from numpy import empty, int64, errstate
+from numpy.random import RandomState
+from correlations.eval.naive_matrix import (naive_cc_matrix,
+    naive_pval_matrix)
+from correlations.eval.result_eval import edge_keys, merge_edge_counts
+
+def rarefy(data, depth, out=None, replace=False, prng=None):
+    '''Subsample every sample (column) of data to depth counts.
+
+    Sampling without replacement is done as a chain of hypergeometric draws:
+    the count for otu k is drawn given the counts remaining in the sample and
+    the depth remaining to be filled. Each draw is vectorized across all
+    samples so the python loop is over otus only. Sampling with replacement
+    draws a multinomial for each sample.
+    Inputs:
+     data - 2d array of ints, otus X samples. every sample must have at least
+     depth counts.
+     depth - int, number of counts each sample will have after rarefaction.
+     out - 2d array or None, array the shape of data to write results into.
+     replace - boolean, if True sample with replacement.
+     prng - numpy.random.RandomState or None.
+    '''
+    if prng is None:
+        prng = RandomState()
+    if out is None:
+        out = empty(data.shape)
+    totals = data.sum(0).astype(int64)
+    if (totals < depth).any():
+        raise ValueError('All samples must have at least depth counts.')
+    if replace:
+        for i in range(data.shape[1]):
+            out[:,i] = prng.multinomial(depth, data[:,i]/float(totals[i]))
+        return out
+    remaining_total = totals
+    remaining_depth = empty(data.shape[1], dtype=int64)
+    remaining_depth.fill(depth)
+    for k in range(data.shape[0]-1):
+        ngood = data[k].astype(int64)
+        # hypergeometric requires at least one item be drawn
+        inds = remaining_depth.nonzero()[0]
+        out[k] = 0
+        if len(inds):
+            out[k, inds] = prng.hypergeometric(ngood[inds],
+                remaining_total[inds]-ngood[inds], remaining_depth[inds])
+        remaining_total = remaining_total - ngood
+        remaining_depth -= out[k].astype(int64)
+    out[-1] = remaining_depth
+    return out
+
+def rarefaction_shared_pairs(data, depth, num_rarefactions, corr_method,
+    pval_assignment_method, sig_lvl=.001, replace=False, seed=None):
+    '''Count edges significant in each of num_rarefactions rarefied tables.
+
+    Samples with fewer than depth counts are dropped once before the
+    rarefactions begin.
+    Inputs:
+     data - 2d array of ints, otus X samples.
+     depth - int, rarefaction depth.
+     num_rarefactions - int, number of rarefied tables to correlate.
+     corr_method - str, one of pearson or spearman.
+     pval_assignment_method - str, one of parametric_t_distribution or
+     fisher_z_transform.
+     sig_lvl - float, edges with pval <= sig_lvl are significant.
+     replace - boolean, if True rarefy with replacement.
+     seed - int or None, seed for the rarefaction random draws.
+    Outputs:
+     keys, counts - the sorted edge keys (result_eval.edge_keys with
+     n=data.shape[0], so keys index the rows of data) and the number of
+     rarefactions each edge was significant in. result_eval.keys_to_edges
+     recovers the rows and result_eval.plot_shared_pairs accepts counts.
+    '''
+    prng = RandomState(seed)
+    data = data[:, data.sum(0) >= depth]
+    n, c = data.shape
+    # preallocated work arrays, reused for every rarefaction
+    rare = empty((n, c))
+    work = empty((n, c))
+    ccs = empty((n, n))
+    ps = empty((n, n))
+    keys = empty(0, dtype=int64)
+    counts = empty(0, dtype=int64)
+    for _ in range(num_rarefactions):
+        rarefy(data, depth, out=rare, replace=replace, prng=prng)
+        naive_cc_matrix(rare, corr_method, out=ccs, work=work)
+        naive_pval_matrix(ccs, c, pval_assignment_method, out=ps)
+        # nan pvals are never significant
+        with errstate(invalid='ignore'):
+            i, j = (ps <= sig_lvl).nonzero()
+        # only upper triangle edges are kept, no triangle index arrays are
+        # made since they are as large as ps
+        upper = i < j
+        i, j = i[upper], j[upper]
+        keys, counts = merge_edge_counts(keys, counts, edge_keys(i, j, n))
+    return keys, counts
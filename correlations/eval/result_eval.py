@@ -17,7 +17,8 @@ methods.
 
 from numpy import (array, bincount, arange, histogram, corrcoef, triu_indices,
     where, vstack, logical_xor, searchsorted, zeros, linspace, tril, ones,
-    repeat, empty, apply_along_axis, triu)
+    repeat, empty, apply_along_axis, unique, hstack, minimum, maximum,
+    int64, asarray)
 from matplotlib.pylab import matshow
 from numpy.ma import masked_array
 import matplotlib.pyplot as plt
@@ -395,45 +396,149 @@ def interacting_edges(start, stop, dim, edges, interactions):
     OTU. If there is more than 1 RHS OTU, than there will be silent errors in 
     the calculations.
     '''
-    # cis edges (LHS,LHS), trans edges (LHS,RHS or RHS,LHS), mes = mutual 
-    # exclusions, cps = copresensces 
-    cis_edges = 0
-    trans_edges = 0
-    total_detected = 0
-    cis_mes = 0
-    cis_cps = 0
-    trans_mes = 0
-    trans_cps = 0
-
-    int_edges = map(lambda x: (int(x[0][1:]), int(x[1][1:])), edges)
-    for ind, edge in enumerate(int_edges):
-        o1, o2 = edge
-        interaction = interactions[ind]
-        if start <= o1 < stop and start <= o2 < stop:
-            # calculate integer parts of o1,o2
-            i1 = o1/(dim+1)
-            i2 = o2/(dim+1)
-            if i1 == i2: #same relationship
-                total_detected+=1
-                r1 = o1%(dim+1)
-                r2 = o2%(dim+1)
-                # WARNING: If a function is introduced that has more than 1 RHS
-                # OTU this will give the wrong result.
-                if r1 != dim and r2 != dim: #relationship is cis
-                    cis_edges+=1
-                    if interaction == 'copresence':
-                        cis_cps+=1
-                    else: #interaction == 'mutualExclusion'
-                        cis_mes+=1
-                else: # r1 == dim or r2 == dim
-                    trans_edges+=1
-                    if interaction == 'copresence':
-                        trans_cps+=1
-                    else: #interaction == 'mutualExclusion'
-                        trans_mes+=1
-
-    return (total_detected, cis_edges, cis_cps, cis_mes, trans_edges, trans_cps,
-        trans_mes)
+    return block_interacting_edges([start], [stop], [dim], edges, 
+        interactions)[0]
+
+def block_interacting_edges(starts, stops, dims, edges, interactions):
+    '''Check ecological edges against every block of generated OTUs at once.
+
+    Computes the interacting_edges counts for each block (start, stop, dim) in
+    one pass over the edges. Each edge is assigned to the block containing its
+    first OTU with searchsorted on the block starts, and the relationship and
+    LHS/RHS position of both OTUs are found with array // and % by dim+1.
+    Blocks must not overlap.
+
+    Inputs:
+     starts, stops, dims - lists of ints, start, stop and dim of each block
+      (see interacting_edges).
+     edges - list of OTU tuples.
+     interactions - list of strs, either mutualExclusion or copresence.
+    Outputs:
+     list with a (total_detected, cis_edges, cis_cps, cis_mes, trans_edges, 
+     trans_cps, trans_mes) tuple for each block.
+    '''
+    nblocks = len(starts)
+    starts = asarray(starts, dtype=int64)
+    stops = asarray(stops, dtype=int64)
+    dims = asarray(dims, dtype=int64)
+    if len(edges) == 0:
+        return [(0,)*7 for _ in range(nblocks)]
+    o1 = array([int(e[0][1:]) for e in edges], dtype=int64)
+    o2 = array([int(e[1][1:]) for e in edges], dtype=int64)
+    cps = array(interactions) == 'copresence'
+    # block of each otu, both otus must fall within the same block
+    b1 = searchsorted(starts, o1, 'right') - 1
+    b2 = searchsorted(starts, o2, 'right') - 1
+    b = b1.clip(0)
+    d = dims[b] + 1
+    detected = (b1 == b2) & (b1 >= 0) & (o1 < stops[b]) & (o2 < stops[b]) & \
+        (o1//d == o2//d)
+    # an edge is trans if either otu is the RHS (last) otu of its relationship
+    trans = (o1 % d == d - 1) | (o2 % d == d - 1)
+    def count(mask):
+        return bincount(b[detected & mask], minlength=nblocks)
+    every = ones(len(b), dtype=bool)
+    counts = [count(every), count(~trans), count(~trans & cps), 
+        count(~trans & ~cps), count(trans), count(trans & cps), 
+        count(trans & ~cps)]
+    return zip(*[c.tolist() for c in counts])
+
+def manifest_matches(manifest, edges):
+    '''Return the index of each observed edge in a ground truth manifest.
+
+    Edges are matched on their otu ids (in either direction) against the 
+    manifest's true edges with one sorted join of integer pair keys, so no 
+    assumption is made about how otus are named or laid out.
+    Inputs:
+     manifest - Manifest object (see generators.manifest).
+     edges - list of OTU tuples.
+    Outputs:
+     int array, index of the true edge each observed edge is, -1 if none.
+    '''
+    res = -ones(len(edges), dtype=int64)
+    if len(edges) == 0 or len(manifest.i) == 0:
+        return res
+    n = len(manifest.otu_ids)
+    inds = dict((otu, k) for k, otu in enumerate(manifest.otu_ids))
+    o1 = array([inds.get(e[0], -1) for e in edges], dtype=int64)
+    o2 = array([inds.get(e[1], -1) for e in edges], dtype=int64)
+    obs_keys = minimum(o1, o2)*n + maximum(o1, o2)
+    true_keys = minimum(manifest.i, manifest.j)*n + \
+        maximum(manifest.i, manifest.j)
+    order = true_keys.argsort(kind='mergesort')
+    sorted_keys = true_keys[order]
+    pos = searchsorted(sorted_keys, obs_keys).clip(0, len(sorted_keys)-1)
+    found = (sorted_keys[pos] == obs_keys) & (o1 >= 0) & (o2 >= 0)
+    res[found] = order[pos[found]]
+    return res
+
+def manifest_edge_counts(manifest, edges, interactions):
+    '''Count detected true edges of each block of a manifest.
+
+    Replaces block_interacting_edges for tables with a manifest. Edges of type
+    cis are counted as cis, all other types as trans.
+    Outputs:
+     list with a (total_detected, cis_edges, cis_cps, cis_mes, trans_edges, 
+     trans_cps, trans_mes) tuple for each block of the manifest.
+    '''
+    nblocks = len(manifest.blocks)
+    matches = manifest_matches(manifest, edges)
+    found = matches >= 0
+    b = manifest.block_inds[matches[found]]
+    cis = manifest.types[matches[found]] == 'cis'
+    cps = array([i == 'copresence' for i in interactions], dtype=bool)[found]
+    def count(mask):
+        return bincount(b[mask], minlength=nblocks)
+    counts = [count(ones(len(b), dtype=bool)), count(cis), count(cis & cps),
+        count(cis & ~cps), count(~cis), count(~cis & cps), count(~cis & ~cps)]
+    return zip(*[c.tolist() for c in counts])
+
+def manifest_node_blocks(manifest, otus):
+    '''Return the block of a manifest each otu is in and its place in it.
+
+    Replaces null_sig_node_locs (and the otu arithmetic of 
+    hist_pulse_envelope_shifts_2) for tables with a manifest: otus are found
+    by id and placed with one searchsorted over the block starts.
+    Inputs:
+     manifest - Manifest object (see generators.manifest).
+     otus - list of otu ids.
+    Outputs:
+     blocks, offsets - int arrays, index of each otu's block in 
+     manifest.blocks and of the otu from the start of its block. -1 for otus
+     that aren't in any block.
+    '''
+    inds = dict((otu, k) for k, otu in enumerate(manifest.otu_ids))
+    o = array([inds.get(otu, -1) for otu in otus], dtype=int64)
+    if len(manifest.blocks) == 0:
+        return -ones(len(o), dtype=int64), -ones(len(o), dtype=int64)
+    starts = array([b[1] for b in manifest.blocks], dtype=int64)
+    stops = array([b[2] for b in manifest.blocks], dtype=int64)
+    order = starts.argsort(kind='mergesort')
+    k = searchsorted(starts[order], o, 'right') - 1
+    b = order[k.clip(0)]
+    inside = (o >= 0) & (k >= 0) & (o < stops[b])
+    return where(inside, b, -1), where(inside, o - starts[b], -1)
+
+def manifest_type_counts(manifest, edges, interactions):
+    '''Count detected true edges of each type of a manifest.
+
+    For timeseries tables the types are the parameter two otus differ in 
+    (see timeseries_manifest), so this replaces grouping otus by parameter 
+    value with timeseries_indices.
+    Outputs:
+     types - sorted list of the manifest's edge types.
+     counts - list with a (true_edges, detected, cps, mes) tuple for each 
+     type.
+    '''
+    types, inv = unique(manifest.types, return_inverse=True)
+    matches = manifest_matches(manifest, edges)
+    found = matches >= 0
+    t = inv[matches[found]]
+    cps = array([i == 'copresence' for i in interactions], dtype=bool)[found]
+    def count(vals):
+        return bincount(vals, minlength=len(types))
+    counts = [count(inv), count(t), count(t[cps]), count(t[~cps])]
+    return list(types), zip(*[c.tolist() for c in counts])
 
 def null_sig_node_locs_timeseries(list_of_lists, sig_nodes):
     '''Return location of OTUs in num_nodes.
@@ -674,26 +779,38 @@ def rmt_hist_of_metrics(data, method_str='Pearson'):
     plt.show()
 
 def hist_pulse_envelope_shifts_2(otus1, otus2, pos_neg, signal_len, num_signals,
-    title):
+    title, manifest=None):
     '''Graph hist env pulse.
 
-    WARNING, depending on where the OTUS start this function might have a 
-    problem.'''
-    o1s = array([float(i[1:]) for i in otus1]) #avoid 'o'
-    o2s = array([float(i[1:]) for i in otus2]) #avoid 'o'
+    WARNING, without a manifest otus are assumed to be named o0... with the 
+    signals first, depending on where the OTUS start this function might have
+    a problem. With a manifest whose first block is the signals and second the
+    envelopes (see block_manifest) otus are placed by manifest_node_blocks.'''
+    if manifest is not None:
+        b1, off1 = manifest_node_blocks(manifest, otus1)
+        b2, off2 = manifest_node_blocks(manifest, otus2)
+        env1, env2 = (b1 == 1).astype(int64), (b2 == 1).astype(int64)
+        interaction_type = env1 + env2
+        # the lag of the otu arithmetic with each envelope num_signals after
+        # its signal, but taken from positions in the blocks
+        time_lag = abs(off1 + env1*num_signals - off2 - env2*num_signals) % \
+            num_signals
+    else:
+        o1s = array([float(i[1:]) for i in otus1]) #avoid 'o'
+        o2s = array([float(i[1:]) for i in otus2]) #avoid 'o'
 
-    tmp = vstack([o1s, o2s])
+        tmp = vstack([o1s, o2s])
 
-    def _classify_interaction_type(arr_slice):
-        '''Function to apply along axis.'''
-        return (arr_slice>=num_signals).sum()
+        def _classify_interaction_type(arr_slice):
+            '''Function to apply along axis.'''
+            return (arr_slice>=num_signals).sum()
 
-    def _identify_time_lag(arr_slice):
-        '''Identify the time lag between the signals in arr_slice.'''
-        return int(abs(arr_slice[0] - arr_slice[1]) % num_signals)
+        def _identify_time_lag(arr_slice):
+            '''Identify the time lag between the signals in arr_slice.'''
+            return int(abs(arr_slice[0] - arr_slice[1]) % num_signals)
 
-    interaction_type = apply_along_axis(_classify_interaction_type, 0, tmp)
-    time_lag = apply_along_axis(_identify_time_lag, 0, tmp)
+        interaction_type = apply_along_axis(_classify_interaction_type, 0, tmp)
+        time_lag = apply_along_axis(_identify_time_lag, 0, tmp)
     direction = array(pos_neg)=='copresence'
 
     # set [0] entry of bincount to 0 since this entry is where things which
@@ -827,6 +944,77 @@ def hist_pulse_envelope_shifts(otus1, otus2, title):
     return (array(signal_timediffs), array(envelope_timediffs),
         array(sig_env_timediffs))
 
+def edge_keys(inds1, inds2, n):
+    '''Return canonical int64 keys for undirected edges between n nodes.
+
+    The edge i-j and the edge j-i both map to the key min(i,j)*n + max(i,j), so
+    counting keys counts undirected edges. Self edges (i-i) are dropped since 
+    they can never be shared pairs.
+    Inputs:
+     inds1, inds2 - 1d arrays of ints, node indices of each end of the edges.
+     n - int, number of nodes (i.e. the max node index + 1).
+    '''
+    inds1 = asarray(inds1, dtype=int64)
+    inds2 = asarray(inds2, dtype=int64)
+    lo = minimum(inds1, inds2)
+    hi = maximum(inds1, inds2)
+    return (lo*n + hi)[lo != hi]
+
+def keys_to_edges(keys, n):
+    '''Return the (row, col) node indices encoded by edge_keys.'''
+    return keys // n, keys % n
+
+def merge_edge_counts(keys, counts, new_keys, new_counts=None):
+    '''Merge new_keys into the sorted unique keys and their counts.
+
+    Used to stream edges from many results into one counter without ever 
+    holding all the edges of all the results at once; memory is bounded by the
+    number of distinct edges.
+    Inputs:
+     keys, counts - 1d arrays, sorted unique keys and the number of times each
+     was seen (empty arrays to start a new counter).
+     new_keys - 1d array of keys from edge_keys, need not be unique.
+     new_counts - 1d array or None, counts for new_keys. if None each new key 
+     counts once.
+    Outputs:
+     sorted unique keys, int64 counts.
+    '''
+    if new_counts is None:
+        new_counts = ones(len(new_keys), dtype=int64)
+    ukeys, inv = unique(hstack([asarray(keys, dtype=int64), 
+        asarray(new_keys, dtype=int64)]), return_inverse=True)
+    ucounts = bincount(inv, weights=hstack([counts, new_counts]),
+        minlength=len(ukeys))
+    return ukeys, ucounts.astype(int64)
+
+def shared_pair_counts(results_objects):
+    '''Count shared edges in multiple results objects without a dense matrix.
+
+    Inputs:
+     results_objects - list of parsed co-occurrence results objects.
+    Outputs:
+     uids - array of the sorted OTU ids that contribute to any edge.
+     keys - sorted int64 array of edge keys (see edge_keys) with n=len(uids).
+     counts - int64 array, counts[i] is the number of times the edge keys[i] 
+     was seen in all the results_objects.
+    '''
+    # Find the superset of OTU ids that contribute to significant edges. Since 
+    # we have different rarefactions, each result object might have different 
+    # sets of otus. 
+    edge_arrs = [array(ro.edges) for ro in results_objects if len(ro.edges)]
+    if edge_arrs:
+        uids = unique(hstack([e.ravel() for e in edge_arrs]))
+    else:
+        uids = array([])
+    n = len(uids)
+    keys = empty(0, dtype=int64)
+    counts = empty(0, dtype=int64)
+    for e in edge_arrs:
+        ks, cs = unique(edge_keys(searchsorted(uids, e[:,0]),
+            searchsorted(uids, e[:,1]), n), return_counts=True)
+        keys, counts = merge_edge_counts(keys, counts, ks, cs)
+    return uids, keys, counts
+
 def shared_pairs(results_objects):
     '''Return array that counts shared edges in multiple results objects.
 
@@ -834,31 +1022,31 @@ def shared_pairs(results_objects):
      results_objects - list of parsed co-occurrence results objects.
     Outputs: 
      array, index i,j is the number of times edge i-j was seen (where i,j are 
-     determined by the uids_map) in all the results_objects.
+     determined by the sorted OTU ids) in all the results_objects.
+    
+    This builds a dense uids X uids matrix; for large numbers of results or 
+    edges use shared_pair_counts which stores only the edges that were seen.
     '''
-    # Find the superset of OTU ids that contribute to significant edges. Since 
-    # we have different rarefactions, each result object might have different 
-    # sets of otus. The order of the uids_map is irrelevant; all we want is a 
-    # stable mapping. 
-    ids = []
-    for ro in results_objects:
-        ids.extend(ro.sig_otus)
-    uids = sorted(list(set(ids)))
-    uids_map = {uids[i]:i for i in range(len(uids))}
-    # add edge i,j to results object. since edges might be i,j or j,i and still 
-    # be the same we add the matrix transpose to ensure we don't undercount. 
-    # we zero out the main diagonal and below post transpose addition to prevent
-    # subsequent overcount
+    uids, keys, counts = shared_pair_counts(results_objects)
     results = zeros((len(uids), len(uids)))
-    for ro in results_objects:
-        for otu1, otu2 in ro.edges:
-            results[uids_map[otu1], uids_map[otu2]]+=1
-    return triu(results + results.T, 1)
+    i, j = keys_to_edges(keys, len(uids))
+    results[i, j] = counts
+    return results
+
+def shared_pairs_histogram(spairs, num_tests):
+    '''Return counts of edges shared by exactly 1,2,...,num_tests results.
+
+    spairs can be the dense matrix from shared_pairs or the counts array from
+    shared_pair_counts; zero entries are ignored.
+    '''
+    spairs = asarray(spairs).ravel()
+    return bincount(spairs[spairs > 0].astype(int64), 
+        minlength=num_tests+1)[1:num_tests+1]
 
 def plot_shared_pairs(spairs, num_tests, out_fp, show=True, save=False):
     '''Make a simple bar plot showing number of shared pairs and record stats.
     '''
-    counts = array([(spairs==i).sum() for i in range(1,num_tests+1)])
+    counts = shared_pairs_histogram(spairs, num_tests)
     heights = counts/counts.sum().astype(float)
     left = arange(num_tests)
     width = 1
@@ -0,0 +1,182 @@
+#!/usr/bin/env python
+# file created 10/18/2026
+
+__author__ = "Will Van Treuren"
+__copyright__ = "Copyright 2013, Will Van Treuren"
+__credits__ = ["Will Van Treuren, Sophie Weiss"]
+__license__ = "GPL"
+__url__ = ''
+__version__ = ".9-Dev"
+__maintainer__ = "Will Van Treuren"
+__email__ = "wdwvt1@gmail.com"
+
+'''
+Native random matrix theory (RMT) threshold detection so that the external
+RMT tool doesn't have to be run and its edge list parsed.
+
+Following Luo et al. 2006 (and the MENA pipeline), the Pearson correlation
+matrix is calculated once and a range of thresholds is swept. At each
+threshold entries with abs(r) < threshold are set to 0, otus with no
+remaining edges are dropped, and the eigenvalues of the thresholded matrix
+are found. The spectrum is unfolded by fitting a polynomial to its staircase
+function, and the nearest neighbor spacing distribution of the unfolded
+eigenvalues is compared with the exponential (Poisson) and Wigner surmise
+(GOE) distributions by chi-square tests. Correlations that are noise give
+GOE spacings; once the threshold removes them the spacings become Poisson,
+and the first threshold at which Poisson spacings can't be rejected is used.
+
+Thresholds are independent, so they are run in a process pool. Each worker
+gets the correlation matrix once and reuses a single work array for the
+thresholded matrices.
+'''
+
+from numpy import (array, empty, arange, abs as np_abs, diff, polyfit,
+    polyval, exp, pi, inf, take, fill_diagonal, triu_indices, nan, isnan,
+    nan_to_num)
+from scipy.linalg import eigh
+from scipy.stats import chi2
+from multiprocessing import Pool
+from correlations.eval.naive_matrix import naive_cc_matrix
+from correlations.eval.parse import RMTResults
+
+# spacing histogram bin edges, in units of the mean spacing
+SPACING_BINS = array([0., .25, .5, .75, 1., 1.25, 1.5, 2., 2.5, 3., inf])
+
+def poisson_cdf(s):
+    '''Return the cdf of nearest neighbor spacings of uncorrelated levels.'''
+    return 1 - exp(-s)
+
+def goe_cdf(s):
+    '''Return the cdf of the Wigner surmise for GOE spacings.'''
+    return 1 - exp(-pi*s**2/4.)
+
+def unfolded_spacings(eigvals, degree=6):
+    '''Return nearest neighbor spacings of the unfolded spectrum.
+
+    The staircase function N(E) (number of eigenvalues <= E) is fit with a
+    polynomial of the passed degree, which maps the spectrum to one with
+    unit mean density. Spacings are scaled to have mean 1.
+    '''
+    e = eigvals.copy()
+    e.sort()
+    # center and scale before fitting to keep polyfit well conditioned
+    scale = e.std() or 1.
+    x = (e - e.mean())/scale
+    unfolded = polyval(polyfit(x, arange(1., len(e)+1), degree), x)
+    s = diff(unfolded)
+    return s/s.mean()
+
+def spacing_chisquare(s, cdf, bins=SPACING_BINS):
+    '''Return the chi-square statistic and p-value of spacings s vs cdf.'''
+    obs = array([((s >= bins[k]) & (s < bins[k+1])).sum() for k in
+        range(len(bins)-1)], dtype=float)
+    expected = diff(cdf(bins))*len(s)
+    stat = ((obs - expected)**2/expected).sum()
+    return stat, chi2.sf(stat, len(bins)-2)
+
+# correlation matrix and work array of each worker process
+_cor = None
+_row_max = None
+_work = None
+
+def _init_worker(cor):
+    '''Set the correlation matrix and allocate the work array of a worker.'''
+    global _cor, _row_max, _work
+    _cor = cor
+    # constant otus have nan correlations; as 0s they never reach a threshold
+    # so their rows and columns are never copied into the work array
+    a = nan_to_num(np_abs(cor), copy=False)
+    fill_diagonal(a, 0.)
+    _row_max = a.max(1)
+    _work = empty(cor.size)
+
+def _threshold_stats(args):
+    '''Return spacing statistics of the correlation matrix at one threshold.
+
+    Module level so Pool can pickle it.
+    Outputs:
+     threshold, number of otus kept, poisson chi-square and p-value, goe
+     chi-square and p-value. statistics are nan if fewer than min_otus otus
+     have an edge at the threshold.
+    '''
+    threshold, degree, min_otus, rows_per_copy = args
+    keep = (_row_max >= threshold).nonzero()[0]
+    m = len(keep)
+    if m < min_otus:
+        return (threshold, m, nan, nan, nan, nan)
+    sub = _work[:m*m].reshape(m, m)
+    # copy kept rows and columns in chunks so no m X n temporary is made
+    for a in range(0, m, rows_per_copy):
+        take(_cor[keep[a:a+rows_per_copy]], keep, axis=1,
+            out=sub[a:a+rows_per_copy])
+    sub[np_abs(sub) < threshold] = 0.
+    fill_diagonal(sub, 1.)
+    eigvals = eigh(sub, eigvals_only=True, overwrite_a=True,
+        check_finite=False)
+    s = unfolded_spacings(eigvals, degree)
+    return ((threshold, m) + spacing_chisquare(s, poisson_cdf) +
+        spacing_chisquare(s, goe_cdf))
+
+def rmt_threshold(cor, thresholds=None, alpha=.05, degree=6, min_otus=20,
+    procs=1, rows_per_copy=256):
+    '''Sweep thresholds and return the GOE to Poisson transition threshold.
+
+    Inputs:
+     cor - 2d array, otus X otus correlation matrix. nan entries (e.g. from 
+     otus that are constant or all 0) are treated as no correlation.
+     thresholds - 1d array or None, thresholds to test in increasing order.
+     defaults to .30, .31, ... .95.
+     alpha - float, the first threshold where the Poisson chi-square p-value
+     is > alpha is chosen.
+     degree - int, degree of the polynomial used to unfold spectra.
+     min_otus - int, thresholds leaving fewer otus with edges aren't tested.
+     procs - int, number of processes thresholds are run in.
+     rows_per_copy - int, rows copied at once into the work array.
+    Outputs:
+     threshold - float, nan if no threshold gives Poisson spacings.
+     stats - thresholds X 6 array, see _threshold_stats.
+    '''
+    if thresholds is None:
+        thresholds = arange(30, 96)/100.
+    jobs = [(t, degree, min_otus, rows_per_copy) for t in thresholds]
+    if procs > 1:
+        pool = Pool(procs, initializer=_init_worker, initargs=(cor,))
+        stats = pool.map(_threshold_stats, jobs)
+        pool.close()
+        pool.join()
+    else:
+        _init_worker(cor)
+        stats = map(_threshold_stats, jobs)
+    stats = array(stats, dtype=float)
+    poisson = (stats[:, 3] > alpha) & ~isnan(stats[:, 3])
+    threshold = stats[poisson.argmax(), 0] if poisson.any() else nan
+    return threshold, stats
+
+def rmt_lines(cor, otu_ids, threshold):
+    '''Return edge list lines in the external RMT tool's format.
+
+    Every pair with abs(r) >= threshold is an edge.
+    '''
+    lines = ['OTU1\tOTU2\tType of interaction\tScore\tSignificance\n']
+    i, j = triu_indices(cor.shape[0], 1)
+    sig = np_abs(cor[i, j]) >= threshold
+    for a, b in zip(i[sig], j[sig]):
+        lines.append('%s\t%s\tCorrelated\t%r\t>=%.3f\n' % (otu_ids[a],
+            otu_ids[b], cor[a, b], threshold))
+    return lines
+
+def rmt_results(data, otu_ids, **kwargs):
+    '''Return an RMTResults object for the otus (rows) of data.
+
+    kwargs are passed to rmt_threshold. The chosen threshold and the sweep
+    statistics are set as the threshold and threshold_stats properties.
+    '''
+    cor = naive_cc_matrix(data, 'pearson')
+    threshold, stats = rmt_threshold(cor, **kwargs)
+    if isnan(threshold):
+        raise ValueError('No threshold gave Poisson spacings. Try a wider '+\
+            'range of thresholds.')
+    ro = RMTResults(rmt_lines(cor, otu_ids, threshold))
+    ro.threshold = threshold
+    ro.threshold_stats = stats
+    return ro
@@ -12,7 +12,7 @@ __status__ = "Development"
 
 from numpy import linspace, array, logical_xor
 import matplotlib.pyplot as plt
-from correlations.eval.result_eval import interacting_edges
+from correlations.eval.result_eval import interacting_edges, manifest_matches
 from biom.parse import parse_biom_table
 from correlations.eval.parse import SparCCResults
 
@@ -87,6 +87,25 @@ def roc_edge_count(start, stop, lhs_dim, rhs_dim, obs_edges, true_edge_type):
     print TP, IT, TT
     return TP, IT, TT
 
+def manifest_roc_counts(manifest, obs_edges, true_edge_types=None):
+    '''Return TP, IT and TT (see roc_edge_count) from a ground truth manifest.
+
+    Inputs:
+     manifest - Manifest object (see generators.manifest).
+     obs_edges - list of tuples, observed OTU edges.
+     true_edge_types - list of strs or None, manifest edge types (e.g. 
+     ['trans']) that count as true edges. None counts every type.
+    '''
+    if true_edge_types is None:
+        true_edge_types = list(set(manifest.types))
+    is_true = array([t in true_edge_types for t in manifest.types], 
+        dtype=bool)
+    matches = manifest_matches(manifest, obs_edges)
+    TP = int(is_true[matches[matches >= 0]].sum())
+    IT = int(is_true.sum())
+    TT = len(obs_edges)
+    return TP, IT, TT
+
 def roc(TP, IT, TT, E):
     '''Calculates the data necessary for making ROC curves
     
@@ -0,0 +1,266 @@
+#!/usr/bin/env python
+# file created 10/18/2026
+
+__author__ = "Will Van Treuren"
+__copyright__ = "Copyright 2013, Will Van Treuren"
+__credits__ = ["Will Van Treuren, Sophie Weiss"]
+__license__ = "GPL"
+__url__ = ''
+__version__ = ".9-Dev"
+__maintainer__ = "Will Van Treuren"
+__email__ = "wdwvt1@gmail.com"
+
+'''
+Native implementation of SparCC so that it does not have to be run externally
+and its SparCC_correlations/SparCC_pvalues files parsed. The algorithm follows
+Friedman and Alm 2012, Inferring Correlation Networks from Genomic Survey
+Data, PLoS Comp Bio 8:9.
+
+For each iteration fractions are drawn from a Dirichlet distribution for every
+sample, the variation matrix T_ij = var(log(x_i/x_j)) is calculated for all
+pairs at once from the covariance of the log fractions, and the basis
+variances are solved for from T. Strongly correlated pairs are excluded one at
+a time and the basis variances re-solved. The correlation estimate is the
+median over the iterations.
+
+The linear system for the basis variances is a diagonal matrix plus a low rank
+update (one rank for the ones matrix and two for each excluded pair), so it is
+solved with the Woodbury identity rather than a dense d X d solve.
+
+Pseudo p-values are the fraction of permuted tables (each otu shuffled across
+samples independently) with a correlation at least as extreme as the one
+observed. Replicates are independent and can be run in a process pool.
+'''
+
+from numpy import (array, zeros, empty, log, sqrt, triu, ones, median,
+    float32, unravel_index, argmax, clip, fill_diagonal, bincount)
+from numpy.linalg import solve
+from numpy.random import RandomState
+from multiprocessing import Pool
+from correlations.eval.parse import SparCCResults
+
+def dirichlet_fractions(counts, prng, size=None):
+    '''Draw fractions from Dirichlet(counts+1) for every sample (column).
+
+    A Dirichlet draw is a set of gamma draws normalized by their sum, so all
+    samples (and optionally size iterations) are drawn at once.
+    Inputs:
+     counts - 2d array, otus X samples.
+     prng - numpy.random.RandomState.
+     size - int or None, if passed returns a size X otus X samples array.
+    '''
+    alpha = counts + 1.
+    if size is not None:
+        alpha = array([alpha]*size)
+    g = prng.standard_gamma(alpha)
+    return g/g.sum(-2)[..., None, :]
+
+def variation_matrix(log_fracs):
+    '''Return T_ij = var(log(x_i/x_j)) for all pairs of rows of log_fracs.
+
+    var(a - b) = var(a) + var(b) - 2cov(a,b) so T comes from the covariance
+    matrix of the rows, i.e. one matrix product rather than a loop over pairs.
+    Works on otus X samples arrays or stacks of them.
+    '''
+    c = log_fracs - log_fracs.mean(-1)[..., None]
+    cov = _batched_cov(c)
+    cov /= log_fracs.shape[-1] - 1.
+    v = cov.diagonal(axis1=-2, axis2=-1)
+    return v[..., :, None] + v[..., None, :] - 2*cov
+
+def _batched_cov(c):
+    '''Return the (unnormalized) covariance of a 2d or stacked 3d array.'''
+    if c.ndim == 2:
+        return c.dot(c.T)
+    res = empty((c.shape[0], c.shape[1], c.shape[1]))
+    for i in range(c.shape[0]):
+        c[i].dot(c[i].T, out=res[i])
+    return res
+
+def basis_variances(T, excluded, dropped=(), v_min=1e-10):
+    '''Solve for the basis variances given the variation matrix.
+
+    The system is M*v = T.sum(1) where M = (d-2)I + ones, and each excluded
+    pair (i,j) removes 1 from M_ii, M_jj, M_ij and M_ji (and T_ij, T_ji must
+    already be zeroed). M is therefore diag + U*C*U.T with U having a column of
+    ones and an indicator column for each end of each excluded pair, and the
+    Woodbury identity gives the solution in O(d*k**2) for k exclusions.
+    Inputs:
+     T - 2d array, variation matrix with excluded entries set to 0.
+     excluded - list of (i,j) tuples, excluded pairs.
+     dropped - list of ints, components excluded from too many pairs. their
+     rows and columns of M are replaced by the identity (T rows and columns
+     must already be zeroed), which needs the dense solve.
+     v_min - float, basis variances <= 0 are set to v_min.
+    '''
+    d = T.shape[0]
+    t = T.sum(1)
+    k = len(excluded)
+    diag = ones(d)*(d-2.)
+    U = zeros((d, 1+2*k))
+    U[:,0] = 1.
+    C_inv = zeros((1+2*k, 1+2*k))
+    C_inv[0,0] = 1.
+    for m, (i, j) in enumerate(excluded):
+        diag[i] -= 1
+        diag[j] -= 1
+        U[i, 1+2*m] = 1.
+        U[j, 2+2*m] = 1.
+        # [[0,-1],[-1,0]] is its own inverse
+        C_inv[1+2*m, 2+2*m] = -1.
+        C_inv[2+2*m, 1+2*m] = -1.
+    if len(dropped) or (diag == 0).any():
+        # a node excluded from d-2 pairs, only possible for tiny tables
+        M = U.dot(solve(C_inv, U.T))
+        M[range(d), range(d)] += diag
+        for i in dropped:
+            M[i, :] = 0.
+            M[:, i] = 0.
+            M[i, i] = 1.
+        v = solve(M, t)
+    else:
+        Dt = t/diag
+        DU = U/diag[:, None]
+        v = Dt - DU.dot(solve(C_inv + U.T.dot(DU), U.T.dot(Dt)))
+    v[v <= 0] = v_min
+    return v
+
+def correlation_from_variances(T, v):
+    '''Return the basis correlation matrix from T and basis variances v.'''
+    cov = .5*(v[:, None] + v[None, :] - T)
+    sv = sqrt(v)
+    return cov/sv[:, None]/sv[None, :]
+
+def sparcc_iteration(T, th=.1, xiter=10):
+    '''Estimate basis correlations from one variation matrix.
+
+    As in the reference implementation, a component in d-3 or more excluded
+    pairs is dropped from the system, and if more than d-4 components are
+    dropped the clr correlations are returned instead.
+    Inputs:
+     T - 2d array, variation matrix.
+     th - float, pairs with abs(correlation) > th are excluded one at a time.
+     xiter - int, maximum number of exclusions.
+    '''
+    d = T.shape[0]
+    T_temp = T.copy()
+    excluded = []
+    dropped = []
+    v = basis_variances(T_temp, excluded)
+    cor = correlation_from_variances(T, v)
+    for _ in range(xiter):
+        cor_temp = triu(abs(cor), 1)
+        for i, j in excluded:
+            cor_temp[i, j] = 0.
+        i, j = unravel_index(argmax(cor_temp), cor_temp.shape)
+        if cor_temp[i, j] <= th:
+            break
+        excluded.append((i, j))
+        T_temp[i, j] = 0.
+        T_temp[j, i] = 0.
+        nexcluded = bincount(array(excluded).ravel(), minlength=d)
+        new = [k for k in (nexcluded >= d-3).nonzero()[0] if k not in dropped]
+        if new:
+            dropped.extend(new)
+            if len(dropped) > d-4:
+                return clr_correlation(T)
+            for k in new:
+                T_temp[k, :] = 0.
+                T_temp[:, k] = 0.
+        v = basis_variances(T_temp, excluded, dropped)
+        cor = correlation_from_variances(T, v)
+    return clip(cor, -1., 1.)
+
+def clr_correlation(T):
+    '''Return correlations of the clr transformed data from T.
+
+    The clr covariance is the double centered -T/2, so the raw data isn't
+    needed.
+    '''
+    c = -.5*T
+    c = c - c.mean(0)[None, :] - c.mean(1)[:, None] + c.mean()
+    sv = sqrt(c.diagonal())
+    return clip(c/sv[:, None]/sv[None, :], -1., 1.)
+
+def sparcc(counts, iterations=20, th=.1, xiter=10, batch=1, prng=None):
+    '''Calculate SparCC correlations between the rows of counts.
+
+    Inputs:
+     counts - 2d array, otus X samples.
+     iterations - int, number of Dirichlet draws to take the median over.
+     th, xiter - see sparcc_iteration.
+     batch - int, number of iterations whose fractions and variation matrices
+     are computed together. larger batches are faster for small tables but
+     hold batch otus X otus arrays in memory.
+     prng - numpy.random.RandomState or None.
+    '''
+    if prng is None:
+        prng = RandomState()
+    d = counts.shape[0]
+    # float32 halves the memory held for the median
+    cors = empty((iterations, d, d), dtype=float32)
+    for start in range(0, iterations, batch):
+        b = min(batch, iterations - start)
+        Ts = variation_matrix(log(dirichlet_fractions(counts, prng, size=b)))
+        for k in range(b):
+            cors[start+k] = sparcc_iteration(Ts[k], th, xiter)
+    res = median(cors, axis=0).astype(float)
+    fill_diagonal(res, 1.)
+    return res
+
+def permute_table(counts, prng):
+    '''Shuffle the values of every otu across samples independently.'''
+    res = counts.copy()
+    for row in res:
+        prng.shuffle(row)
+    return res
+
+def _sparcc_bootstrap(args):
+    '''Run sparcc on one permuted table. Module level so Pool can pickle it.'''
+    counts, seed, kwargs = args
+    prng = RandomState(seed)
+    return sparcc(permute_table(counts, prng), prng=prng, **kwargs)
+
+def sparcc_pvals(counts, cor, num_bootstraps=100, procs=1, seed=None,
+    **kwargs):
+    '''Return two sided pseudo p-values for the correlations in cor.
+
+    Each replicate permutes counts and recalculates sparcc with its own seed,
+    so results are the same for any number of procs.
+    Inputs:
+     counts - 2d array, otus X samples.
+     cor - 2d array, sparcc correlations of counts.
+     num_bootstraps - int, number of permuted tables.
+     procs - int, number of processes to run replicates in.
+     seed - int or None, seed from which the replicate seeds are drawn.
+     kwargs - passed to sparcc.
+    '''
+    seeds = RandomState(seed).randint(0, 2**31-1, size=num_bootstraps)
+    jobs = [(counts, s, kwargs) for s in seeds]
+    exceed = zeros(cor.shape)
+    abs_cor = abs(cor)
+    if procs > 1:
+        pool = Pool(procs)
+        boots = pool.imap_unordered(_sparcc_bootstrap, jobs)
+    else:
+        pool = None
+        boots = (_sparcc_bootstrap(job) for job in jobs)
+    for boot in boots:
+        exceed += abs(boot) >= abs_cor
+    if pool is not None:
+        pool.close()
+        pool.join()
+    return exceed/float(num_bootstraps)
+
+def sparcc_results(counts, otu_ids, sig_lvl=.001, pearson_filter=None,
+    num_bootstraps=100, procs=1, seed=None, **kwargs):
+    '''Run sparcc and its pseudo p-values and return a SparCCResults object.
+
+    kwargs are passed to sparcc (iterations, th, xiter, batch).
+    '''
+    prng = RandomState(seed)
+    cor = sparcc(counts, prng=prng, **kwargs)
+    pvals = sparcc_pvals(counts, cor, num_bootstraps, procs,
+        prng.randint(0, 2**31-1), **kwargs)
+    return SparCCResults.fromArrays(pvals, cor, otu_ids, sig_lvl,
+        pearson_filter)
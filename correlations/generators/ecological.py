@@ -39,7 +39,8 @@ Some interaction types not covered by the above are implemented including
 obligate syntrophy (dependence of OTU2 on OTU1's presence) and ...
 """
 
-from numpy import array, where, vstack
+from numpy import where, vstack, concatenate, cumsum, asarray, float64
+from correlations.generators.manifest import ecological_manifest
 
 def amensal_1d(otu1, otu2, strength):
     '''Depress abundance of OTU2 when OTU1 is present by strength*OTU1.
@@ -51,10 +52,13 @@ def amensal_1d(otu1, otu2, strength):
 
 def amensal_nd(otus, strength):
     '''Depress abundance of otus[-1] when otus[:-1] are present. 
-    Strength of reduction is otus[:-1].mean()*strength for each index.'''
-    tmp = otus[:-1].all(axis=0) #check that all otus[:-1] at each index > 0
-    tmp_vals = strength*otus[:-1].mean(axis=0) #mean value used for subtraction
-    depressed_vals = where(tmp == True, otus[-1] - tmp_vals, otus[-1])
+    Strength of reduction is otus[:-1].mean()*strength for each index.
+    Like the other _nd functions otus can also be a groups X otus X samples
+    array, in which case every group is processed at once.'''
+    tmp = otus[...,:-1,:].all(axis=-2) #check all otus[:-1] at each index > 0
+    tmp_vals = strength*otus[...,:-1,:].mean(axis=-2) #mean used for subtraction
+    depressed_vals = where(tmp == True, otus[...,-1,:] - tmp_vals, 
+        otus[...,-1,:])
     return where(depressed_vals > 0, depressed_vals, 0)
 
 def commensal_1d(otu1, otu2, strength):
@@ -68,9 +72,9 @@ def commensal_1d(otu1, otu2, strength):
 def commensal_nd(otus, strength):
     '''Increase abundance of otus[-1] when otus[:-1] are present. 
     Strength of increase is otus[:-1].mean()*strength for each index.'''
-    tmp = otus[:-1].all(axis=0) #check that all otus[:-1] > 0 at each index
-    tmp_vals = strength*otus[:-1].mean(axis=0) #mean value used for subtraction
-    return where(tmp == True, otus[-1] + tmp_vals, otus[-1])
+    tmp = otus[...,:-1,:].all(axis=-2) #check all otus[:-1] > 0 at each index
+    tmp_vals = strength*otus[...,:-1,:].mean(axis=-2) #mean used for addition
+    return where(tmp == True, otus[...,-1,:] + tmp_vals, otus[...,-1,:])
 
 def mutual_1d(otu1, otu2, strength):
     '''Increase abundance of otu1 and otu2 when both are present.
@@ -90,10 +94,13 @@ def mutual_nd(otus, strength):
     network are there then mutualism doesn't occur. Strength of increase for 
     otus[-1] proportional to average of network. Strength of increase for 
     otus[:-1] proportional to otus[-1].'''
-    tmp = otus.all(axis=0) #check that all otus > 0 at each index
-    o1 = where(tmp == True, otus[-1]+strength*otus[:-1].mean(axis=0), otus[-1])
-    ntwrk_os = where(tmp == True, otus[:-1]+strength*otus[-1], otus[:-1])
-    return vstack((ntwrk_os,o1)) #make input,output format the same
+    tmp = otus.all(axis=-2) #check that all otus > 0 at each index
+    o1 = where(tmp == True, otus[...,-1,:]+strength*otus[...,:-1,:].mean(
+        axis=-2), otus[...,-1,:])
+    ntwrk_os = where(tmp[...,None,:] == True, otus[...,:-1,:] + 
+        strength*otus[...,-1:,:], otus[...,:-1,:])
+    #make input,output format the same
+    return concatenate((ntwrk_os, o1[...,None,:]), axis=-2)
 
 def parasite_1d(otu1, otu2, strength):
     '''Increase abundance of otu1, decrease abundance of otu2 when both present.
@@ -109,14 +116,26 @@ def parasite_1d(otu1, otu2, strength):
 def parasite_nd(otus, strength):
     '''Increase abundance of otus[-1] at expense of otus[:-1].
     Strength of increase proportional to abundance of other parasitized otu. 
-    Strength of decrease is proportional to abundance of parasitizing otu.'''
-    parasite_otu = otus[-1]
-    parasitized_otus = []
-    for otu in otus[:-1]: #otus that are parasatized
-        parasite_otu, otu_i = parasite_1d(parasite_otu, otu, strength)
-        parasitized_otus.append(otu_i)
-    parasitized_otus.append(parasite_otu) #make output format same as input
-    return array(parasitized_otus)
+    Strength of decrease is proportional to abundance of parasitizing otu.
+
+    The parasite feeds on otus[:-1] in order (as parasite_1d applied to each
+    in turn), so the parasite abundance otus[:-1][k] sees is its abundance
+    plus the gains from otus[:-1][:k]. For nonnegative otus a parasite that is
+    present stays present, so those abundances are one cumulative sum.'''
+    otus = asarray(otus)
+    parasite_otu = otus[...,-1:,:]
+    hosts = otus[...,:-1,:]
+    # gain from each host is strength*host where both are present
+    gains = where((hosts != 0) & (parasite_otu != 0), hosts*strength, 0)
+    # parasite abundance before and after each host, summed in the same
+    # order the one host at a time version adds them
+    parasite = cumsum(concatenate((parasite_otu, gains), axis=-2), axis=-2)
+    before = parasite[...,:-1,:]
+    parasitized = where((hosts != 0) & (before != 0), 
+        hosts - before*strength, hosts)
+    parasitized = where(parasitized > 0, parasitized, 0)
+    #make output format same as input
+    return concatenate((parasitized, parasite[...,-1:,:]), axis=-2)
 
 def competition_1d(otu1, otu2, strength):
     '''Depress abundance of both otus if both otus present. 
@@ -138,12 +157,15 @@ def competition_nd(otus, strength):
     network are there then competition doesn't occur. Strength of decrease for 
     otus[-1] proportional to average of network. Strength of decrease for 
     otus[:-1] proportional to otus[-1].'''
-    tmp = otus.all(axis=0) #check co-presence
-    o1 = where(tmp == True, otus[-1]-strength*otus[:-1].mean(axis=0), otus[-1])
+    tmp = otus.all(axis=-2) #check co-presence
+    o1 = where(tmp == True, otus[...,-1,:]-strength*otus[...,:-1,:].mean(
+        axis=-2), otus[...,-1,:])
     o1 = where(o1 > 0, o1, 0)
-    ntwrk_os = where(tmp == True, otus[:-1]-strength*otus[-1], otus[:-1])
+    ntwrk_os = where(tmp[...,None,:] == True, otus[...,:-1,:] - 
+        strength*otus[...,-1:,:], otus[...,:-1,:])
     ntwrk_os = where(ntwrk_os > 0, ntwrk_os, 0)
-    return vstack((ntwrk_os,o1)) #make input,output format the same
+    #make input,output format the same
+    return concatenate((ntwrk_os, o1[...,None,:]), axis=-2)
 
 def obligate_syntroph_1d(otu1, strength):
     '''Allow otu2 only when otu1 present at abudance proportional to strength.
@@ -155,8 +177,8 @@ def obligate_syntroph_1d(otu1, strength):
 def obligate_syntroph_nd(otus, strength):
     '''Allow new otu only when all otus present. 
     Abundance proportional to strength*otus.mean().'''
-    tmp = otus.all(axis=0)
-    return where(tmp == True, strength*otus.mean(0), 0)
+    tmp = otus.all(axis=-2)
+    return where(tmp == True, strength*otus.mean(-2), 0)
 
 def partial_obligate_syntroph_1d(otu1, otu2):
     '''Allow otu2 only iff otu1 is present.
@@ -167,11 +189,77 @@ def partial_obligate_syntroph_nd(otus):
     '''Allow otus[-1] iff otus[:-1] are present. 
     Models obligate syntrophy where presence of otus[:-1] does not guarantee
     presence of otu[-1].'''
-    o1 = where(otus[:-1].all(0), otus[-1], 0)
-    return vstack([otus[:-1], o1])
+    o1 = where(otus[...,:-1,:].all(-2), otus[...,-1,:], 0)
+    return concatenate((otus[...,:-1,:], o1[...,None,:]), axis=-2)
+
+def _rhs_only(f):
+    '''Wrap an _nd function that returns only the new otus[-1].'''
+    def g(groups, strength):
+        out = groups.copy()
+        out[:,-1,:] = f(groups, strength)
+        return out
+    return g
 
+def _obligate_batch(groups, strength):
+    '''Replace the RHS of every group with the obligate syntroph of its LHS.'''
+    out = groups.copy()
+    out[:,-1,:] = obligate_syntroph_nd(groups[:,:-1,:], strength)
+    return out
 
+# batched version of each relationship, keyed by the names ecological tables 
+# (and ecological_manifest) use. each takes groups X dim+1 X samples arrays.
+BATCH_RELATIONSHIPS = {'amensally': _rhs_only(amensal_nd),
+    'commensually': _rhs_only(commensal_nd), 'mutually': mutual_nd,
+    'parasitically': parasite_nd, 'competitively': competition_nd,
+    'obligate': _obligate_batch, 
+    'partial-obligate-syntrophic': lambda g, s: partial_obligate_syntroph_nd(g)}
 
-    
+def apply_relationship(groups, relationship, strength):
+    '''Apply relationship to every group of otus in one vectorized call.
 
+    Inputs:
+     groups - 3d array, groups X dim+1 X samples. in each group the first dim 
+     otus are the LHS and the last is the RHS.
+     relationship - str, key of BATCH_RELATIONSHIPS.
+     strength - float, ignored for partial-obligate-syntrophic.
+    Outputs:
+     3d array, same shape as groups, each group as the matching _nd function 
+     would have made it.
+    '''
+    return BATCH_RELATIONSHIPS[relationship](asarray(groups, dtype=float64),
+        strength)
 
+def ecological_table(methods, num_otus, strengths, base_table, otu_ids=None):
+    '''Build an ecological table block by block from independent otus.
+
+    Each block of base_table is reshaped to groups X dim+1 X samples and its 
+    relationship is applied to all of its groups at once, so the cost is a 
+    handful of array operations per block rather than per group.
+    Inputs:
+     methods - list of strs, method of each block named like 
+     'amensally_related_2d_st_3' (see ecological_manifest).
+     num_otus - list of ints, otus in each block; must be a multiple of dim+1.
+     strengths - list of floats, strength of each block.
+     base_table - 2d array, sum(num_otus) X samples, independently drawn otus.
+     otu_ids - list of strs or None, passed to ecological_manifest.
+    Outputs:
+     table - 2d array, base_table with every block's relationship applied.
+     manifest - Manifest of the true edges, with the strengths passed here.
+    '''
+    base_table = asarray(base_table, dtype=float64)
+    table = base_table.copy()
+    samples = base_table.shape[1]
+    start = 0
+    for method, n, strength in zip(methods, num_otus, strengths):
+        tmp = method.split('_')
+        size = int(tmp[2][0]) + 1
+        if n % size:
+            raise ValueError('%s otus can not be split into groups of %s for %s.'
+                % (n, size, method))
+        groups = base_table[start:start+n].reshape(n//size, size, samples)
+        table[start:start+n] = apply_relationship(groups, tmp[0],
+            strength).reshape(n, samples)
+        start += n
+    manifest = ecological_manifest(methods, num_otus, otu_ids)
+    manifest.strengths = asarray(strengths, dtype=float64)[manifest.block_inds]
+    return table, manifest
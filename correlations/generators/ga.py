@@ -16,13 +16,20 @@ from:
 Generating Data with Identical Statistics but Dissimilar Graphics. Sangit 
 Chatterjee and Aykut Firat 2007. The American Statistician 61:3, 248-254.
 Small modifications were made to the mutation variance function to make it 
-have a slower decline trajectory.'''
+have a slower decline trajectory.
 
+The population functions (evolve_population and the functions it calls) hold
+a population as one popXnX2 array, so fitness, crossover, mutation and 
+coercion are done for every gene at once.'''
 
-from numpy import (ones, dot, cov, array, argsort, searchsorted, vstack, 
-    linspace, where, mean)
-from numpy.linalg import norm
-from numpy.random import randint, normal, shuffle
+
+from numpy import (cov, array, argsort, searchsorted, vstack, linspace, 
+    where, arange, sqrt, concatenate, asarray, float64, empty, matmul, 
+    frombuffer)
+from numpy import random as nprandom
+from numpy.random import randint, normal, RandomState
+from multiprocessing import Pool
+from multiprocessing.sharedctypes import RawArray
 from scipy.linalg.matfuncs import sqrtm
 from copy import deepcopy
 from scipy.stats.distributions import norm as gaussian
@@ -39,23 +46,38 @@ def coerce_gene(X, X_star):
     Chatterjee and Aykut Firat 2007. The American Statistician 61:3, 248-254.
     Inputs:
      X, X_star - nX2 arrays.
-     Reshaping is required because the way numpy handles matrix multiplication 
-     elementwise unless it recognizes the array as 2D. 
+    To coerce many genes to the same X_star use a GeneCoercer.
     """
-    # step ii: set mean value of columns of X to 0 using X=X-e_nx1*X_mean
-    n = X.shape[0]
-    X_new = X - dot(ones((n,1)),X.mean(0).reshape(1,2)) #a long col axis
-    # step iii: orthonormalize cols of X_new with Gram-Schmidt process
-    x, y = X_new[:,0], X_new[:,1]
-    u1 = x
-    u2 = y-(dot(x,y)/dot(x,x))*x
-    e1, e2 = u1/norm(u1), u2/norm(u2)
-    X_on = array([e1,e2]).T #orthnormalized X_new, .T to keep nX2
-    # step iv: transform X_on to ensure summary stat agreement
-    tmp_a = ((n-1.)**.5)*X_on
-    tmp_b = sqrtm(cov(X_star.T)).astype(float)
-    tmp_c = dot(ones((n,1)),X_star.mean(0).reshape(1,2))
-    return dot(tmp_a, tmp_b)+tmp_c
+    return GeneCoercer(X_star)(X)
+
+class GeneCoercer(object):
+    """Coerce genes to the summary statistics of one reference gene.
+    The mean and covariance square root of the reference gene (X_star in 
+    coerce_gene) are calculated once, so coercing many genes (e.g. every 
+    child of every generation of evolve_population) doesn't repeat sqrtm."""
+
+    def __init__(self, X_star):
+        """Init self with the mean and sqrtm(cov) of nX2 array X_star."""
+        X_star = asarray(X_star, dtype=float64)
+        self.mean = X_star.mean(0)
+        self.root = sqrtm(cov(X_star.T)).astype(float)
+
+    def __call__(self, X):
+        """Coerce an nX2 gene or a popXnX2 array of genes (see coerce_gene)."""
+        genes = asarray(X, dtype=float64)
+        if genes.ndim == 2:
+            return self(genes[None])[0]
+        n = genes.shape[1]
+        # step ii: set mean value of columns of X to 0 
+        X_new = genes - genes.mean(1)[:,None,:]
+        # step iii: orthonormalize cols of X_new with Gram-Schmidt process
+        x, y = X_new[:,:,0], X_new[:,:,1]
+        u2 = y-((x*y).sum(1)/(x*x).sum(1))[:,None]*x
+        X_on = empty(genes.shape)
+        X_on[:,:,0] = x/sqrt((x*x).sum(1))[:,None]
+        X_on[:,:,1] = u2/sqrt((u2*u2).sum(1))[:,None]
+        # step iv: transform X_on to ensure summary stat agreement
+        return matmul(((n-1.)**.5)*X_on, self.root) + self.mean
 
 def fitness(gene, ref_gene, method='graphic_dissimilarity'):
     """Calculates the fitness of a gene based on ref_gene and the method.
@@ -82,7 +104,7 @@ def stochastic_uniform(arr, k):
     Assumes arr has only positive values, otherwise will fail in an ugly 
     manner. 
     """
-    line = [arr[:i].sum() for i in range(1,len(arr)+1)]
+    line = asarray(arr).cumsum()
     return searchsorted(line, linspace(0, line[-1], k))
 
 def cross_genes(gene1, gene2):
@@ -165,33 +187,11 @@ def selection(gene_pop, ref_gene, df_and_params, elite_children,
 
 def evolve(inital_gene_pop, ref_gene, generations):
     """Evolve a gene population to maximized graphic dissimilarity.
-    Convinience function with reduced number of params."""
-    # initial, generation 0 children 
-    gene_children = [coerce_gene(gene, ref_gene) for gene in inital_gene_pop]
-    # make mutation variance generator
-    vg = var_gen(generations)
-    fitness_means = []
-    fitness_maxs = []
-    # run through generation number of selection cycles
-    for gen in range(generations):
-        # DEFINE ME
-        df_and_params = [gaussian, 0, vg.next()]
-        ec, cc, mc = selection(gene_children, ref_gene, df_and_params,
-            elite_children=.02, crossover_children=.8, mutation_children=.18, 
-            fitness_function='graphic_dissimilarity')
-        # coerce cc and mc since elite children haven't been mutated or crossed
-        # so their summary stats are still the same.
-        cc = [coerce_gene(i, ref_gene) for i in cc]
-        mc = [coerce_gene(i, ref_gene) for i in mc]
-        gene_children = ec+cc+mc
-        # shuffle may be unnecessary
-        shuffle(gene_children)
-        tmp =[fitness(i,ref_gene) for i in gene_children]
-        fitness_means.append(mean(tmp))
-        fitness_maxs.append(max(tmp))
-    # final coerce step because gene_children have different summary stats
-    #res = [coerce_gene(i,ref_gene) for i in gene_children]
-    return gene_children, fitness_means, fitness_maxs
+    Convinience function with reduced number of params. The population is 
+    evolved as one array by evolve_population and returned as a list."""
+    genes, fitness_means, fitness_maxs = evolve_population(
+        array(inital_gene_pop, dtype=float64), ref_gene, generations)
+    return list(genes), fitness_means, fitness_maxs
 
 def select_fittest(genes, ref_gene, fitness_function, k):
     """Select the fittest k members of the population."""
@@ -199,10 +199,195 @@ def select_fittest(genes, ref_gene, fitness_function, k):
         gene in genes])
     return fitness_pop, [genes[i] for i in argsort(fitness_pop)[-k:]]
 
+def coerce_genes(X, X_star):
+    """Coerce every gene of X to have the summary statistics of X_star.
+    Same procedure as coerce_gene for a popXnX2 array of genes."""
+    return GeneCoercer(X_star)(X)
+
+def population_fitness(genes, ref_gene, method='graphic_dissimilarity'):
+    """Return the fitness (see fitness) of every gene of a popXnX2 array."""
+    if method=='graphic_dissimilarity':
+        return abs(genes-ref_gene).sum(2).sum(1)
+
+def cross_population(parents1, parents2, prng=None):
+    """Cross each pair of genes as cross_genes does, with one random cut each.
+    Rows of the children above their cut come from parents1, the rest from 
+    parents2. prng is a numpy RandomState or None for the global state."""
+    prng = nprandom if prng is None else prng
+    cuts = prng.randint(parents1.shape[1], size=parents1.shape[0])
+    head = arange(parents1.shape[1])[None,:] < cuts[:,None]
+    return where(head[:,:,None], parents1, parents2)
+
+def mutate_population(genes, df_and_params, prng=None):
+    """Mutate every gene of a popXnX2 array as mutate_gene does."""
+    noise = df_and_params[0].rvs(*df_and_params[1:], size=genes.shape,
+        random_state=prng)
+    m_genes = genes+noise
+    return where(m_genes>0.0, m_genes, 0.0)
 
+def select_population(genes, ref_gene, df_and_params, elite_children, 
+    crossover_children, mutation_children, fitness_function, prng=None):
+    """Return the elite, crossover and mutation children of a population.
+    Like selection for a popXnX2 array of genes. The second set of crossover
+    parents is chosen by stochastic_uniform from the population in a random
+    order, so parents are paired at random rather than with themselves.
+    Outputs:
+     fitness_pop - 1d array, fitness of each of genes.
+     ec, cc, mc - popXnX2 arrays of children. cc and mc aren't coerced.
+    """
+    pop_size = len(genes)
+    num_elites = int(pop_size*elite_children)
+    num_crossovers = int(pop_size*crossover_children)
+    num_mutations = int(pop_size*mutation_children)
+    fitness_pop = population_fitness(genes, ref_gene, fitness_function)
+    order = argsort(fitness_pop)
+    ec = genes[order[len(order)-num_elites:]]
+    parents1 = stochastic_uniform(fitness_pop, num_crossovers)
+    perm = (nprandom if prng is None else prng).permutation(pop_size)
+    parents2 = perm[stochastic_uniform(fitness_pop[perm], num_crossovers)]
+    cc = cross_population(genes[parents1], genes[parents2], prng)
+    mc = mutate_population(genes[stochastic_uniform(fitness_pop, 
+        num_mutations)], df_and_params, prng)
+    return fitness_pop, ec, cc, mc
 
+def evolve_population(inital_genes, ref_gene, generations, prng=None,
+    elite_children=.02, crossover_children=.8, mutation_children=.18,
+    fitness_function='graphic_dissimilarity', variances=None, coerce=True):
+    """Evolve a popXnX2 array of genes to maximize graphic dissimilarity.
+    Array version of evolve.
+    Inputs:
+     inital_genes - popXnX2 array.
+     ref_gene - nX2 array.
+     generations - int.
+     prng - numpy RandomState or None for the global numpy random state.
+     elite_children, crossover_children, mutation_children, fitness_function
+     - see selection.
+     variances - list of floats or None, mutation variance of each 
+     generation. defaults to var_gen(generations).
+     coerce - boolean, if False inital_genes are assumed to already have the 
+     summary statistics of ref_gene (e.g. a population being evolved further).
+    Outputs:
+     genes - popXnX2 array, the final population.
+     fitness_means, fitness_maxs - lists, mean and max fitness of each 
+     generation.
+    """
+    rs = nprandom if prng is None else prng
+    ref_gene = asarray(ref_gene, dtype=float64)
+    coercer = GeneCoercer(ref_gene)
+    genes = coercer(inital_genes) if coerce else asarray(inital_genes, 
+        dtype=float64)
+    if variances is None:
+        variances = list(var_gen(generations))
+    fitness_means = []
+    fitness_maxs = []
+    for gen in range(generations):
+        df_and_params = [gaussian, 0, variances[gen]]
+        fitness_pop, ec, cc, mc = select_population(genes, ref_gene, 
+            df_and_params, elite_children, crossover_children, 
+            mutation_children, fitness_function, prng)
+        # elite children haven't been changed so they don't need coercion
+        genes = concatenate((ec, coercer(concatenate((cc, mc)))))
+        genes = genes[rs.permutation(len(genes))]
+        tmp = population_fitness(genes, ref_gene, fitness_function)
+        fitness_means.append(tmp.mean())
+        fitness_maxs.append(tmp.max())
+    return genes, fitness_means, fitness_maxs
 
+# populations of all islands, shared between the processes of evolve_islands
+_islands = None
 
+def _init_islands(shared, shape):
+    """Set the shared island populations of a worker process."""
+    global _islands
+    _islands = frombuffer(shared, dtype=float64).reshape(shape)
 
+def _evolve_island(args):
+    """Evolve one island's shared population in place for one epoch.
+    Module level so Pool can pickle it."""
+    k, ref_gene, variances, seed, kwargs = args
+    genes, means, maxs = evolve_population(_islands[k].copy(), ref_gene, 
+        len(variances), RandomState(seed), variances=variances, coerce=False,
+        **kwargs)
+    _islands[k] = genes
+    return means, maxs
 
+def evolve_islands(inital_genes, ref_gene, generations, migration_interval=10,
+    migrants=1, seed=0, procs=1, k=None, **kwargs):
+    """Evolve several populations (islands) in parallel with migration.
 
+    Each island is evolved by evolve_population in its own process for 
+    migration_interval generations (an epoch). The islands are kept in one 
+    shared memory array; after every epoch the migrants fittest genes of each
+    island replace the least fit genes of the next island (a ring). Each 
+    island gets its own seed for every epoch, drawn from seed, so results 
+    don't depend on procs. The mutation variance follows one var_gen 
+    schedule over all generations.
+    Inputs:
+     inital_genes - islandsXpopXnX2 array, initial population of each island.
+     ref_gene - nX2 array.
+     generations - int, total generations.
+     migration_interval - int, generations between migrations.
+     migrants - int, genes each island sends to the next.
+     seed - int, master seed.
+     procs - int, number of processes islands are evolved in.
+     k - int or None, number of fittest genes of all islands returned. 
+     defaults to the genes of one island.
+     kwargs - passed to evolve_population (e.g. crossover_children). the 
+     children fractions must keep the population size constant.
+    Outputs:
+     fitness_pop, fittest - fitness and genes (kXnX2 array) of the fittest k 
+     genes of all islands, in increasing fitness like select_fittest.
+     fitness_means, fitness_maxs - islandsXgenerations arrays, traces of each
+     island.
+    """
+    ref_gene = asarray(ref_gene, dtype=float64)
+    inital_genes = asarray(inital_genes, dtype=float64)
+    num_islands, pop_size = inital_genes.shape[:2]
+    num_children = sum([int(pop_size*kwargs.get(key, default)) for key, 
+        default in [('elite_children', .02), ('crossover_children', .8), 
+        ('mutation_children', .18)]])
+    if num_children != pop_size:
+        raise ValueError('children fractions give %s children for a '
+            'population of %s.' % (num_children, pop_size))
+    shape = inital_genes.shape
+    shared = RawArray('d', inital_genes.size)
+    islands = frombuffer(shared, dtype=float64).reshape(shape)
+    coercer = GeneCoercer(ref_gene)
+    for i in range(num_islands):
+        islands[i] = coercer(inital_genes[i])
+    variances = list(var_gen(generations))
+    starts = range(0, generations, migration_interval)
+    seeds = RandomState(seed).randint(0, 2**31-1, size=(len(starts), 
+        num_islands))
+    if procs > 1:
+        pool = Pool(procs, initializer=_init_islands, initargs=(shared, shape))
+        run = pool.map
+    else:
+        _init_islands(shared, shape)
+        run = map
+    fitness_means = [[] for i in range(num_islands)]
+    fitness_maxs = [[] for i in range(num_islands)]
+    for e, start in enumerate(starts):
+        jobs = [(i, ref_gene, variances[start:start+migration_interval], 
+            seeds[e, i], kwargs) for i in range(num_islands)]
+        for i, (means, maxs) in enumerate(run(_evolve_island, jobs)):
+            fitness_means[i].extend(means)
+            fitness_maxs[i].extend(maxs)
+        if migrants and num_islands > 1 and start + migration_interval < \
+            generations:
+            order = [argsort(population_fitness(islands[i], ref_gene, 
+                kwargs.get('fitness_function', 'graphic_dissimilarity'))) 
+                for i in range(num_islands)]
+            emigrants = [islands[i][order[i][-migrants:]].copy() for i in 
+                range(num_islands)]
+            for i in range(num_islands):
+                islands[i][order[i][:migrants]] = emigrants[i-1]
+    if procs > 1:
+        pool.close()
+        pool.join()
+    merged = islands.reshape((-1,) + shape[2:])
+    fitness_pop = population_fitness(merged, ref_gene, 
+        kwargs.get('fitness_function', 'graphic_dissimilarity'))
+    fittest = argsort(fitness_pop)[-(pop_size if k is None else k):]
+    return fitness_pop[fittest], merged[fittest].copy(), \
+        array(fitness_means), array(fitness_maxs)
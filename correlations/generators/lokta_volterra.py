@@ -49,10 +49,26 @@ C = array([[1., 0, -.1],
            [-1.5, 0.075, 0]])
 f = dX_dt_template(C)
 Y = lokta_volterra(f, array([10,5]), 0, 15, 1000)
+
+Stiff systems integrate with far fewer derivative evaluations if the exact 
+Jacobian is passed, e.g.
+Y = lokta_volterra(f, array([10,5]), 0, 15, 1000, Dfun=dX_dt_jacobian(C))
+
+Many independent communities can be integrated at once with 
+lokta_volterra_batch. The communities are stacked into one system whose 
+species are community 0's, then community 1's, etc. (smaller communities are 
+padded with species that are always 0). The derivative of the stacked system 
+is a batched matrix product written into preallocated arrays, and its 
+Jacobian is block diagonal, so it is passed to odeint as a banded matrix. 
+lokta_volterra_sweep splits a list of communities into batches of similar 
+size and integrates the batches in a process pool.
 '''
 
-from numpy import array, where, eye, linspace, matrix, hstack
+from numpy import (array, where, eye, linspace, zeros, empty, einsum,
+    multiply, add, arange, indices, argsort)
+from multiprocessing import Pool
 from scipy import integrate
+from correlations.generators.manifest import interaction_matrix_manifest
 
 def dX_dt_template(C):
     '''Create a function that scipy.integrate.odeint can use for LV models.
@@ -78,19 +94,221 @@ def dX_dt_template(C):
     # This function returns:
     # X <*> (C*Y)  
     # where * is matrix multiplication and <*> is elementwise multiplication
-    return lambda X, t=0: X*array(matrix(C)*matrix(hstack((array([1]),X))).T).reshape(len(X))
+    alpha, A = C[:,0], C[:,1:]
+    return lambda X, t=0: X*(alpha + A.dot(X))
+
+
+
+def dX_dt_jacobian(C):
+    '''Create the Jacobian of the function dX_dt_template(C) returns.
+    The derivative of X <*> (alpha + A*X) is diag(alpha + A*X) + diag(X)*A,
+    where alpha = C[:,0] and A = C[:,1:]. Passing it to the integrator avoids
+    finite difference estimates of the Jacobian (n extra derivative 
+    evaluations each) when the system is stiff.
+    Inputs:
+     C - nXn+1 array, see dX_dt_template.
+    Outputs:
+     A function of X and t (defaulting to 0) returning the nXn Jacobian.
+    '''
+    alpha, A = C[:,0], C[:,1:]
+    diag = arange(len(C))
+    def jac(X, t=0):
+        J = X[:,None]*A
+        J[diag, diag] += alpha + A.dot(X)
+        return J
+    return jac
 
+class CallCounter(object):
+    '''Wrap a function and count how many times it is called.'''
 
+    def __init__(self, f):
+        '''Init self with the function to count.'''
+        self.f = f
+        self.calls = 0
 
-def lokta_volterra(dX_dt, X0, lb, ub, ts):
+    def __call__(self, *args):
+        '''Call the function.'''
+        self.calls += 1
+        return self.f(*args)
+
+# solve_ivp methods that use a Jacobian
+IMPLICIT_METHODS = ['BDF', 'Radau', 'LSODA']
+
+def lokta_volterra(dX_dt, X0, lb, ub, ts, Dfun=None, method='odeint', 
+    rtol=None, atol=None, full_output=False):
     '''Simulate species interactions via Lokta-Volterra model.
     Inputs:
      dX_dt - function, must take a vector X (species abundances) and a scalar t
      for timestep. t must default to 0.
      X0 - 1d arr, initial populations. 
      ub, lb, ts - int, bounds and timestep size.
+     Dfun - function or None, Jacobian of dX_dt with the same signature (see
+     dX_dt_jacobian). None estimates it by finite differences.
+     method - str, odeint (LSODA, switching between nonstiff and stiff 
+     methods) or a scipy.integrate.solve_ivp method, e.g. BDF or Radau for 
+     stiff systems. Dfun is only used by odeint and IMPLICIT_METHODS.
+     rtol, atol - floats or None, integrator tolerances. None uses the 
+     integrator's defaults.
+     full_output - boolean, if True also return a dict with the number of 
+     dX_dt (nfev) and Dfun (njev) evaluations.
     '''
     t = linspace(lb, ub,  ts) #timesteps to eval lv at
-    X = integrate.odeint(dX_dt, X0, t)
+    f = CallCounter(dX_dt)
+    jac = None if Dfun is None else CallCounter(Dfun)
+    if method == 'odeint':
+        X = integrate.odeint(f, X0, t, Dfun=jac, rtol=rtol, atol=atol)
+    else:
+        kwargs = dict((k, v) for k, v in [('rtol', rtol), ('atol', atol)] if
+            v is not None)
+        if jac is not None and method in IMPLICIT_METHODS:
+            kwargs['jac'] = lambda s, x: jac(x, s)
+        res = integrate.solve_ivp(lambda s, x: f(x, s), (t[0], t[-1]), 
+            array(X0, dtype=float), method=method, t_eval=t, **kwargs)
+        if not res.success:
+            raise RuntimeError(res.message)
+        X = res.y.T
+    if full_output:
+        return X.T, {'nfev': f.calls, 'njev': 0 if jac is None else 
+            jac.calls}
     return X.T #transpose to make otusXsamples
 
+def stack_communities(Cs, X0s):
+    '''Stack interaction matrices and initial populations of communities.
+    Inputs:
+     Cs - list of nkXnk+1 arrays, interaction matrix of each community (see
+     dX_dt_template).
+     X0s - list of 1d arrays, initial populations of each community.
+    Outputs:
+     alphas - 2d array, communities X n, growth rates. n is the size of the 
+     largest community; missing species have growth rate and populations 0.
+     A - 3d array, communities X n X n, interaction coefficients.
+     X0 - 1d array, initial populations of the stacked system.
+     sizes - list of ints, number of species in each community.
+    '''
+    sizes = [C.shape[0] for C in Cs]
+    m, n = len(Cs), max(sizes)
+    alphas, A, X0 = zeros((m, n)), zeros((m, n, n)), zeros((m, n))
+    for k, (C, x0) in enumerate(zip(Cs, X0s)):
+        alphas[k, :sizes[k]] = C[:,0]
+        A[k, :sizes[k], :sizes[k]] = C[:,1:]
+        X0[k, :sizes[k]] = x0
+    return alphas, A, X0.ravel(), sizes
+
+def stacked_dX_dt(alphas, A):
+    '''Return the derivative and banded Jacobian of stacked communities.
+
+    The functions write into arrays allocated once here, so no arrays are 
+    made when odeint calls them (odeint copies what they return); the array 
+    returned by one call is overwritten by the next. The 
+    Jacobian of a community is diag(alpha + A X) + diag(X) A; the stacked 
+    Jacobian is block diagonal so only its 2n-1 diagonals are returned, 
+    jac[i - j + n - 1, j] = dXi'/dXj, the format odeint expects with 
+    ml = mu = n - 1.
+    Inputs:
+     alphas, A - see stack_communities.
+    Outputs:
+     dX_dt, jac - functions of X (the stacked populations) and t.
+    '''
+    m, n = alphas.shape
+    growth = empty((m, n))
+    dX = empty((m, n))
+    blocks = empty((m, n, n))
+    band = zeros((2*n-1, m*n))
+    # band position of every entry of blocks
+    p, q = indices((n, n))
+    band_rows = (zeros((m, 1), dtype=int) + (p - q + n - 1).ravel()).ravel()
+    band_cols = (arange(m)[:,None]*n + q.ravel()).ravel()
+    diag = arange(n)
+    def dX_dt(X, t=0):
+        X = X.reshape(m, n)
+        einsum('kij,kj->ki', A, X, out=growth)
+        add(growth, alphas, out=growth)
+        return multiply(X, growth, out=dX).ravel()
+    def jac(X, t=0):
+        X = X.reshape(m, n)
+        einsum('kij,kj->ki', A, X, out=growth)
+        add(growth, alphas, out=growth)
+        multiply(X[:,:,None], A, out=blocks)
+        blocks[:, diag, diag] += growth
+        band[band_rows, band_cols] = blocks.ravel()
+        return band
+    return dX_dt, jac
+
+def community_manifests(Cs):
+    '''Return the Manifest of the true edges of each community in Cs.
+
+    Species of each community are named o0, o1, ... in the order of its C.
+    '''
+    return [interaction_matrix_manifest(C, ['o%s' % k for k in 
+        range(C.shape[0])]) for C in Cs]
+
+def lokta_volterra_batch(Cs, X0s, lb, ub, ts, jacobian=True, rtol=None,
+    atol=None, full_output=False, manifests=False):
+    '''Simulate many independent communities via Lokta-Volterra at once.
+    Inputs:
+     Cs, X0s - see stack_communities.
+     ub, lb, ts - int, bounds and timestep size.
+     jacobian - boolean, if True odeint is passed the analytic Jacobian 
+     rather than estimating it by finite differences when the system is 
+     stiff.
+     rtol, atol - floats or None, odeint tolerances, applied to the stacked
+     system. communities share step sizes, so results agree with integrating
+     each community alone to within the tolerances rather than exactly.
+     full_output - boolean, see lokta_volterra.
+     manifests - boolean, if True the manifest of each community (see 
+     community_manifests) is returned after the communities.
+    Outputs:
+     list of 2d arrays, otusXsamples of each community.
+    '''
+    alphas, A, X0, sizes = stack_communities(Cs, X0s)
+    m, n = alphas.shape
+    dX_dt, jac = [CallCounter(f) for f in stacked_dX_dt(alphas, A)]
+    t = linspace(lb, ub, ts) #timesteps to eval lv at
+    if jacobian:
+        X = integrate.odeint(dX_dt, X0, t, Dfun=jac, ml=n-1, mu=n-1, 
+            rtol=rtol, atol=atol)
+    else:
+        X = integrate.odeint(dX_dt, X0, t, rtol=rtol, atol=atol)
+    X = X.T.reshape(m, n, len(t))
+    res = [X[k, :size] for k, size in enumerate(sizes)]
+    out = [res]
+    if manifests:
+        out.append(community_manifests(Cs))
+    if full_output:
+        out.append({'nfev': dX_dt.calls, 'njev': jac.calls})
+    return tuple(out) if len(out) > 1 else res
+
+def _lokta_volterra_job(args):
+    '''Run one batch of a sweep. Module level so Pool can pickle it.'''
+    return lokta_volterra_batch(*args)
+
+def lokta_volterra_sweep(Cs, X0s, lb, ub, ts, procs=1, 
+    communities_per_batch=64, jacobian=True, rtol=None, atol=None, 
+    manifests=False):
+    '''Simulate communities in batches, optionally in a process pool.
+
+    Communities are sorted by number of species before they are split into
+    batches of communities_per_batch, so little padding is needed when 
+    communities differ in size. Results are returned in the order of Cs and
+    don't depend on procs. Other inputs and the output are as in 
+    lokta_volterra_batch.
+    '''
+    order = argsort([C.shape[0] for C in Cs], kind='mergesort')
+    jobs = []
+    for a in range(0, len(order), communities_per_batch):
+        inds = order[a:a+communities_per_batch]
+        jobs.append(([Cs[k] for k in inds], [X0s[k] for k in inds], lb, ub, 
+            ts, jacobian, rtol, atol))
+    if procs > 1:
+        pool = Pool(procs)
+        batches = pool.map(_lokta_volterra_job, jobs)
+        pool.close()
+        pool.join()
+    else:
+        batches = map(_lokta_volterra_job, jobs)
+    res = [None]*len(Cs)
+    for k, X in zip(order, [X for batch in batches for X in batch]):
+        res[k] = X
+    if manifests:
+        return res, community_manifests(Cs)
+    return res
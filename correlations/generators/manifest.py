@@ -0,0 +1,297 @@
+#!/usr/bin/env python
+# file created 10/18/2026
+
+__author__ = "Will Van Treuren"
+__copyright__ = "Copyright 2013, Will Van Treuren"
+__credits__ = ["Will Van Treuren, Sophie Weiss"]
+__license__ = "GPL"
+__url__ = ''
+__version__ = ".9-Dev"
+__maintainer__ = "Will Van Treuren"
+__email__ = "wdwvt1@gmail.com"
+
+'''
+Ground truth manifests for generated tables.
+
+A manifest records which otus the generators made related, so evaluation can
+join observed edges against the true edges directly instead of rebuilding them
+from otu names and start/stop/dim arithmetic. It holds:
+ blocks - one (method, start, stop, dim, strength) tuple for each group of otus
+ a generator produced, start/stop index the otu ids.
+ edges - every true edge as indices into the otu ids, with its type (e.g. cis
+ for two LHS otus of an ecological rule, trans for a LHS and the RHS otu),
+ sign (1 copresence, -1 mutual exclusion, 0 unknown), strength and block.
+
+Manifests are written as tab separated text, a #blocks section followed by an
+#edges section, with the otu ids on the first line.
+'''
+
+from numpy import (array, arange, asarray, repeat, hstack, concatenate,
+    triu_indices, sign as np_sign, abs as np_abs, maximum, int64, nan, where,
+    float64)
+
+# sign of the edge between the LHS and the RHS otu of each ecological method
+RELATIONSHIP_SIGNS = {'amensally': -1, 'commensually': 1, 'mutually': 1,
+    'parasitically': -1, 'competitively': -1, 'obligate': 1,
+    'partial-obligate-syntrophic': 1}
+
+class Manifest(object):
+    '''True edges and generating blocks of a table.'''
+
+    def __init__(self, otu_ids, blocks, i, j, types, signs, strengths,
+        block_inds):
+        '''Init self from blocks and edge arrays (see module docstring).'''
+        self.otu_ids = list(otu_ids)
+        self.blocks = [tuple(b) for b in blocks]
+        self.i = asarray(i, dtype=int64)
+        self.j = asarray(j, dtype=int64)
+        self.types = array(types, dtype=str) if len(types) else \
+            array([], dtype=str)
+        self.signs = asarray(signs, dtype=int64)
+        self.strengths = asarray(strengths, dtype=float64)
+        self.block_inds = asarray(block_inds, dtype=int64)
+
+    @classmethod
+    def fromLines(cls, lines):
+        '''Init from the lines of a written manifest.'''
+        lines = [line.rstrip('\n') for line in lines if line.strip()]
+        otu_ids = lines[0].split('\t')[1:]
+        b_start = lines.index('#blocks') + 2 # skip the column header
+        e_start = lines.index('#edges')
+        blocks = []
+        for line in lines[b_start:e_start]:
+            name, start, stop, dim, strength = line.split('\t')
+            blocks.append((name, int(start), int(stop), int(dim),
+                float(strength)))
+        inds = dict((otu, k) for k, otu in enumerate(otu_ids))
+        vals = [line.split('\t') for line in lines[e_start+2:]]
+        if len(vals) == 0:
+            return cls(otu_ids, blocks, [], [], [], [], [], [])
+        o1, o2, types, signs, strengths, block_inds = zip(*vals)
+        return cls(otu_ids, blocks, [inds[o] for o in o1],
+            [inds[o] for o in o2], types, map(int, signs),
+            map(float, strengths), map(int, block_inds))
+
+    def toLines(self):
+        '''Return the lines of the manifest.'''
+        lines = ['#OTU IDs\t%s\n' % '\t'.join(self.otu_ids), '#blocks\n',
+            'method\tstart\tstop\tdim\tstrength\n']
+        lines.extend(['%s\t%s\t%s\t%s\t%r\n' % tuple(b) for b in self.blocks])
+        lines.extend(['#edges\n',
+            'OTU1\tOTU2\ttype\tsign\tstrength\tblock\n'])
+        lines.extend(['%s\t%s\t%s\t%s\t%r\t%s\n' % (self.otu_ids[a],
+            self.otu_ids[b], t, s, float(st), k) for a, b, t, s, st, k in
+            zip(self.i, self.j, self.types, self.signs, self.strengths,
+            self.block_inds)])
+        return lines
+
+    def write(self, fp):
+        '''Write the manifest to fp.'''
+        o = open(fp, 'w')
+        o.writelines(self.toLines())
+        o.close()
+
+def manifest_maker(manifest_fp):
+    """convenience function, automate creation of a manifest object."""
+    o = open(manifest_fp, 'U')
+    lines = o.readlines()
+    o.close()
+    return Manifest.fromLines(lines)
+
+def combine_manifests(manifests, otu_ids):
+    '''Return one manifest for a table built from several generators.
+
+    The otus of each manifest must be in otu_ids; blocks keep their order and
+    edges are reindexed to otu_ids.
+    '''
+    inds = dict((otu, k) for k, otu in enumerate(otu_ids))
+    blocks, i, j, block_inds = [], [], [], []
+    for m in manifests:
+        remap = array([inds[o] for o in m.otu_ids], dtype=int64)
+        for name, start, stop, dim, strength in m.blocks:
+            # blocks stay contiguous since otus are appended in order
+            new_start = inds[m.otu_ids[start]] if start < len(m.otu_ids) else \
+                len(otu_ids)
+            blocks.append((name, new_start, new_start + stop - start, dim,
+                strength))
+        i.append(remap[m.i])
+        j.append(remap[m.j])
+        block_inds.append(m.block_inds + len(blocks) - len(m.blocks))
+    return Manifest(otu_ids, blocks, concatenate(i), concatenate(j),
+        concatenate([m.types for m in manifests]),
+        concatenate([m.signs for m in manifests]),
+        concatenate([m.strengths for m in manifests]),
+        concatenate(block_inds))
+
+def relationship_edges(start, stop, dim):
+    '''Return the true edges of groups of dim+1 otus from start to stop.
+
+    Each group is dim LHS otus followed by its RHS otu. Every pair of otus in
+    a group is an edge; it is cis if both are LHS otus and trans otherwise.
+    Outputs:
+     i, j - int arrays, otu indices with i < j.
+     trans - boolean array.
+    '''
+    size = dim + 1
+    groups = (stop - start)//size
+    a, b = triu_indices(size, 1)
+    offsets = start + arange(groups)*size
+    i = (offsets.reshape(-1, 1) + a).ravel()
+    j = (offsets.reshape(-1, 1) + b).ravel()
+    trans = repeat((b == dim).reshape(1, -1), groups, 0).ravel()
+    return i, j, trans
+
+def ecological_manifest(methods, num_otus, otu_ids=None):
+    '''Return the manifest of a table made from ecological relationships.
+
+    Inputs:
+     methods - list of strs, generating method of each block in order, named
+     like 'amensally_related_1d_st_3' (relationship, dim, strength).
+     num_otus - list of ints, number of otus each method generated.
+     otu_ids - list of strs or None, ids of the table's otus. defaults to
+     o0, o1, ...
+    '''
+    starts = hstack([[0], asarray(num_otus[:-1], dtype=int64).cumsum()])
+    stops = starts + asarray(num_otus, dtype=int64)
+    if otu_ids is None:
+        otu_ids = ['o%s' % k for k in range(stops[-1])]
+    blocks, i, j, types, signs, strengths, block_inds = [], [], [], [], [], \
+        [], []
+    for k, (method, start, stop) in enumerate(zip(methods, starts, stops)):
+        tmp = method.split('_')
+        dim = int(tmp[2][0])
+        strength = nan if tmp[-1] == 'NA' else float(tmp[-1])
+        blocks.append((method, start, stop, dim, strength))
+        bi, bj, trans = relationship_edges(start, stop, dim)
+        i.append(bi)
+        j.append(bj)
+        types.append(where(trans, 'trans', 'cis'))
+        # cis otus are drawn independently, their sign is unknown
+        signs.append(where(trans, RELATIONSHIP_SIGNS.get(tmp[0], 0), 0))
+        strengths.append(repeat(strength, len(bi)))
+        block_inds.append(repeat(k, len(bi)))
+    return Manifest(otu_ids, blocks, concatenate(i), concatenate(j),
+        concatenate(types), concatenate(signs), concatenate(strengths),
+        concatenate(block_inds))
+
+def block_manifest(methods, num_otus, otu_ids=None, dims=None):
+    '''Return a manifest of consecutive blocks of otus with no true edges.
+
+    For tables whose otus are related only by the block they came from, e.g.
+    null tables (one block per distribution) or signal and envelope series,
+    so evaluation can find an otu's block and position without its name.
+    dims - list of ints or None, dim of each block. defaults to 0s.
+    '''
+    starts = hstack([[0], asarray(num_otus[:-1], dtype=int64).cumsum()])
+    stops = starts + asarray(num_otus, dtype=int64)
+    if otu_ids is None:
+        otu_ids = ['o%s' % k for k in range(stops[-1])]
+    if dims is None:
+        dims = [0]*len(methods)
+    blocks = [(m, a, b, d, nan) for m, a, b, d in zip(methods, starts, stops,
+        dims)]
+    return Manifest(otu_ids, blocks, [], [], [], [], [], [])
+
+def rules_manifest(inducers, induced, rules, otu_ids, method='rules_model2'):
+    '''Return the manifest of an otu made from inducing otus by a rule model.
+
+    Inputs:
+     inducers - list of ints, indices of the inducing otus in otu_ids.
+     induced - int, index of the induced otu.
+     rules - model1 ([lb, ub]) or model2 ([coefficient, 'add'/'sub']) rules
+     of each inducer. model2 rules give the sign and strength of each edge,
+     model1 edges have unknown sign.
+    '''
+    signs, strengths = [], []
+    for r in rules:
+        if r[1] in ['add', 'sub']:
+            signs.append(1 if r[1] == 'add' else -1)
+            strengths.append(r[0])
+        else:
+            signs.append(0)
+            strengths.append(nan)
+    n = len(inducers)
+    stop = max(list(inducers)+[induced]) + 1
+    return Manifest(otu_ids, [(method, min(list(inducers)+[induced]), stop,
+        n, nan)], inducers, [induced]*n, ['trans']*n, signs, strengths, [0]*n)
+
+def rules_table_manifest(inducers, otu_ids, coefficients=None, 
+    method='rules_model2'):
+    '''Return the manifest of a batch of rule model otus.
+
+    Row r of inducers holds the indices (into otu_ids) of the otus inducing 
+    the rth new otu, and the new otus are the last len(inducers) otu_ids (see
+    rules.model1_table and model2_table). Model 2 coefficients give the sign
+    and strength of each edge; without coefficients (model 1) the sign is 
+    unknown.
+    '''
+    inducers = asarray(inducers, dtype=int64)
+    n, k = inducers.shape
+    first = len(otu_ids) - n
+    j = repeat(first + arange(n), k)
+    if coefficients is None:
+        signs, strengths = [0]*(n*k), [nan]*(n*k)
+    else:
+        c = asarray(coefficients, dtype=float64).ravel()
+        signs, strengths = np_sign(c).astype(int64), np_abs(c)
+    return Manifest(otu_ids, [(method, first, len(otu_ids), k, nan)], 
+        inducers.ravel(), j, ['trans']*(n*k), signs, strengths, [0]*(n*k))
+
+def interaction_matrix_manifest(C, otu_ids, method='lotka_volterra'):
+    '''Return the manifest of a Lotka-Volterra interaction matrix.
+
+    C is otus X otus+1 (growth rates then interaction coefficients). Otus i
+    and j are related if either cij or cji is nonzero. The sign is the sign
+    of the coefficients, or 0 if they disagree (e.g. predator and prey), and
+    the strength is the largest absolute coefficient.
+    '''
+    inter = asarray(C, dtype=float64)[:, 1:]
+    n = inter.shape[0]
+    i, j = triu_indices(n, 1)
+    s1, s2 = np_sign(inter[i, j]), np_sign(inter[j, i])
+    related = (s1 != 0) | (s2 != 0)
+    signs = where(s1 == 0, s2, where((s2 == 0) | (s1 == s2), s1, 0))[related]
+    strengths = maximum(np_abs(inter[i, j]), np_abs(inter[j, i]))[related]
+    i, j = i[related], j[related]
+    return Manifest(otu_ids, [(method, 0, n, n-1, nan)], i, j,
+        ['interaction']*len(i), signs.astype(int64), strengths, [0]*len(i))
+
+def correlation_matrix_manifest(rho, otu_ids, min_abs=0., method='copula'):
+    '''Return the manifest of a copula correlation (rho) matrix.
+
+    Pairs with abs(rho) > min_abs are edges with the sign and strength of rho.
+    '''
+    rho = asarray(rho, dtype=float64)
+    n = rho.shape[0]
+    i, j = triu_indices(n, 1)
+    r = rho[i, j]
+    keep = np_abs(r) > min_abs
+    return Manifest(otu_ids, [(method, 0, n, n-1, nan)], i[keep], j[keep],
+        ['correlation']*keep.sum(), np_sign(r[keep]).astype(int64),
+        np_abs(r[keep]), [0]*keep.sum())
+
+def timeseries_manifest(pts, otu_ids, params=('freq', 'amp', 'phase',
+    'noise', 'adj'), method='timeseries'):
+    '''Return the manifest of otus generated from points in R5.
+
+    pts are the points (see cube_d5_indices) each otu was generated from. Two
+    otus that share every parameter but one are an edge whose type names the
+    parameter they differ in. Signs are unknown since e.g. a phase shift can
+    invert the relationship.
+    '''
+    # encode each parameter value as an integer so points can be compared
+    codes = []
+    for d in range(len(params)):
+        vals = [repr(pt[d]) for pt in pts]
+        lookup = dict((v, k) for k, v in enumerate(sorted(set(vals))))
+        codes.append([lookup[v] for v in vals])
+    codes = array(codes, dtype=int64).T
+    n = len(pts)
+    i, j = triu_indices(n, 1)
+    differ = codes[i] != codes[j]
+    one = differ.sum(1) == 1
+    i, j = i[one], j[one]
+    types = array(['same_except_%s' % p for p in params])[
+        differ[one].argmax(1)]
+    return Manifest(otu_ids, [(method, 0, n, len(params), nan)], i, j, types,
+        [0]*len(i), [nan]*len(i), [0]*len(i))
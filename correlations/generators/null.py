@@ -26,38 +26,53 @@ higher sparsity than is normally created with the Dirichlet procedure by
 subtracting mean value of the table from all entries (entires < 0 -> 0).
 '''
 
-from numpy import array, where
-from numpy.random import shuffle
-from qiime.util import get_tmp_filename
+from numpy import array, where, zeros, float64, asarray
+from numpy import random as nprandom
+from numpy.random import RandomState
+from multiprocessing import Pool
+from biom.table import table_factory
+from correlations.generators.util import zero_inflate
 import os
 
-# command string used by R for methods 2 and 3
-COMMAND_STR = \
-"""#!/usr/bin/env Rscript
-library('gtools');
-prior_vals = %s
-total_prior_knowledge = %s
-prior_vals = total_prior_knowledge*(prior_vals/sum(prior_vals))
-taxa = length(prior_vals)
-samples = %s
-sequencing_depth = round(%s)
-d = matrix(0,nrow=taxa,ncol=samples)
-for (i in 1:samples){
-    pvs = rdirichlet(1,alpha=prior_vals)
-    d[,i]=table(factor(sample(taxa,sequencing_depth,pvs,replace=TRUE),1:taxa))
-}
-write.table(d, file=%s, sep=',', quote=FALSE, col.names=FALSE, row.names=FALSE)
-"""
-
-def model1_otu(df_and_params, samples):
-    """Return an otu vector drawn from df given params and of length samples."""
-    return df_and_params[0].rvs(*df_and_params[1:],size=samples)
-
-def model1_table(dfs_and_params, samples):
+def model1_otu(df_and_params, samples, prng=None):
+    """Return an otu vector drawn from df given params and of length samples.
+    prng is a numpy RandomState or None for the global numpy random state."""
+    return df_and_params[0].rvs(*df_and_params[1:], size=samples, 
+        random_state=prng)
+
+def model1_table(dfs_and_params, samples, prng=None):
     """Return an OTU table drawn from given dfs and params."""
-    return array([model1_otu(i,samples) for i in dfs_and_params])
+    return array([model1_otu(i,samples,prng) for i in dfs_and_params])
+
+def dirichlet_multinomial(alpha, samples, seq_depth, prng=None):
+    """Return taxa X samples counts drawn from a Dirichlet-multinomial.
+
+    Each sample draws proportions from Dirichlet(alpha) and seq_depth counts 
+    from a multinomial with those proportions. The multinomial is drawn as a 
+    binomial for each taxon given the counts and mass left, which does every 
+    sample at once.
+    Inputs:
+     alpha - 1d array of floats, Dirichlet parameters of the taxa.
+     samples - int, number of samples.
+     seq_depth - int, counts in each sample.
+     prng - numpy RandomState or None, source of random numbers. None uses the
+     global numpy random state (so numpy.random.seed works).
+    """
+    prng = nprandom if prng is None else prng
+    props = prng.dirichlet(asarray(alpha, dtype=float64), size=samples).T
+    counts = zeros(props.shape)
+    remaining = zeros(samples, dtype=int) + int(seq_depth)
+    mass = zeros(samples) + 1.
+    for k in range(len(props)-1):
+        # mass can round to slightly less than props[k]
+        p = (props[k]/where(mass > 0, mass, 1.)).clip(0., 1.)
+        counts[k] = prng.binomial(remaining, p)
+        remaining -= counts[k].astype(int)
+        mass -= props[k]
+    counts[-1] = remaining
+    return counts
 
-def model2_table(otu_sums, samples, seq_depth, tpk):
+def model2_table(otu_sums, samples, seq_depth, tpk, prng=None):
     """Return OTU table drawn from dirichlet distribution with given params.
     Inputs:
      otu_sums - array of floats, weights you want to give to each otu in terms 
@@ -69,39 +84,109 @@ def model2_table(otu_sums, samples, seq_depth, tpk):
      tpk - total prior knowledge. controls how spiky the distribution will be. 
      higher total prior knowledge will allow it to be much spikier which means
      less deviation away from otu_sums. 
+     prng - see dirichlet_multinomial.
     """
-    prior_vals = otu_sums
-    pvs_str =  'c(%s)' % ','.join(map(str,prior_vals))
-    out_fp = get_tmp_filename()
-    command_str = COMMAND_STR % (pvs_str, tpk, samples, seq_depth, out_fp)
-    command_file = get_tmp_filename()
-    o = open(command_file, 'w')
-    o.write(command_str)
-    o.close()
-    os.system('R --slave < ' + command_file)
-    o = open(out_fp)
-    lines = map(str.rstrip ,o.readlines())
-    o.close()
-    return array([map(float,line.split(',')) for line in lines])
+    prior_vals = asarray(otu_sums, dtype=float64)
+    prior_vals = tpk*(prior_vals/prior_vals.sum())
+    return dirichlet_multinomial(prior_vals, samples, round(seq_depth), prng)
 
-def model3_table(otu_sums, samples, seq_depth, tpk):
+def model3_table(otu_sums, samples, seq_depth, tpk, prng=None):
     """Uses model2_table but subtracts mean value to get higher sparsity."""
-    data = model2_table(otu_sums, samples, seq_depth, tpk)
+    data = model2_table(otu_sums, samples, seq_depth, tpk, prng)
     d = data-data.mean()
     return where(d>0,d,0)
 
 
-def alter_table(data, as_abund=True, as_int=False, sparsity=.8):
-    """Change table to RA, to int, and/or add sparsity."""
+def alter_table(data, as_abund=True, as_int=False, sparsity=.8, prng=None):
+    """Change table to RA, to int, and/or add sparsity.
+    prng is a numpy RandomState or None for the global numpy random state."""
     res = data
     if not as_abund:
         res = res/res.sum(0)
     if as_int:
         res = res.round(0)
     if sparsity:
-        r,c = where(data==data)
-        q = zip(r,c)
-        shuffle(q)
-        for i in range(int(len(q)*sparsity)):
-            res[q[i]] = 0.
+        zero_inflate(res, int(res.size*sparsity), prng=prng)
+    return res
+
+MODELS = {'model1': model1_table, 'model2': model2_table, 
+    'model3': model3_table}
+
+def null_table_seeds(master_seed, num_tables):
+    """Return a seed for each of num_tables tables drawn from master_seed.
+
+    Table k always gets the kth seed, so a batch is the same however it is 
+    split between processes."""
+    return RandomState(master_seed).randint(0, 2**31-1, size=num_tables)
+
+def write_null_table(data, fp, output='biom'):
+    """Write otus X samples data as a biom table or tab separated text.
+
+    Otus are named o0, o1, ... and samples s0, s1, ... Text values are 
+    written with repr so they read back exactly."""
+    otu_ids = ['o%s' % i for i in range(data.shape[0])]
+    sample_ids = ['s%s' % i for i in range(data.shape[1])]
+    o = open(fp, 'w')
+    if output == 'biom':
+        bt = table_factory(data, sample_ids, otu_ids)
+        o.write(bt.getBiomFormatJsonString('correlations null generator'))
+    else:
+        o.write('#OTU ID\t%s\n' % '\t'.join(sample_ids))
+        o.writelines(['%s\t%s\n' % (otu_id, '\t'.join(map(repr, row))) for
+            otu_id, row in zip(otu_ids, data.tolist())])
+    o.close()
+
+def _null_table(job):
+    """Make (and write) one null table. Module level so Pool can pickle it."""
+    model, args, seed, alter_kwargs, fp, output = job
+    prng = RandomState(seed)
+    data = MODELS[model](*args, prng=prng)
+    if alter_kwargs is not None:
+        data = alter_table(data, prng=prng, **alter_kwargs)
+    if fp is None:
+        return data
+    write_null_table(data, fp, output)
+    return fp
+
+def null_tables(model, args, num_tables, master_seed, out_dir=None, procs=1,
+    alter_kwargs=None, output='biom'):
+    """Make a reproducible batch of null tables, optionally in parallel.
+
+    Every table is drawn from its own RandomState seeded from master_seed 
+    (see null_table_seeds), so a batch doesn't depend on procs or on the 
+    global numpy random state.
+    Inputs:
+     model - str, one of model1, model2, model3.
+     args - tuple, arguments of the model's table function (without prng).
+     num_tables - int, number of tables.
+     master_seed - int, seed of the batch.
+     out_dir - str or None, if passed workers write table k to 
+     out_dir/null_table_k.biom (or .txt) and its path is returned instead of
+     the table.
+     procs - int, number of processes tables are made in.
+     alter_kwargs - dict or None, if passed alter_table is called on each 
+     table with these keyword arguments (and the table's prng).
+     output - str, biom or txt. biom files differ only in their date.
+    Outputs:
+     list of tables (2d arrays) or of written file paths, in table order.
+    """
+    if model not in MODELS:
+        raise ValueError('model must be one of %s.' % 
+            ', '.join(sorted(MODELS)))
+    if output not in ['biom', 'txt']:
+        raise ValueError('output must be biom or txt.')
+    if out_dir is not None and not os.path.exists(out_dir):
+        os.makedirs(out_dir)
+    jobs = []
+    for k, seed in enumerate(null_table_seeds(master_seed, num_tables)):
+        fp = None if out_dir is None else \
+            os.path.join(out_dir, 'null_table_%s.%s' % (k, output))
+        jobs.append((model, tuple(args), seed, alter_kwargs, fp, output))
+    if procs > 1:
+        pool = Pool(procs)
+        res = pool.map(_null_table, jobs)
+        pool.close()
+        pool.join()
+    else:
+        res = map(_null_table, jobs)
     return res
@@ -10,8 +10,10 @@ __version__ = ".9-Dev"
 __maintainer__ = "Will Van Treuren"
 __email__ = "wdwvt1@gmail.com"
 
-from numpy import array, where, apply_along_axis, sum
+from numpy import (array, where, apply_along_axis, sum, asarray, float64,
+    arange, einsum, empty)
 from scipy.stats.distributions import uniform, lognorm
+from correlations.generators.manifest import rules_table_manifest
 
 
 """Code for generating OTU tables from the rule model. 
@@ -76,6 +78,15 @@ def model1_eval_rule(lb, ub, val):
     else:
         return False
 
+def model1_rules_matrix(lbs, ubs, vals):
+    """Return boolean array, True where lbs <= vals < ubs (see model1_eval_rule).
+    lbs and ubs have the shape of vals without its last (samples) axis, e.g.
+    inducers for an inducers X samples vals."""
+    lbs = asarray(lbs, dtype=float64)[...,None]
+    ubs = asarray(ubs, dtype=float64)[...,None]
+    return ((lbs <= vals) & (vals < ubs)) | ((lbs == 0) & (ubs == 0) & 
+        (vals == 0))
+
 def model1_eval_rules(rules, vals):
     """Evaluate a list of rules for number of rules satisified."""
     return sum([model1_eval_rule(lb=r[0], ub=r[1], val=v) for r,v in 
@@ -98,7 +109,8 @@ def model1_otu(inducer_arr, df_and_params, weights, rules):
     # random draw from distribution according to parameters
     unweighted_draw = df_and_params[0].rvs(*df_and_params[1:],size=num_samples)
     # find out number of conditions satisfied and create uniform draw matrix.
-    cs = [model1_eval_rules(rules, otu_vals) for otu_vals in inducer_arr.T]
+    lbs, ubs = zip(*rules)
+    cs = model1_rules_matrix(lbs, ubs, inducer_arr).sum(0)
     # draw from uniform distribution and weight according to weights matrix.
     res = where(uniform.rvs(0,1,size=num_samples) > 1-weights.take(cs), 1., 0)
     # multiply element wise to produce output vector
@@ -118,6 +130,11 @@ def model2_eval_rules(rules, vals):
     notu_val = add_total-sub_total
     return notu_val if notu_val > 0 else 0
 
+def model2_coefficients(rules):
+    """Return the signed coefficient of each model 2 rule ('sub' negative)."""
+    return array([r[0] if r[1]=='add' else -r[0] for r in rules], 
+        dtype=float64)
+
 def model2_otu(inducer_arr, rules):
     """Creates an OTU vector according to model 2 and given params.
     Inputs:
@@ -129,8 +146,83 @@ def model2_otu(inducer_arr, rules):
      induced OTU abundance after all 'self' additions have been made).
     """
     # create rule function which assigns to each inducer array input an output 
-    raw_otu_vals = array([model2_eval_rules(rules,i) for i in inducer_arr.T])
+    raw_otu_vals = model2_coefficients(rules).dot(inducer_arr)
+    raw_otu_vals = where(raw_otu_vals > 0, raw_otu_vals, 0)
     # add noise
     return uniform.rvs(.9,.2,size=raw_otu_vals.shape[0])*raw_otu_vals
 
-
+def model1_table(data, inducers, lbs, ubs, weights, df_and_params, prng=None,
+    otus_per_block=1024, otu_ids=None):
+    """Create many model 1 otus at once, each from its own inducers and rules.
+    Inputs:
+     data - 2d array, otus X samples, the otus inducers index.
+     inducers - 2d int array, induced otus X inducers, rows of data inducing 
+     each new otu.
+     lbs, ubs - 2d arrays shaped like inducers, lower and upper bound of the 
+     rule for each inducer (see model1_eval_rule).
+     weights - 2d array, induced otus X inducers+1, see model1_otu.
+     df_and_params - see model1_otu, shared by all new otus.
+     prng - numpy RandomState or None for the global numpy random state.
+     otus_per_block - int, new otus whose rules are evaluated at once; memory
+     is otus_per_block X inducers X samples.
+     otu_ids - list of strs or None, ids of the otus of data followed by ids
+     of the new otus. if passed a Manifest of the true edges (see 
+     rules_table_manifest) is returned with the new otus.
+    Outputs:
+     2d int array, new otus X samples. a batch of one otu draws the same 
+     random numbers as model1_otu.
+    """
+    inducers = asarray(inducers)
+    lbs, ubs = asarray(lbs, dtype=float64), asarray(ubs, dtype=float64)
+    weights = asarray(weights, dtype=float64)
+    n, samples = inducers.shape[0], data.shape[1]
+    unweighted_draws = df_and_params[0].rvs(*df_and_params[1:], 
+        size=(n, samples), random_state=prng)
+    udraws = uniform.rvs(0, 1, size=(n, samples), random_state=prng)
+    res = empty((n, samples), dtype=int)
+    for a in range(0, n, otus_per_block):
+        b = min(a+otus_per_block, n)
+        cs = model1_rules_matrix(lbs[a:b], ubs[a:b], data[inducers[a:b]]).sum(1)
+        ps = weights[arange(a, b)[:,None], cs]
+        res[a:b] = (where(udraws[a:b] > 1-ps, 1., 0)*
+            unweighted_draws[a:b]).astype(int)
+    if otu_ids is not None:
+        return res, _table_manifest(data, inducers, otu_ids, None, 
+            'rules_model1')
+    return res
+
+def _table_manifest(data, inducers, otu_ids, coefficients, method):
+    '''Check otu_ids and return the manifest of new otus made from data.'''
+    if len(otu_ids) != data.shape[0] + len(inducers):
+        raise ValueError('otu_ids must hold the ids of the otus of data and '+\
+            'the new otus.')
+    return rules_table_manifest(inducers, otu_ids, coefficients, method)
+
+def model2_table(data, inducers, coefficients, prng=None, otus_per_block=1024,
+    otu_ids=None):
+    """Create many model 2 otus at once, each from its own inducers and rules.
+    Inputs:
+     data - 2d array, otus X samples, the otus inducers index.
+     inducers - 2d int array, induced otus X inducers, rows of data inducing 
+     each new otu.
+     coefficients - 2d array shaped like inducers, signed coefficient of each 
+     rule (see model2_coefficients).
+     prng, otus_per_block, otu_ids - see model1_table. manifest edges have 
+     the sign and strength of the coefficients.
+    Outputs:
+     2d array, new otus X samples.
+    """
+    inducers = asarray(inducers)
+    coefficients = asarray(coefficients, dtype=float64)
+    n, samples = inducers.shape[0], data.shape[1]
+    res = empty((n, samples))
+    for a in range(0, n, otus_per_block):
+        res[a:a+otus_per_block] = einsum('ik,iks->is', 
+            coefficients[a:a+otus_per_block], data[inducers[a:a+otus_per_block]])
+    res = where(res > 0, res, 0)
+    # add noise
+    res = uniform.rvs(.9, .2, size=(n, samples), random_state=prng)*res
+    if otu_ids is not None:
+        return res, _table_manifest(data, inducers, otu_ids, coefficients,
+            'rules_model2')
+    return res
@@ -14,45 +14,131 @@ __email__ = "wdwvt1@gmail.com"
 Utility code for basic operations.
 '''
 
-from numpy import array, where, arange, argsort
-from numpy.random import shuffle
+from numpy import (ones, empty, unique, concatenate, flatnonzero, int64,
+    subtract, maximum)
+from numpy import random as nprandom
 from copy import copy
+from correlations.util import kth_smallest
 
-def coercive_zero_inflation(data, zero_fraction, exact=False):
+def choose_indices(n, k, prng=None):
+    '''Return k distinct ints from range(n), sorted, chosen uniformly.
+
+    Draws with replacement until k distinct ints are found, then keeps a 
+    random k of them, so memory and time are O(k) rather than the O(n) of a 
+    shuffle. If k > n/2 the n-k ints that aren't chosen are drawn instead.
+    prng is a numpy RandomState or None for the global numpy random state.
+    '''
+    prng = nprandom if prng is None else prng
+    if not 0 <= k <= n:
+        raise ValueError('Can not choose %s of %s indices.' % (k, n))
+    if 2*k > n:
+        mask = ones(n, dtype=bool)
+        mask[choose_indices(n, n-k, prng)] = False
+        return flatnonzero(mask)
+    chosen = empty(0, dtype=int64)
+    while len(chosen) < k:
+        draws = prng.randint(0, n, size=int(1.1*(k-len(chosen)))+10)
+        chosen = unique(concatenate((chosen, draws)))
+    if len(chosen) > k:
+        chosen.sort()
+        chosen = chosen[prng.permutation(len(chosen))[:k]]
+        chosen.sort()
+    return chosen
+
+def zero_inflate(data, num_zeros, nonzero_only=False, rows_per_block=None,
+    prng=None):
+    '''Set num_zeros randomly chosen entries of data to 0 in place.
+
+    Inputs:
+     data - 2d array or memmap of numeric values.
+     num_zeros - int, number of entries to set to 0.
+     nonzero_only - boolean, if True entries are chosen from the nonzero 
+     entries of data so exactly num_zeros more entries become 0.
+     rows_per_block - int or None, if passed data is processed in blocks of
+     rows so a memmapped table larger than memory can be zero inflated. The 
+     number of entries chosen in each block is drawn from the hypergeometric 
+     distribution given the entries left to choose, so the chosen entries are
+     a uniform sample of the whole table as when data is done at once.
+     prng - see choose_indices.
+    Outputs:
+     data.
+    '''
+    prng = nprandom if prng is None else prng
+    if rows_per_block is None:
+        rows_per_block = max(data.shape[0], 1)
+    blocks = range(0, data.shape[0], rows_per_block)
+    # entries of each block that can be chosen
+    if nonzero_only:
+        sizes = [(data[a:a+rows_per_block] != 0).sum() for a in blocks]
+    else:
+        sizes = [data[a:a+rows_per_block].size for a in blocks]
+    left, total = int(num_zeros), sum(sizes)
+    if left > total:
+        raise ValueError('Can not set %s of %s entries to 0.' % (left, total))
+    for a, size in zip(blocks, sizes):
+        if left == 0:
+            break
+        total -= size
+        if total == 0:
+            k = left
+        elif size == 0:
+            k = 0
+        else:
+            k = prng.hypergeometric(size, total, left)
+        block = data[a:a+rows_per_block]
+        inds = choose_indices(size, k, prng)
+        if nonzero_only:
+            inds = flatnonzero(block)[inds]
+        r, c = divmod(inds, block.shape[1])
+        block[r, c] = 0
+        left -= k
+    return data
+
+def coercive_zero_inflation(data, zero_fraction, exact=False, 
+    rows_per_block=None, in_place=False, prng=None):
     '''Cause zero_fraction of data to be 0s.
     Inputs:
      data - 2d array of numeric values.
      zero_fraction - float in (0.0,1.0), fraction of values of data to turn to 0
      exact - boolean, if True, will calculate the fraction of zeros that data 
      already has and add only enough more to raise overall fraction to 
-     zero_fraction.'''
+     zero_fraction.
+     rows_per_block, prng - see zero_inflate.
+     in_place - boolean, if True data (e.g. a memmap) is modified rather than
+     a copy.'''
     assert 1>zero_fraction>0, 'zero_fraction must be in (0,1.0)' 
-    tmp = copy(data)
+    tmp = data if in_place else copy(data)
     if exact:
         zero_fraction = zero_fraction - (tmp==0).sum()/float(tmp.size)
     if zero_fraction < 0:
         raise ValueError('zero fraction of data higher than passed fraction.')
-    if exact: 
-        r,c = tmp.nonzero()
-    else:
-        r,c = where(tmp==tmp)
-    inds = arange(len(r))
-    shuffle(inds)
-    ub = round(zero_fraction*tmp.size)
-    tmp[r[inds[:ub]],c[inds[:ub]]] = 0
-    return tmp
-
-def subtraction_zero_inflation(data, zero_fraction):
+    ub = int(round(zero_fraction*tmp.size))
+    return zero_inflate(tmp, ub, exact, rows_per_block, prng)
+
+def subtraction_zero_inflation(data, zero_fraction, out=None, 
+    rows_per_block=None):
     '''Subtract x from data such that data has ~ zero_fraction 0s.
     Can't guarantee exactness because data may have a bunch of repeated values, 
     e.g. data=ones((N,M)).
     Inputs:
      data - 2d array of numeric values.
      zero_fraction - float in (0.0,1.0), fraction of values of data to turn to 0
+     out - 2d array or None, where the result is written. pass data to 
+     subtract in place (e.g. from a memmap). None writes to a new array.
+     rows_per_block - int or None, if passed data is read (see kth_smallest) 
+     and written in blocks of rows so memory is bounded.
+    Outputs:
+     out, x - the zero inflated data and the value subtracted.
     '''
     # python zero indexes so we have to subtract one to find the median value
-    tmp = data.flatten()
-    x_median = tmp[argsort(tmp)[round(tmp.size*zero_fraction) - 1]]
-    return where(data - x_median > 0, data - x_median, 0), x_median
-    
-
+    k = max(int(round(data.size*zero_fraction)) - 1, 0)
+    x_median = kth_smallest(data, k, rows_per_block)
+    if out is None:
+        out = empty(data.shape, dtype=data.dtype)
+    if rows_per_block is None:
+        rows_per_block = max(data.shape[0], 1)
+    for a in range(0, data.shape[0], rows_per_block):
+        block = out[a:a+rows_per_block]
+        subtract(data[a:a+rows_per_block], x_median, out=block)
+        maximum(block, 0, out=block)
+    return out, x_median
@@ -0,0 +1,189 @@
+#!/usr/bin/env python
+# file created 10/18/2026
+
+__author__ = "Will Van Treuren"
+__copyright__ = "Copyright 2013, Will Van Treuren"
+__credits__ = ["Will Van Treuren, Sophie Weiss"]
+__license__ = "GPL"
+__url__ = ''
+__version__ = ".9-Dev"
+__maintainer__ = "Will Van Treuren"
+__email__ = "wdwvt1@gmail.com"
+
+'''
+Test the out of core blockwise correlation code.
+'''
+
+from cogent.util.unit_test import TestCase, main
+from correlations.eval.blockwise import (standardize_memmap, tiles,
+    read_progress, write_progress, run_params, blockwise_correlation, 
+    EDGE_HEADER)
+from correlations.eval.parse import load_result
+from correlations.eval.naive_matrix import (naive_cc_matrix,
+    naive_pval_matrix, standardize_rows)
+from numpy import triu_indices, load, isnan, errstate
+from numpy.random import RandomState
+from tempfile import mkdtemp
+from shutil import rmtree
+from os.path import join
+
+
+class BlockwiseTests(TestCase):
+    '''Test tiled correlation and resuming.'''
+
+    def setUp(self):
+        '''Define a table with a correlated pair and a constant otu.'''
+        prng = RandomState(0)
+        self.data = prng.rand(50, 30)
+        self.data[1] = self.data[0]*2 + prng.rand(30)*.1
+        self.data[7] = 1.
+        self.otu_ids = ['o%s' % i for i in range(50)]
+        self.tmp_dir = mkdtemp()
+
+    def tearDown(self):
+        '''Remove temporary files.'''
+        rmtree(self.tmp_dir)
+
+    def expected_edges(self, sig_lvl):
+        '''Return the edges the in memory calculation finds.'''
+        ccs = naive_cc_matrix(self.data, 'pearson')
+        ps = naive_pval_matrix(ccs, 30, 'parametric_t_distribution')
+        i, j = triu_indices(50, 1)
+        with errstate(invalid='ignore'):
+            sig = ps[i, j] <= sig_lvl
+        return sorted([(self.otu_ids[a], self.otu_ids[b]) for a, b in 
+            zip(i[sig], j[sig])]), ccs
+
+    def read_edges(self, fp):
+        '''Return the edges and scores of an edge list.'''
+        lines = open(fp).readlines()
+        self.assertEqual(lines[0], EDGE_HEADER)
+        vals = [line.strip().split('\t') for line in lines[1:]]
+        return sorted([(v[0], v[1]) for v in vals]), vals
+
+    def test_tiles(self):
+        '''Test tiles cover the upper triangle.'''
+        self.assertEqual(tiles(5, 2), [(0, 2, 0, 2), (0, 2, 2, 4), 
+            (0, 2, 4, 5), (2, 4, 2, 4), (2, 4, 4, 5), (4, 5, 4, 5)])
+
+    def test_progress(self):
+        '''Test progress is written and read back.'''
+        fp = join(self.tmp_dir, 'progress.txt')
+        self.assertEqual(read_progress(fp), (0, 0, ''))
+        write_progress(fp, 3, 120)
+        self.assertEqual(read_progress(fp), (3, 120, ''))
+        params = run_params(self.data, 'pearson', 'fisher_z_transform', .01,
+            'edges', 7)
+        write_progress(fp, 4, 130, params)
+        self.assertEqual(read_progress(fp), (4, 130, params))
+        self.assertEqual(params, 'block_size=7\tcorr_method=pearson\t'
+            'output=edges\tpval_assignment_method=fisher_z_transform\t'
+            'shape=50x30\tsig_lvl=0.01')
+
+    def test_standardize_memmap(self):
+        '''Test blocked standardization matches standardize_rows.'''
+        obs = standardize_memmap(self.data, join(self.tmp_dir, 's.npy'),
+            'spearman', 7)
+        exp = standardize_rows(self.data, 'spearman')
+        self.assertFloatEqual(obs[~isnan(exp)], exp[~isnan(exp)])
+
+    def test_blockwise_correlation_edges(self):
+        '''Test the edge list matches the in memory calculation.'''
+        exp, ccs = self.expected_edges(.01)
+        fp, complete = blockwise_correlation(self.data, self.otu_ids, 
+            'pearson', 'parametric_t_distribution', self.tmp_dir, sig_lvl=.01,
+            block_size=7)
+        self.assertTrue(complete)
+        obs, vals = self.read_edges(fp)
+        self.assertEqual(obs, exp)
+        self.assertFloatEqual(float(vals[0][2]), 
+            ccs[int(vals[0][0][1:]), int(vals[0][1][1:])])
+
+    def test_blockwise_correlation_binary(self):
+        '''Test the binary edge list has the text edge list's edges.'''
+        exp, ccs = self.expected_edges(.05)
+        args = (self.data, self.otu_ids, 'pearson', 
+            'parametric_t_distribution', self.tmp_dir)
+        complete = False
+        while not complete:
+            fp, complete = blockwise_correlation(*args, sig_lvl=.05, 
+                output='binary', block_size=7, max_tiles=5)
+            # a tile that was being appended when the job died
+            o = open(fp, 'ab')
+            o.write('partial')
+            o.close()
+        fp, complete = blockwise_correlation(*args, sig_lvl=.05, 
+            output='binary', block_size=7)
+        ro = load_result(fp)
+        self.assertEqual(sorted(ro.edges), exp)
+        self.assertEqual(ro.otu_ids, self.otu_ids)
+        self.assertFloatEqual(ro.cvals, [ccs[int(a[1:]), int(b[1:])] for a, b
+            in ro.edges], eps=1e-6)
+        self.assertEqual(ro.interactions, ['copresence' if c >= 0 else
+            'mutualExclusion' for c in ro.cvals])
+
+    def test_blockwise_correlation_condensed(self):
+        '''Test the condensed memmap matches the in memory calculation.'''
+        fp, complete = blockwise_correlation(self.data, self.otu_ids, 
+            'spearman', 'parametric_t_distribution', self.tmp_dir, 
+            output='condensed', block_size=7)
+        exp = naive_cc_matrix(self.data, 'spearman')[triu_indices(50, 1)]
+        obs = load(fp)
+        self.assertEqual(isnan(obs), isnan(exp))
+        self.assertFloatEqual(obs[~isnan(exp)], exp[~isnan(exp)])
+
+    def test_blockwise_correlation_resume(self):
+        '''Test interrupted runs resume and drop partially written tiles.'''
+        exp, ccs = self.expected_edges(.05)
+        args = (self.data, self.otu_ids, 'pearson', 
+            'parametric_t_distribution', self.tmp_dir)
+        complete = False
+        calls = 0
+        while not complete:
+            fp, complete = blockwise_correlation(*args, sig_lvl=.05, 
+                block_size=7, max_tiles=4)
+            # a tile that was being written when the job died
+            o = open(fp, 'a')
+            o.write('o0\to1\tpartial')
+            o.close()
+            calls += 1
+        self.assertEqual(calls, 9) # 36 tiles
+        fp, complete = blockwise_correlation(*args, sig_lvl=.05, 
+            block_size=7, max_tiles=4)
+        self.assertTrue(complete)
+        obs, vals = self.read_edges(fp)
+        self.assertEqual(obs, exp)
+        # resume=False starts over
+        fp, complete = blockwise_correlation(*args, sig_lvl=.05, 
+            block_size=7, resume=False, max_tiles=1)
+        self.assertFalse(complete)
+        self.assertEqual(read_progress(join(self.tmp_dir, 'progress.txt'))[0],
+            1)
+
+    def test_blockwise_correlation_resume_params(self):
+        '''Test resuming with different parameters or data is an error.'''
+        args = (self.data, self.otu_ids, 'pearson', 
+            'parametric_t_distribution', self.tmp_dir)
+        blockwise_correlation(*args, sig_lvl=.05, block_size=7, max_tiles=2)
+        self.assertRaises(ValueError, blockwise_correlation, *args, 
+            sig_lvl=.01, block_size=7)
+        self.assertRaises(ValueError, blockwise_correlation, *args, 
+            sig_lvl=.05, block_size=8)
+        self.assertRaises(ValueError, blockwise_correlation, self.data[:40],
+            self.otu_ids[:40], 'pearson', 'parametric_t_distribution', 
+            self.tmp_dir, sig_lvl=.05, block_size=7)
+        self.assertRaises(ValueError, blockwise_correlation, self.data,
+            self.otu_ids, 'spearman', 'parametric_t_distribution', 
+            self.tmp_dir, sig_lvl=.05, block_size=7)
+        # the matching run still resumes, resume=False starts over
+        fp, complete = blockwise_correlation(*args, sig_lvl=.05, 
+            block_size=7)
+        self.assertTrue(complete)
+        fp, complete = blockwise_correlation(*args, sig_lvl=.01, 
+            block_size=7, resume=False)
+        self.assertTrue(complete)
+        self.assertEqual(self.read_edges(fp)[0], self.expected_edges(.01)[0])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+# file created 10/18/2026
+
+__author__ = "Will Van Treuren"
+__copyright__ = "Copyright 2013, Will Van Treuren"
+__credits__ = ["Will Van Treuren, Sophie Weiss"]
+__license__ = "GPL"
+__url__ = ''
+__version__ = ".9-Dev"
+__maintainer__ = "Will Van Treuren"
+__email__ = "wdwvt1@gmail.com"
+
+'''
+Test the native Bray-Curtis feature dissimilarity engine.
+'''
+
+from cogent.util.unit_test import TestCase, main
+from correlations.eval.bray_curtis import (condensed_index,
+    bray_curtis_condensed, bray_curtis_results)
+from correlations.eval.parse import BrayCurtisResults
+from numpy import array, isnan, float32, load
+from numpy.random import RandomState
+from scipy.spatial.distance import pdist
+from scipy.sparse import csr_matrix
+from tempfile import mkdtemp
+from shutil import rmtree
+from os.path import join
+
+
+class BrayCurtisTests(TestCase):
+    '''Test the blocked Bray-Curtis calculation.'''
+
+    def setUp(self):
+        '''Define a sparse count table with some empty otus.'''
+        prng = RandomState(0)
+        self.data = prng.poisson(.3, size=(40, 25))*\
+            prng.randint(1, 20, size=(40, 25))
+        self.data[[5, 9, 39]] = 0
+        self.exp = pdist(self.data, 'braycurtis')
+        # two otus with no counts share nothing
+        self.exp[isnan(self.exp)] = 1.
+        self.tmp_dir = mkdtemp()
+
+    def tearDown(self):
+        '''Remove temporary files.'''
+        rmtree(self.tmp_dir)
+
+    def test_condensed_index(self):
+        '''Test condensed indices are in pdist order.'''
+        n = 5
+        obs = [condensed_index(i, j, n) for i in range(n) 
+            for j in range(i+1, n)]
+        self.assertEqual(obs, range(10))
+
+    def test_bray_curtis_condensed(self):
+        '''Test dense and sparse tiles match pdist for any tile size.'''
+        for sparse_density in [0., 1.]:
+            for kwargs in [{}, {'rows_per_block':7, 'tile_size':100},
+                {'rows_per_block':3, 'tile_size':5}]:
+                for data in [self.data, csr_matrix(self.data)]:
+                    obs = bray_curtis_condensed(data, 
+                        sparse_density=sparse_density, **kwargs)
+                    self.assertEqual(obs.dtype, float32)
+                    self.assertFloatEqual(obs, self.exp)
+
+    def test_bray_curtis_condensed_memmap(self):
+        '''Test results written to a memmap can be reloaded.'''
+        fp = join(self.tmp_dir, 'dists.npy')
+        bray_curtis_condensed(self.data, fp, tile_size=50)
+        self.assertFloatEqual(load(fp), self.exp)
+
+    def test_bray_curtis_results(self):
+        '''Test results object matches one made from the pdist values.'''
+        otu_ids = ['o%s' % i for i in range(40)]
+        obs = bray_curtis_results(csr_matrix(self.data), otu_ids, sig_lvl=.05)
+        exp = BrayCurtisResults.fromCondensed(self.exp.astype(float32),
+            otu_ids, .05)
+        self.assertEqual(obs.edges, exp.edges)
+        self.assertFloatEqual(obs.actual_sig_lvl, exp.actual_sig_lvl)
+
+    def test_empty_otus(self):
+        '''Test pairs of otus with no counts are never edges.'''
+        obs = bray_curtis_condensed(self.data)
+        for i, j in [(5, 9), (5, 39), (9, 39)]:
+            self.assertEqual(obs[condensed_index(i, j, 40)], 1.)
+        ro = bray_curtis_results(self.data, ['o%s' % i for i in range(40)],
+            sig_lvl=.01)
+        self.assertEqual(len(ro.edges), 8)
+        self.assertFalse(set(['o5', 'o9', 'o39']) & set(ro.sig_otus))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+# file created 10/18/2026
+
+__author__ = "Will Van Treuren"
+__copyright__ = "Copyright 2013, Will Van Treuren"
+__credits__ = ["Will Van Treuren, Sophie Weiss"]
+__license__ = "GPL"
+__url__ = ''
+__version__ = ".9-Dev"
+__maintainer__ = "Will Van Treuren"
+__email__ = "wdwvt1@gmail.com"
+
+'''
+Test the native multi metric CoNet style scorer.
+'''
+
+from cogent.util.unit_test import TestCase, main
+from correlations.eval.conet import (METHODS, normalize_samples,
+    kullback_leibler_matrix, distance_correlation_matrix, multi_metric_scores,
+    conet_results)
+from correlations.eval.parse import CoNetResults
+from numpy import array, log, sqrt, corrcoef, vstack, ones
+from numpy.random import RandomState
+from scipy.stats import spearmanr
+from scipy.spatial.distance import pdist
+
+
+def brute_dcor(x, y):
+    '''Distance correlation of two vectors from the definition.'''
+    def centered(v):
+        a = abs(v[:, None] - v[None, :])
+        return a - a.mean(0)[None, :] - a.mean(1)[:, None] + a.mean()
+    a, b = centered(x), centered(y)
+    return sqrt((a*b).mean()/sqrt((a*a).mean()*(b*b).mean()))
+
+
+class CoNetTests(TestCase):
+    '''Test the multi metric scorer.'''
+
+    def setUp(self):
+        '''Define a count table where otus 0 and 1 covary.'''
+        prng = RandomState(0)
+        self.data = prng.poisson(5, size=(12, 20)).astype(float)
+        self.data[1] = self.data[0]*3 + prng.poisson(1, 20)
+        self.otu_ids = ['o%s' % i for i in range(12)]
+
+    def test_normalize_samples(self):
+        '''Test samples sum to one and empty samples are left as 0.'''
+        data = self.data.copy()
+        data[:, 3] = 0
+        obs = normalize_samples(data)
+        exp = ones(20)
+        exp[3] = 0.
+        self.assertFloatEqual(obs.sum(0), exp)
+
+    def test_kullback_leibler_matrix(self):
+        '''Test the expanded divergence matches the definition.'''
+        obs = kullback_leibler_matrix(self.data, 1.)
+        p = (self.data + 1.)/(self.data + 1.).sum(1)[:, None]
+        for i in range(12):
+            for j in range(12):
+                exp = ((p[i]-p[j])*(log(p[i])-log(p[j]))).sum()
+                self.assertFloatEqual(obs[i, j], exp)
+
+    def test_distance_correlation_matrix(self):
+        '''Test blocked distance correlation matches the definition.'''
+        for rows_per_block in [64, 5]:
+            obs = distance_correlation_matrix(self.data, rows_per_block)
+            for i in range(12):
+                for j in range(12):
+                    self.assertFloatEqual(obs[i, j], 
+                        brute_dcor(self.data[i], self.data[j]))
+
+    def test_multi_metric_scores(self):
+        '''Test each column matches the metric calculated on its own.'''
+        i, j, scores, methods = multi_metric_scores(self.data)
+        self.assertEqual(methods, sorted(METHODS))
+        self.assertEqual(scores.shape, (66, 5))
+        t = normalize_samples(self.data)
+        self.assertFloatEqual(scores[:, 0], corrcoef(t)[i, j])
+        self.assertFloatEqual(scores[:, 1], spearmanr(t.T)[0][i, j])
+        self.assertFloatEqual(scores[:, 2], pdist(t, 'braycurtis'), 1e-6)
+        self.assertFloatEqual(scores[:, 3], kullback_leibler_matrix(t)[i, j])
+        self.assertFloatEqual(scores[:, 4],
+            distance_correlation_matrix(t)[i, j])
+        # a subset of methods is returned sorted
+        i, j, sub, methods = multi_metric_scores(self.data,
+            ['dist_bray', 'correl_pearson'])
+        self.assertEqual(methods, ['correl_pearson', 'dist_bray'])
+        self.assertFloatEqual(sub, scores[:, [0, 2]])
+        self.assertRaises(ValueError, multi_metric_scores, self.data, ['x'])
+
+    def test_multi_metric_scores_blocks(self):
+        '''Test scores don't depend on how otus are blocked.'''
+        i, j, scores, methods = multi_metric_scores(self.data)
+        for kwargs in [{'rows_per_block': 5}, {'rows_per_block': 1},
+            {'max_block_bytes': 3*8*20*20*4}]:
+            obs = multi_metric_scores(self.data, **kwargs)[2]
+            self.assertFloatEqual(obs, scores)
+
+    def test_conet_results(self):
+        '''Test the covarying pair is an edge and methodVals works.'''
+        obs = conet_results(self.data, self.otu_ids, edge_fraction=.05,
+            min_support=4)
+        self.assertTrue(isinstance(obs, CoNetResults))
+        self.assertTrue(('o0', 'o1') in obs.edges)
+        k = obs.edges.index(('o0', 'o1'))
+        self.assertEqual(obs.interactions[k], 'copresence')
+        self.assertEqual(obs.cvals[k], 1.)
+        i, j, scores, methods = multi_metric_scores(self.data)
+        self.assertFloatEqual(obs.methodVals('dist_bray')[k], scores[0, 2])
+
+
+if __name__ == '__main__':
+    main()
@@ -19,8 +19,9 @@ from qiime.test import initiate_timeout, disable_timeout
 from correlations.generators.ecological import (amensal_1d, amensal_nd, 
     commensal_1d, commensal_nd, mutual_1d, mutual_nd, parasite_1d, parasite_nd, 
     competition_1d, competition_nd, obligate_syntroph_1d, obligate_syntroph_nd,
-    partial_obligate_syntroph_1d, partial_obligate_syntroph_nd)
-from numpy import array, where
+    partial_obligate_syntroph_1d, partial_obligate_syntroph_nd,
+    apply_relationship, ecological_table, BATCH_RELATIONSHIPS)
+from numpy import array, where, vstack
 from numpy.random import seed
 from numpy.testing import assert_array_almost_equal
 from scipy.stats.distributions import lognorm, uniform, beta, norm
@@ -163,6 +164,61 @@ class TestEcologicalGenerators(TestCase):
         obs = partial_obligate_syntroph_nd(otus)
         assert_array_almost_equal(obs, exp)
 
+    def test_parasite_nd_matches_1d(self):
+        """Tests cumulative parasite_nd equals parasite_1d host by host."""
+        seed(0)
+        otus = lognorm.rvs(1, size=(5, 40))*(uniform.rvs(size=(5, 40)) > .3)
+        parasite = otus[-1]
+        hosts = []
+        for otu in otus[:-1]:
+            parasite, otu_i = parasite_1d(parasite, otu, .3)
+            hosts.append(otu_i)
+        exp = vstack(hosts + [parasite])
+        assert_array_almost_equal(parasite_nd(otus, .3), exp, 12)
+
+    def test_apply_relationship(self):
+        """Tests batched relationships match the per group functions."""
+        seed(1)
+        groups = lognorm.rvs(1, size=(6, 3, 20))*(uniform.rvs(size=(6, 3, 20))
+            > .2)
+        for relationship in BATCH_RELATIONSHIPS:
+            obs = apply_relationship(groups, relationship, .4)
+            self.assertEqual(obs.shape, groups.shape)
+            for k in range(len(groups)):
+                g = groups[k]
+                if relationship == 'amensally':
+                    exp = vstack([g[:-1], amensal_nd(g, .4)])
+                elif relationship == 'commensually':
+                    exp = vstack([g[:-1], commensal_nd(g, .4)])
+                elif relationship == 'mutually':
+                    exp = mutual_nd(g, .4)
+                elif relationship == 'parasitically':
+                    exp = parasite_nd(g, .4)
+                elif relationship == 'competitively':
+                    exp = competition_nd(g, .4)
+                elif relationship == 'obligate':
+                    exp = vstack([g[:-1], obligate_syntroph_nd(g[:-1], .4)])
+                else:
+                    exp = partial_obligate_syntroph_nd(g)
+                assert_array_almost_equal(obs[k], exp)
+
+    def test_ecological_table(self):
+        """Tests tables are built block by block with a manifest."""
+        seed(2)
+        base = lognorm.rvs(1, size=(10, 15))
+        methods = ['amensally_related_1d_st_5', 'mutually_related_2d_st_2']
+        table, manifest = ecological_table(methods, [4, 6], [.5, .2], base)
+        self.assertEqual(table.shape, base.shape)
+        assert_array_almost_equal(table[0:2], vstack([base[0], 
+            amensal_nd(base[0:2], .5)]))
+        assert_array_almost_equal(table[7:10], mutual_nd(base[7:10], .2))
+        # 2 1d groups with 1 edge, 2 2d groups with 3 edges
+        self.assertEqual(len(manifest.i), 8)
+        assert_array_almost_equal(manifest.strengths, [.5]*2+[.2]*6)
+        self.assertRaises(ValueError, ecological_table, methods, [3, 7], 
+            [.5, .2], base)
+
+
 
 
 
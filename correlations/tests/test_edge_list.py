@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+# file created 10/18/2026
+
+__author__ = "Will Van Treuren"
+__copyright__ = "Copyright 2013, Will Van Treuren"
+__credits__ = ["Will Van Treuren, Sophie Weiss"]
+__license__ = "GPL"
+__url__ = ''
+__version__ = ".9-Dev"
+__maintainer__ = "Will Van Treuren"
+__email__ = "wdwvt1@gmail.com"
+
+'''
+Test binary edge lists.
+'''
+
+from cogent.util.unit_test import TestCase, main
+from correlations.eval.edge_list import (write_edges, append_edges, 
+    load_edges, num_edges, read_header, EDGE_DTYPE)
+from correlations.eval.parse import (SparCCResults, RMTResults, load_result,
+    EnsembleResults, NaiveResults)
+from numpy import array, isnan, float32
+from tempfile import mkdtemp
+from shutil import rmtree
+from os.path import join, getsize
+
+
+class EdgeListTests(TestCase):
+    '''Test writing, appending and reading edge lists.'''
+
+    def setUp(self):
+        '''Define edges and a temporary directory.'''
+        self.tmp_dir = mkdtemp()
+        self.fp = join(self.tmp_dir, 'edges.bin')
+        self.otu_ids = ['o0', 'o1', 'o2', 'o3']
+
+    def tearDown(self):
+        '''Remove temporary files.'''
+        rmtree(self.tmp_dir)
+
+    def test_write_append_load(self):
+        '''Test records are appended and read back in ranges.'''
+        write_edges(self.fp, self.otu_ids, [0, 1], [2, 3], [.5, -.25], 
+            [.001, .01], [1, -1])
+        self.assertEqual(read_header(self.fp), (self.otu_ids, 8+8+11))
+        size = append_edges(self.fp, [2], [3], [.75], [.04], [1])
+        self.assertEqual(size, getsize(self.fp))
+        self.assertEqual(size, 27 + 3*17)
+        self.assertEqual(EDGE_DTYPE.itemsize, 17)
+        otu_ids, records = load_edges(self.fp)
+        self.assertEqual(otu_ids, self.otu_ids)
+        self.assertEqual(records['i'], [0, 1, 2])
+        self.assertEqual(records['j'], [2, 3, 3])
+        self.assertFloatEqual(records['score'], [.5, -.25, .75])
+        self.assertFloatEqual(records['pval'], [.001, .01, .04])
+        self.assertEqual(records['sign'], [1, -1, 1])
+        otu_ids, records = load_edges(self.fp, 1, 2)
+        self.assertEqual(records['i'], [1])
+        # a partially written record is ignored
+        o = open(self.fp, 'ab')
+        o.write('abc')
+        o.close()
+        self.assertEqual(num_edges(self.fp), 3)
+        self.assertEqual(len(load_edges(self.fp)[1]), 3)
+        # files without edges
+        write_edges(self.fp, self.otu_ids, [], [], [], [], [])
+        self.assertEqual(len(load_edges(self.fp)[1]), 0)
+        o = open(self.fp, 'w')
+        o.write('OTU1\tOTU2\n')
+        o.close()
+        self.assertRaises(ValueError, load_edges, self.fp)
+
+    def test_results_round_trip(self):
+        '''Test results objects are written and read back by load_result.'''
+        pdata = array([[1., .01, .5], [.01, 1., .001], [.5, .001, 1.]])
+        cdata = array([[1., .4, .1], [.4, 1., -.8], [.1, -.8, 1.]])
+        ro = SparCCResults.fromArrays(pdata, cdata, ['a', 'b', 'c'], .05)
+        ro.writeEdgeList(self.fp)
+        obs = load_result(self.fp)
+        self.assertEqual(obs.otu_ids, ['a', 'b', 'c'])
+        self.assertEqual(obs.edges, ro.edges)
+        self.assertEqual(obs.interactions, ro.interactions)
+        self.assertFloatEqual(obs.cvals, ro.cvals)
+        self.assertFloatEqual(obs.pvals, ro.pvals)
+        self.assertEqual(load_result(self.fp, 1).edges, [('b', 'c')])
+        # the ensemble of one results object has the same edges
+        plines = ['#OTU ID\ta\tb\tc\n'] + ['%s\t%s\n' % (o, 
+            '\t'.join(map(str, r))) for o, r in zip('abc', pdata)]
+        clines = ['#OTU ID\ta\tb\tc\n'] + ['%s\t%s\n' % (o, 
+            '\t'.join(map(str, r))) for o, r in zip('abc', cdata)]
+        nro = NaiveResults(clines, plines, .05)
+        ero = EnsembleResults([nro], dtype=float32)
+        ero.writeEdgeList(self.fp)
+        obs = load_result(self.fp)
+        self.assertEqual(set(obs.edges), set(ro.edges))
+        # ensembles have one set of cvals per results object, so none are kept
+        self.assertTrue(isnan(obs.cvals).all())
+        # results without otu_ids or pvals
+        ro = RMTResults(['OTU1\tOTU2\tType of interaction\tScore\t' +
+            'Significance\n', 'x\tz\tCorrelated\t-0.5\t>=0.420\n', 
+            'x\ty\tCorrelated\t0.7\t>=0.420\n'])
+        ro.writeEdgeList(self.fp)
+        obs = load_result(self.fp)
+        self.assertEqual(obs.otu_ids, ['x', 'y', 'z'])
+        self.assertEqual(obs.edges, ro.edges)
+        self.assertFloatEqual(obs.cvals, [-.5, .7])
+        self.assertTrue(isnan(obs.pvals).all())
+
+
+if __name__ == '__main__':
+    main()
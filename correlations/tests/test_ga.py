@@ -17,9 +17,11 @@ from os.path import exists, join
 from cogent.util.unit_test import TestCase, main
 from qiime.test import initiate_timeout, disable_timeout
 from correlations.generators.ga import (coerce_gene, fitness, 
-    stochastic_uniform, cross_genes, mutate_gene, var_gen, select_fittest)
-from numpy import cov, array
-from numpy.random import seed, normal
+    stochastic_uniform, cross_genes, mutate_gene, var_gen, select_fittest,
+    coerce_genes, population_fitness, cross_population, mutate_population,
+    select_population, evolve_population, evolve, GeneCoercer, evolve_islands)
+from numpy import cov, array, vstack
+from numpy.random import seed, normal, RandomState
 from numpy.testing import assert_array_almost_equal
 from scipy.stats.distributions import lognorm
 
@@ -133,6 +135,99 @@ class TestGAGenerators(TestCase):
 
     # def test_select_fittest
 
+    def test_coerce_genes(self):
+        """Test a population is coerced like each gene alone."""
+        X = lognorm.rvs(2, 0, size=(4, 11, 2), random_state=RandomState(0))
+        obs = coerce_genes(X, self.anscombe_1)
+        for k in range(4):
+            assert_array_almost_equal(obs[k], coerce_gene(X[k], 
+                self.anscombe_1))
+
+    def test_GeneCoercer(self):
+        """Test a coercer holds the reference transform and coerces batches."""
+        coercer = GeneCoercer(self.anscombe_1)
+        assert_array_almost_equal(coercer.mean, self.anscombe_1.mean(0))
+        assert_array_almost_equal(coercer.root.dot(coercer.root), 
+            cov(self.anscombe_1.T))
+        X = lognorm.rvs(2, 0, size=(3, 11, 2), random_state=RandomState(0))
+        obs = coercer(X)
+        self.assertEqual(obs.shape, (3, 11, 2))
+        for k in range(3):
+            assert_array_almost_equal(coercer(X[k]), obs[k])
+            assert_array_almost_equal(cov(obs[k].T), cov(self.anscombe_1.T))
+
+    def test_population_fitness(self):
+        """Test fitness of a population is that of each gene."""
+        genes = lognorm.rvs(2, 0, size=(5, 11, 2), random_state=RandomState(1))
+        obs = population_fitness(genes, self.anscombe_1)
+        assert_array_almost_equal(obs, [fitness(g, self.anscombe_1) for g in
+            genes])
+
+    def test_cross_population(self):
+        """Test each child is the head of parents1 and tail of parents2."""
+        p1 = lognorm.rvs(2, 0, size=(20, 6, 2), random_state=RandomState(2))
+        p2 = lognorm.rvs(2, 0, size=(20, 6, 2), random_state=RandomState(3))
+        obs = cross_population(p1, p2, RandomState(4))
+        cuts = RandomState(4).randint(6, size=20)
+        for k, i in enumerate(cuts):
+            assert_array_almost_equal(obs[k], vstack((p1[k][:i], p2[k][i:])))
+
+    def test_mutate_population(self):
+        """Test population mutation matches mutate_gene."""
+        seed(0)
+        v1 = array([[1,2,3,4,5,6],[8,0.0,4,12,7,1.3]]).T
+        exp = mutate_gene(v1, [lognorm,2,0])
+        obs = mutate_population(v1[None], [lognorm,2,0], RandomState(0))
+        assert_array_almost_equal(obs[0], exp)
+
+    def test_evolve_population(self):
+        """Test evolution keeps summary stats and raises fitness."""
+        genes = lognorm.rvs(2, 0, size=(50, 11, 2), 
+            random_state=RandomState(5))
+        obs, means, maxs = evolve_population(genes, self.anscombe_1, 20, 
+            RandomState(6))
+        self.assertEqual(obs.shape, (50, 11, 2))
+        self.assertEqual(len(means), 20)
+        self.assertTrue(maxs[-1] >= maxs[0])
+        for g in obs[:5]:
+            assert_array_almost_equal(g.mean(0), self.anscombe_1.mean(0))
+            assert_array_almost_equal(cov(g.T), cov(self.anscombe_1.T))
+        exp, means2, maxs2 = evolve_population(genes, self.anscombe_1, 20, 
+            RandomState(6))
+        assert_array_almost_equal(obs, exp)
+        fit, ec, cc, mc = select_population(obs, self.anscombe_1, 
+            [lognorm, 2, 0], .02, .8, .18, 'graphic_dissimilarity', 
+            RandomState(7))
+        self.assertEqual((len(ec), len(cc), len(mc)), (1, 40, 9))
+        assert_array_almost_equal(ec[0], obs[fit.argmax()])
+        seed(0)
+        res, means, maxs = evolve(list(genes), self.anscombe_1, 3)
+        self.assertEqual(len(res), 50)
+
+    def test_evolve_islands(self):
+        """Test islands evolve reproducibly and return the fittest genes."""
+        genes = lognorm.rvs(2, 0, size=(3, 50, 11, 2), 
+            random_state=RandomState(8))
+        fit, fittest, means, maxs = evolve_islands(genes, self.anscombe_1, 
+            12, migration_interval=5, migrants=2, seed=1)
+        self.assertEqual(fittest.shape, (50, 11, 2))
+        self.assertEqual(means.shape, (3, 12))
+        self.assertEqual(maxs.shape, (3, 12))
+        assert_array_almost_equal(fit, population_fitness(fittest, 
+            self.anscombe_1))
+        self.assertFloatEqual(fit[-1], maxs[:, -1].max())
+        for g in fittest[-3:]:
+            assert_array_almost_equal(cov(g.T), cov(self.anscombe_1.T))
+        # the number of processes doesn't change the result
+        fit2, fittest2, means2, maxs2 = evolve_islands(genes, 
+            self.anscombe_1, 12, migration_interval=5, migrants=2, seed=1, 
+            procs=2, k=10)
+        assert_array_almost_equal(fittest2, fittest[-10:])
+        assert_array_almost_equal(means2, means)
+        # populations can't shrink
+        self.assertRaises(ValueError, evolve_islands, genes[:, :30], 
+            self.anscombe_1, 5)
+
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# file created 10/18/2026
+
+__author__ = "Will Van Treuren"
+__copyright__ = "Copyright 2013, Will Van Treuren"
+__credits__ = ["Will Van Treuren, Sophie Weiss"]
+__license__ = "GPL"
+__url__ = ''
+__version__ = ".9-Dev"
+__maintainer__ = "Will Van Treuren"
+__email__ = "wdwvt1@gmail.com"
+
+'''
+Test incremental correlation.
+'''
+
+from cogent.util.unit_test import TestCase, main
+from correlations.eval.incremental import CorrelationAccumulator
+from correlations.eval.naive_matrix import naive_cc_matrix, naive_pval_matrix
+from numpy import isnan, cov
+from numpy.random import RandomState
+from tempfile import mkdtemp
+from shutil import rmtree
+from os.path import join
+
+
+class CorrelationAccumulatorTests(TestCase):
+    '''Test updates agree with calculating from all samples.'''
+
+    def setUp(self):
+        '''Define a table with a large offset and a constant otu.'''
+        prng = RandomState(0)
+        self.data = prng.rand(8, 40) + 1e6
+        self.data[2] = self.data[1] + prng.rand(40)*.01
+        self.data[5] = 3.
+        self.otu_ids = ['o%s' % i for i in range(8)]
+        self.tmp_dir = mkdtemp()
+
+    def tearDown(self):
+        '''Remove temporary files.'''
+        rmtree(self.tmp_dir)
+
+    def assertMatchesAll(self, acc, data):
+        '''Check acc agrees with correlating data from scratch.'''
+        obs = acc.correlations()
+        exp = naive_cc_matrix(data, 'pearson')
+        self.assertEqual(isnan(obs), isnan(exp))
+        self.assertFloatEqual(obs[~isnan(exp)], exp[~isnan(exp)])
+
+    def test_update(self):
+        '''Test batches of different sizes give the full table result.'''
+        acc = CorrelationAccumulator(self.otu_ids)
+        for a, b in [(0, 1), (1, 15), (15, 15), (15, 16), (16, 40)]:
+            acc.update(self.data[:, a:b])
+            if b > 2:
+                self.assertMatchesAll(acc, self.data[:, :b])
+        self.assertEqual(acc.samples, 40)
+        self.assertFloatEqual(acc.means, self.data.mean(1))
+        self.assertFloatEqual(acc.comoments, cov(self.data)*39)
+        self.assertRaises(ValueError, acc.update, self.data[:3])
+
+    def test_pvals(self):
+        '''Test pvals use the total number of samples.'''
+        acc = CorrelationAccumulator(self.otu_ids).update(self.data)
+        obs = acc.pvals('parametric_t_distribution')
+        exp = naive_pval_matrix(naive_cc_matrix(self.data, 'pearson'), 40,
+            'parametric_t_distribution')
+        self.assertFloatEqual(obs[~isnan(exp)], exp[~isnan(exp)])
+
+    def test_save_load(self):
+        '''Test a saved state can be loaded and updated.'''
+        fp = join(self.tmp_dir, 'state.npz')
+        CorrelationAccumulator(self.otu_ids).update(self.data[:, :25]).save(fp)
+        acc = CorrelationAccumulator.load(fp)
+        self.assertEqual(acc.otu_ids, self.otu_ids)
+        self.assertEqual(acc.samples, 25)
+        acc.update(self.data[:, 25:])
+        self.assertMatchesAll(acc, self.data)
+
+
+if __name__ == '__main__':
+    main()
@@ -16,8 +16,10 @@ from os.path import exists, join
 from cogent.util.unit_test import TestCase, main
 from qiime.test import initiate_timeout, disable_timeout
 from correlations.generators.lokta_volterra import (dX_dt_template, 
-    lokta_volterra)
-from numpy import array, linspace
+    lokta_volterra, stack_communities, stacked_dX_dt, lokta_volterra_batch,
+    lokta_volterra_sweep, dX_dt_jacobian, CallCounter)
+from numpy import array, linspace, zeros, arange
+from numpy.random import RandomState
 from numpy.testing import assert_array_almost_equal
 from scipy import integrate
 
@@ -65,6 +67,121 @@ class TestLVGenerator(TestCase):
         Y = lokta_volterra(f, array([10,5]), 0, 15, 1000)
         assert_array_almost_equal(exp, Y.T)
 
+    def test_stacked_dX_dt(self):
+        '''Test the stacked derivative and banded Jacobian of communities.'''
+        C1 = array([[1., 0, -.1],
+                    [-1.5, 0.075, 0]])
+        C2 = array([[.5, -.6, .7, .1],
+                    [.1, .2, -1.5, 0],
+                    [.3, 0, .4, -.9]])
+        alphas, A, X0, sizes = stack_communities([C1, C2], [[10, 5], 
+            [1, 2, 3]])
+        self.assertEqual(sizes, [2, 3])
+        assert_array_almost_equal(X0, [10, 5, 0, 1, 2, 3])
+        dX_dt, jac = stacked_dX_dt(alphas, A)
+        X = array([10, 5, 0, 1, 2, 3.])
+        obs = dX_dt(X)
+        assert_array_almost_equal(obs[:2], dX_dt_template(C1)(X[:2]))
+        assert_array_almost_equal(obs[3:], dX_dt_template(C2)(X[3:]))
+        self.assertEqual(obs[2], 0)
+        # compare the band with a finite difference Jacobian
+        band = jac(X).copy()
+        full = zeros((6, 6))
+        for j in range(6):
+            h = zeros(6)
+            h[j] = 1e-6
+            full[:, j] = (dX_dt(X+h).copy() - dX_dt(X-h))/2e-6
+        for i in range(6):
+            for j in range(6):
+                if abs(i - j) <= 2:
+                    self.assertFloatEqual(band[i-j+2, j], full[i, j])
+                else:
+                    self.assertFloatEqual(full[i, j], 0.)
+
+    def test_lokta_volterra_batch(self):
+        '''Test communities integrated together match integrating alone.'''
+        prng = RandomState(0)
+        Cs, X0s = [], []
+        for n in [2, 3, 3, 4]:
+            C = zeros((n, n+1))
+            C[:,0] = prng.uniform(.5, 1., n)
+            C[:,1:] = prng.uniform(-.1, .05, (n, n))
+            C[arange(n), arange(n)+1] = -.5
+            Cs.append(C)
+            X0s.append(prng.uniform(1, 2, n))
+        obs = lokta_volterra_batch(Cs, X0s, 0, 10, 50, rtol=1e-10, 
+            atol=1e-10)
+        no_jac = lokta_volterra_batch(Cs, X0s, 0, 10, 50, jacobian=False,
+            rtol=1e-10, atol=1e-10)
+        for C, X0, X, Y in zip(Cs, X0s, obs, no_jac):
+            exp = lokta_volterra(dX_dt_template(C), X0, 0, 10, 50)
+            self.assertEqual(X.shape, exp.shape)
+            assert_array_almost_equal(X, exp, 5)
+            assert_array_almost_equal(Y, exp, 5)
+        # sweeps keep the order of Cs and don't depend on procs
+        serial = lokta_volterra_sweep(Cs, X0s, 0, 10, 50, 
+            communities_per_batch=2)
+        parallel = lokta_volterra_sweep(Cs, X0s, 0, 10, 50, procs=2,
+            communities_per_batch=2)
+        for X, Y, C in zip(serial, parallel, Cs):
+            self.assertEqual(X.shape[0], C.shape[0])
+            assert_array_almost_equal(X, Y)
+        # manifests of the interaction matrices, before full output
+        res, manifests, info = lokta_volterra_batch(Cs, X0s, 0, 10, 50, 
+            manifests=True, full_output=True)
+        self.assertEqual(len(manifests), 4)
+        self.assertEqual(manifests[1].otu_ids, ['o0', 'o1', 'o2'])
+        self.assertEqual(len(manifests[1].i), 3)
+        self.assertTrue(info['nfev'] > 0)
+        res, manifests = lokta_volterra_sweep(Cs, X0s, 0, 10, 50, 
+            communities_per_batch=2, manifests=True)
+        self.assertEqual([len(m.otu_ids) for m in manifests], [2, 3, 3, 4])
+
+    def test_dX_dt_jacobian(self):
+        '''Test the analytic Jacobian matches finite differences.'''
+        C = array([[.5, -.6, .7, .1],
+                   [.1, .2, -1.5, 0],
+                   [.3, 0, .4, -.9]])
+        f = dX_dt_template(C)
+        X = array([1., 2, 3])
+        obs = dX_dt_jacobian(C)(X)
+        for j in range(3):
+            h = zeros(3)
+            h[j] = 1e-6
+            assert_array_almost_equal(obs[:, j], (f(X+h) - f(X-h))/2e-6)
+
+    def test_lokta_volterra_stiff(self):
+        '''Test solvers agree and the Jacobian saves evaluations.'''
+        # strong self limitation and fast growth make the system stiff
+        C = array([[500., -500, -400, 0],
+                   [600., 0, -500, 300],
+                   [700., -450, 0, -500]])
+        X0 = array([1., 2, 3])
+        f = dX_dt_template(C)
+        exp, info = lokta_volterra(f, X0, 0, 50, 20, rtol=1e-8, atol=1e-8,
+            full_output=True)
+        obs, jinfo = lokta_volterra(f, X0, 0, 50, 20, 
+            Dfun=dX_dt_jacobian(C), rtol=1e-8, atol=1e-8, full_output=True)
+        assert_array_almost_equal(obs, exp, 5)
+        self.assertEqual(info['njev'], 0)
+        self.assertTrue(jinfo['njev'] > 0)
+        self.assertTrue(jinfo['nfev'] < info['nfev'])
+        for method in ['BDF', 'Radau', 'LSODA']:
+            obs = lokta_volterra(f, X0, 0, 50, 20, Dfun=dX_dt_jacobian(C),
+                method=method, rtol=1e-8, atol=1e-8)
+            assert_array_almost_equal(obs, exp, 4)
+        # counters for the batch engine
+        res, info = lokta_volterra_batch([C, C], [X0, X0], 0, 50, 20, 
+            full_output=True)
+        self.assertTrue(info['nfev'] > 0 and info['njev'] > 0)
+
+    def test_CallCounter(self):
+        '''Test calls are counted.'''
+        f = CallCounter(lambda x, y: x + y)
+        self.assertEqual(f(1, 2), 3)
+        f(3, 4)
+        self.assertEqual(f.calls, 2)
+
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+# file created 10/18/2026
+
+__author__ = "Will Van Treuren"
+__copyright__ = "Copyright 2013, Will Van Treuren"
+__credits__ = ["Will Van Treuren, Sophie Weiss"]
+__license__ = "GPL"
+__url__ = ''
+__version__ = ".9-Dev"
+__maintainer__ = "Will Van Treuren"
+__email__ = "wdwvt1@gmail.com"
+
+'''
+Test the native local similarity analysis engine.
+'''
+
+from cogent.util.unit_test import TestCase, main
+from correlations.eval.lsa import (normalize_series, delays, lagged_products,
+    local_similarity, theoretical_pvals, shifted_correlations, bh_qvalues,
+    lsa, lsa_lines, lsa_results, LSA_HEADER)
+from correlations.eval.parse import LSAResults
+from numpy import array, sin, linspace, vstack, roll, zeros
+from numpy.random import RandomState
+
+
+def brute_local_similarity(x, y, max_delay):
+    '''Loop based dynamic program for a single pair.'''
+    n = len(x)
+    best = (0., 0, 0, 0)
+    for d in delays(max_delay):
+        P, N, sp, sn = 0., 0., 0, 0
+        for t in range(n):
+            p = x[t]*y[t+d] if 0 <= t+d < n else 0.
+            P, N = max(0., P+p), max(0., N-p)
+            if P == 0:
+                sp = t+1
+            if N == 0:
+                sn = t+1
+            if P > abs(best[0]):
+                best = (P, sp, t-sp+1, d)
+            if N > abs(best[0]):
+                best = (-N, sn, t-sn+1, d)
+    return best[0]/n, best[1], best[2], best[3]
+
+
+class LSATests(TestCase):
+    '''Test the LSA engine.'''
+
+    def setUp(self):
+        '''Define series where o1 follows o0 by two time points.'''
+        prng = RandomState(0)
+        base = sin(linspace(0, 6, 40)) + prng.normal(0, .1, 40)
+        self.data = vstack([base, roll(base, 2) + prng.normal(0, .1, 40),
+            prng.normal(0, 1, (3, 40))]) + 5
+        self.otu_ids = ['o%s' % i for i in range(5)]
+
+    def test_normalize_series(self):
+        '''Test normalized rows are centered with unit variance.'''
+        for method in ['percentileZ', 'zscore']:
+            obs = normalize_series(self.data, method)
+            self.assertFloatEqual(obs.mean(1), zeros(5))
+            self.assertFloatEqual(obs.std(1), zeros(5) + 1.)
+        self.assertRaises(ValueError, normalize_series, self.data, 'x')
+
+    def test_delays(self):
+        '''Test delays are ordered by absolute value.'''
+        self.assertEqual(delays(0), [0])
+        self.assertEqual(delays(2), [0, -1, 1, -2, 2])
+
+    def test_local_similarity(self):
+        '''Test vectorized program matches the loop for many pairs.'''
+        prng = RandomState(1)
+        x, y = prng.randn(15, 25), prng.randn(15, 25)
+        for max_delay in [0, 3]:
+            ls, beg, length, lag = local_similarity(lagged_products(x, y,
+                max_delay))
+            for k in range(15):
+                exp = brute_local_similarity(x[k], y[k], max_delay)
+                self.assertFloatEqual(ls[k], exp[0])
+                self.assertEqual((beg[k], length[k], 
+                    delays(max_delay)[lag[k]]), exp[1:])
+            # scores without positions are the same
+            self.assertFloatEqual(local_similarity(lagged_products(x, y,
+                max_delay), positions=False), ls)
+
+    def test_local_similarity_simple(self):
+        '''Test a hand calculated negative, delayed pair.'''
+        x = array([[1., -1, 1, 1, 0]])
+        y = array([[0., -1, 1, -1, -1]])
+        # y_t+1 = -x_t for t=0..3 so LS is -4/5 at delay 1
+        ls, beg, length, lag = local_similarity(lagged_products(x, y, 1))
+        self.assertFloatEqual(ls, [-.8])
+        self.assertEqual(beg, [0])
+        self.assertEqual(length, [4])
+        self.assertEqual(delays(1)[lag[0]], 1)
+
+    def test_theoretical_pvals(self):
+        '''Test p-values are in range, decreasing, and larger with delays.'''
+        ls = array([0., .1, .2, .4, -.4, .8])
+        obs = theoretical_pvals(ls, 50, 0)
+        self.assertFloatEqual(obs[0], 1.)
+        self.assertTrue(obs[1] > obs[2] > obs[3] > obs[5])
+        self.assertFloatEqual(obs[3], obs[4])
+        self.assertTrue((obs >= 0).all() and (obs <= 1).all())
+        self.assertTrue((theoretical_pvals(ls, 50, 2)[1:] > obs[1:]).all())
+
+    def test_shifted_correlations(self):
+        '''Test the shifted correlation finds the delay of the series.'''
+        x = self.data[[0, 0]]
+        y = self.data[[1, 2]]
+        r, p, sr, sp, sd = shifted_correlations(x, y, 3)
+        self.assertTrue(sr[0] > .95 and sr[0] > r[0])
+        self.assertTrue(sp[0] < p[0])
+        # y_t+2 = x_t so Xs - Ys = -2
+        self.assertEqual(sd[0], -2)
+
+    def test_bh_qvalues(self):
+        '''Test Benjamini-Hochberg adjustment.'''
+        obs = bh_qvalues(array([.01, .04, .03, .5]))
+        self.assertFloatEqual(obs, [.04, .04*4/3., .04*4/3., .5])
+
+    def test_lsa(self):
+        '''Test blocks and procs don't change results.'''
+        i, j, res = lsa(self.data, max_delay=2, pvalue_method='permutation',
+            permutations=50, seed=0)
+        self.assertEqual(res.shape, (10, 23))
+        self.assertEqual(res[0, 7], 0.)
+        i2, j2, res2 = lsa(self.data, max_delay=2,
+            pvalue_method='permutation', permutations=50, seed=0,
+            pairs_per_block=3, procs=2)
+        self.assertEqual(i, i2)
+        self.assertEqual(j, j2)
+        self.assertFloatEqual(res, res2)
+
+    def test_lsa_results(self):
+        '''Test lines have the LSA tool columns and LSAResults parses them.'''
+        lines = lsa_lines(self.data, self.otu_ids, max_delay=2)
+        self.assertEqual(lines[0].split('\t'), LSA_HEADER)
+        self.assertEqual(len(lines), 11)
+        first = lines[1].split('\t')
+        self.assertEqual(first[:2], ['o0', 'o1'])
+        self.assertEqual(first[-2:], ['1', '2'])
+        self.assertEqual(first[8], '-2')
+        obs = lsa_results(self.data, self.otu_ids, 'ls', .001, max_delay=2)
+        self.assertTrue(isinstance(obs, LSAResults))
+        self.assertEqual(obs.edges, [('o0', 'o1')])
+        self.assertEqual(obs.interactions, ['copresence'])
+
+
+if __name__ == '__main__':
+    main()
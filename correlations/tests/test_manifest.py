@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+# file created 10/18/2026
+
+__author__ = "Will Van Treuren"
+__copyright__ = "Copyright 2013, Will Van Treuren"
+__credits__ = ["Will Van Treuren, Sophie Weiss"]
+__license__ = "GPL"
+__url__ = ''
+__version__ = ".9-Dev"
+__maintainer__ = "Will Van Treuren"
+__email__ = "wdwvt1@gmail.com"
+
+'''
+Test ground truth manifests.
+'''
+
+from cogent.util.unit_test import TestCase, main
+from correlations.generators.manifest import (Manifest, manifest_maker,
+    relationship_edges, ecological_manifest, combine_manifests, 
+    rules_manifest, interaction_matrix_manifest, correlation_matrix_manifest,
+    timeseries_manifest, block_manifest)
+from correlations.generators.timeseries import cube_d5_indices
+from correlations.eval.result_eval import (manifest_matches, 
+    manifest_edge_counts, block_interacting_edges, manifest_node_blocks,
+    manifest_type_counts, null_sig_node_locs)
+from correlations.eval.roc import manifest_roc_counts
+from numpy import array, isnan
+from numpy.random import RandomState
+from tempfile import mkdtemp
+from shutil import rmtree
+from os.path import join
+
+
+class ManifestTests(TestCase):
+    '''Test manifests are built, written and joined correctly.'''
+
+    def setUp(self):
+        '''Define a manifest of a table with three ecological blocks.'''
+        self.methods = ['amensally_related_2d_st_3', 'mutually_related_1d_st_2',
+            'partial-obligate-syntrophic_related_2d_st_NA']
+        self.m = ecological_manifest(self.methods, [6, 4, 3])
+        self.tmp_dir = mkdtemp()
+
+    def tearDown(self):
+        '''Remove temporary files.'''
+        rmtree(self.tmp_dir)
+
+    def test_relationship_edges(self):
+        '''Test groups of dim+1 otus give cis and trans edges.'''
+        i, j, trans = relationship_edges(3, 9, 2)
+        self.assertEqual(i, [3, 3, 4, 6, 6, 7])
+        self.assertEqual(j, [4, 5, 5, 7, 8, 8])
+        self.assertEqual(trans, [False, True, True, False, True, True])
+
+    def test_ecological_manifest(self):
+        '''Test blocks and edges of ecological tables.'''
+        self.assertEqual(self.m.otu_ids, ['o%s' % k for k in range(13)])
+        self.assertEqual(self.m.blocks[:2], [(self.methods[0], 0, 6, 2, 3.),
+            (self.methods[1], 6, 10, 1, 2.)])
+        self.assertTrue(isnan(self.m.blocks[2][4]))
+        self.assertEqual(self.m.i, [0, 0, 1, 3, 3, 4, 6, 8, 10, 10, 11])
+        self.assertEqual(self.m.j, [1, 2, 2, 4, 5, 5, 7, 9, 11, 12, 12])
+        self.assertEqual(self.m.signs, [0, -1, -1, 0, -1, -1, 1, 1, 0, 1, 1])
+        self.assertEqual(self.m.block_inds, [0]*6 + [1]*2 + [2]*3)
+        self.assertEqual(list(self.m.types[:3]), ['cis', 'trans', 'trans'])
+
+    def test_write_and_parse(self):
+        '''Test manifests survive a round trip through a file.'''
+        fp = join(self.tmp_dir, 'manifest.txt')
+        self.m.write(fp)
+        obs = manifest_maker(fp)
+        self.assertEqual(obs.otu_ids, self.m.otu_ids)
+        self.assertEqual(obs.blocks[:2], self.m.blocks[:2])
+        for attr in ['i', 'j', 'signs', 'block_inds']:
+            self.assertEqual(getattr(obs, attr), getattr(self.m, attr))
+        self.assertEqual(list(obs.types), list(self.m.types))
+        self.assertFloatEqual(obs.strengths[:8], self.m.strengths[:8])
+        empty = Manifest(['a'], [], [], [], [], [], [], [])
+        self.assertEqual(len(Manifest.fromLines(empty.toLines()).i), 0)
+
+    def test_other_generators(self):
+        '''Test manifests of rules, LV, copula and timeseries tables.'''
+        m = rules_manifest([0, 2], 3, [[.4, 'add'], [2., 'sub']], 
+            ['a', 'b', 'c', 'd'])
+        self.assertEqual((m.i, m.j, m.signs), ([0, 2], [3, 3], [1, -1]))
+        self.assertFloatEqual(m.strengths, [.4, 2.])
+        C = array([[1., 0, -.1, 0], [-1.5, .075, 0, .2], [1., .3, -.4, 0]])
+        m = interaction_matrix_manifest(C, ['x', 'y', 'z'])
+        # predator-prey pairs have opposite signs so their sign is unknown
+        self.assertEqual((m.i, m.j, m.signs), ([0, 0, 1], [1, 2, 2], 
+            [0, 1, 0]))
+        self.assertFloatEqual(m.strengths, [.1, .3, .4])
+        rho = array([[1., .5, 0], [.5, 1., -.05], [0, -.05, 1.]])
+        m = correlation_matrix_manifest(rho, ['x', 'y', 'z'], .01)
+        self.assertEqual((m.i, m.j, m.signs), ([0, 1], [1, 2], [1, -1]))
+        q = cube_d5_indices([1, 2], [1], [0, .5], [0], [[None, .5]])
+        m = timeseries_manifest(q, ['t0', 't1', 't2', 't3'])
+        self.assertEqual((m.i, m.j), ([0, 0, 1, 2], [1, 2, 3, 3]))
+        self.assertEqual(list(m.types), ['same_except_phase', 
+            'same_except_freq', 'same_except_freq', 'same_except_phase'])
+        # tables built from several generators
+        m = combine_manifests([self.m, m], self.m.otu_ids + ['t0', 't1', 
+            't2', 't3'])
+        self.assertEqual(m.blocks[3], ('timeseries', 13, 17, 5, m.blocks[3][4]))
+        self.assertEqual(m.i[-4:], [13, 13, 14, 15])
+        self.assertEqual(m.block_inds[-4:], [3]*4)
+
+    def test_manifest_edge_counts(self):
+        '''Test the manifest join agrees with counting by otu names.'''
+        prng = RandomState(0)
+        methods = ['amensally_related_2d_st_3', 'mutually_related_3d_st_1',
+            'mutually_related_1d_st_2', 'competitively_related_2d_st_3',
+            'commensually_related_2d_st_5']
+        num_otus = [12, 0, 18, 3, 24]
+        m = ecological_manifest(methods, num_otus)
+        pairs = prng.randint(0, 60, size=(2000, 2))
+        edges = [('o%s' % a, 'o%s' % b) for a, b in pairs if a != b]
+        interactions = [['copresence', 'mutualExclusion'][k] for k in 
+            prng.randint(0, 2, len(edges))]
+        obs = manifest_edge_counts(m, edges, interactions)
+        exp = block_interacting_edges([0, 12, 12, 30, 33], [12, 12, 30, 33, 
+            57], [2, 3, 1, 2, 2], edges, interactions)
+        self.assertEqual(obs, exp)
+        # otus that aren't in the manifest are never matched
+        self.assertEqual(manifest_matches(m, [('o1', 'o0'), ('x', 'o0'), 
+            ('o0', 'o3')]), [0, -1, -1])
+        self.assertEqual(manifest_edge_counts(m, [], []), [(0,)*7]*5)
+        TP, IT, TT = manifest_roc_counts(m, [('o1', 'o0'), ('o2', 'o1'), 
+            ('o0', 'o3')], ['trans'])
+        self.assertEqual((TP, IT, TT), (1, len(m.i) - (m.types == 
+            'cis').sum(), 3))
+
+
+    def test_manifest_node_blocks(self):
+        '''Test otus are placed in blocks as null_sig_node_locs does.'''
+        num_nodes = [5, 0, 3, 7]
+        m = block_manifest(['a', 'b', 'c', 'd'], num_nodes)
+        self.assertEqual(m.blocks[2], ('c', 5, 8, 0, m.blocks[2][4]))
+        self.assertEqual(len(m.i), 0)
+        nodes = ['o%s' % k for k in [0, 4, 5, 7, 8, 14, 3]]
+        blocks, offsets = manifest_node_blocks(m, nodes)
+        self.assertEqual(blocks, null_sig_node_locs(num_nodes, nodes))
+        self.assertEqual(offsets, [0, 4, 0, 2, 0, 6, 3])
+        # otus outside the manifest, names don't matter
+        blocks, offsets = manifest_node_blocks(block_manifest(['a', 'b'], 
+            [2, 2], ['w', 'x', 'y', 'z']), ['z', 'o1', 'w'])
+        self.assertEqual((blocks, offsets), ([1, -1, 0], [1, -1, 0]))
+
+    def test_manifest_pulse_envelope(self):
+        '''Test manifest lags match the otu arithmetic of the pulse plot.'''
+        n = 6
+        m = block_manifest(['signal', 'envelope'], [n, n])
+        prng = RandomState(0)
+        pairs = prng.randint(0, 2*n, size=(50, 2))
+        b1, off1 = manifest_node_blocks(m, ['o%s' % a for a in pairs[:, 0]])
+        b2, off2 = manifest_node_blocks(m, ['o%s' % b for b in pairs[:, 1]])
+        env1, env2 = b1 == 1, b2 == 1
+        self.assertEqual(env1.astype(int) + env2, (pairs >= n).sum(1))
+        self.assertEqual(abs(off1 + env1*n - off2 - env2*n) % n, 
+            abs(pairs[:, 0] - pairs[:, 1]) % n)
+
+    def test_manifest_type_counts(self):
+        '''Test detected edges are counted by the parameter they differ in.'''
+        q = cube_d5_indices([1, 2], [1], [0, .5], [0], [[None, .5]])
+        m = timeseries_manifest(q, ['t0', 't1', 't2', 't3'])
+        types, counts = manifest_type_counts(m, [('t1', 't0'), ('t2', 't0'),
+            ('t3', 't2'), ('t0', 't3')], ['copresence', 'mutualExclusion',
+            'copresence', 'copresence'])
+        self.assertEqual(types, ['same_except_freq', 'same_except_phase'])
+        self.assertEqual(counts, [(2, 1, 0, 1), (2, 2, 2, 0)])
+
+
+if __name__ == '__main__':
+    main()
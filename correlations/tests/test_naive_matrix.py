@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+# file created 10/18/2026
+
+__author__ = "Will Van Treuren"
+__copyright__ = "Copyright 2013, Will Van Treuren"
+__credits__ = ["Will Van Treuren, Sophie Weiss"]
+__license__ = "GPL"
+__url__ = ''
+__version__ = ".9-Dev"
+__maintainer__ = "Will Van Treuren"
+__email__ = "wdwvt1@gmail.com"
+
+'''
+Test the matrix based naive correlation calculations.
+'''
+
+from cogent.util.unit_test import TestCase, main
+from correlations.eval.naive_matrix import (naive_cc_matrix, 
+    naive_pval_matrix, sparse_ranks, sparse_cc_matrix)
+from cogent.maths.stats.distribution import tprob, zprob
+from numpy import (array, corrcoef, isnan, arctanh, apply_along_axis, float32,
+    triu_indices)
+from scipy.sparse import csr_matrix
+from numpy.random import seed
+from scipy.stats import spearmanr, rankdata
+from scipy.stats.distributions import lognorm
+
+
+class NaiveEngineTests(TestCase):
+    '''Test that the matrix engine agrees with the pairwise calculations.'''
+
+    def setUp(self):
+        '''Define a small table used by all tests.'''
+        seed(0)
+        self.data = lognorm.rvs(1, 0, 5, size=(6, 20)).round(0)
+
+    def test_naive_cc_matrix(self):
+        '''Test pearson and spearman scores match numpy and scipy.'''
+        self.assertFloatEqual(naive_cc_matrix(self.data, 'pearson'), 
+            corrcoef(self.data))
+        self.assertFloatEqual(naive_cc_matrix(self.data, 'spearman'),
+            spearmanr(self.data.T)[0])
+        # rows without variance get nan scores
+        data = self.data.copy()
+        data[2] = 3.
+        obs = naive_cc_matrix(data, 'pearson')
+        self.assertTrue(isnan(obs[2]).all())
+        self.assertRaises(ValueError, naive_cc_matrix, data, 'kendall')
+
+    def test_sparse_ranks(self):
+        '''Test sparse ranks are rankdata ranks shifted so zeros are 0.'''
+        data = array([[0, 3, 0, 1, 3, 0], [2, 2, 0, 0, 0, 0], 
+            [0, 0, 0, 0, 0, 0], [1, 4, 2, 3, 5, 6]])
+        obs = sparse_ranks(data).toarray()
+        exp = apply_along_axis(rankdata, 1, data)
+        # (zeros + 1)/2 is subtracted from every rank
+        exp -= array([2., 2.5, 3.5, .5]).reshape(-1, 1)
+        self.assertFloatEqual(obs, exp)
+
+    def test_sparse_cc_matrix(self):
+        '''Test sparse scores match the dense calculation.'''
+        data = self.data.copy()
+        data[data < 5] = 0.
+        data[2] = 0.
+        for method in ['pearson', 'spearman']:
+            exp = naive_cc_matrix(data, method)
+            # sparse calculation and dense fallback
+            for density in [1., 0.]:
+                obs = sparse_cc_matrix(csr_matrix(data), method, density)
+                self.assertEqual(isnan(obs), isnan(exp))
+                self.assertFloatEqual(obs[~isnan(exp)], exp[~isnan(exp)])
+        obs = sparse_cc_matrix(data, 'spearman', 1.)
+        self.assertFloatEqual(obs[~isnan(exp)], exp[~isnan(exp)])
+        # negative values can't be ranked sparsely, dense is used
+        data[0, 0] = -1.
+        self.assertFloatEqual(sparse_cc_matrix(data, 'spearman', 1.)[0, 1],
+            spearmanr(data[0], data[1])[0])
+        self.assertRaises(ValueError, sparse_cc_matrix, data, 'kendall')
+
+    def test_float32(self):
+        '''Test float32 results match float64 results and sig decisions.'''
+        data = self.data.copy()
+        data[data < 4] = 0.
+        iu = triu_indices(6, 1)
+        for method in ['pearson', 'spearman']:
+            exp = naive_cc_matrix(data, method)
+            for obs in [naive_cc_matrix(data, method, dtype=float32, 
+                rows_per_block=4), sparse_cc_matrix(csr_matrix(data), method,
+                1., dtype=float32, rows_per_block=4)]:
+                self.assertEqual(obs.dtype, float32)
+                self.assertFloatEqual(obs[iu], exp[iu], eps=1e-6)
+                pobs = naive_pval_matrix(obs, 20, 'parametric_t_distribution')
+                pexp = naive_pval_matrix(exp, 20, 'parametric_t_distribution')
+                self.assertEqual(pobs.dtype, float32)
+                for sig_lvl in [.05, .01, .001]:
+                    self.assertEqual(pobs[iu] <= sig_lvl, pexp[iu] <= sig_lvl)
+
+    def test_naive_pval_matrix(self):
+        '''Test pvals match the pairwise t and fisher z calculations.'''
+        ccs = array([[1., .3, -.5], [.3, 1., .05], [-.5, .05, 1.]])
+        n = 20
+        tobs = naive_pval_matrix(ccs, n, 'parametric_t_distribution')
+        zobs = naive_pval_matrix(ccs, n, 'fisher_z_transform')
+        for i, j in [(0, 1), (0, 2), (1, 2)]:
+            r = ccs[i][j]
+            self.assertFloatEqual(tobs[i][j], 
+                tprob(r*((n-2)/(1.-r**2))**.5, n-2))
+            self.assertFloatEqual(zobs[i][j], zprob(arctanh(r)*(n-3)**.5))
+        # scores of 1 get nan pvals
+        self.assertTrue(isnan(tobs.diagonal()).all())
+        self.assertTrue(isnan(zobs.diagonal()).all())
+        self.assertRaises(ValueError, naive_pval_matrix, ccs, n, 'bootstrap')
+
+if __name__ == '__main__':
+    main()
@@ -17,32 +17,14 @@ from os.path import exists, join
 from cogent.util.unit_test import TestCase, main
 from qiime.test import initiate_timeout, disable_timeout
 from correlations.generators.null import (model1_otu, model1_table, 
-    model2_table, model3_table, alter_table)
-from numpy import array
-from numpy.random import seed
+    model2_table, model3_table, alter_table, dirichlet_multinomial, 
+    null_tables, null_table_seeds)
+from tempfile import mkdtemp
+from numpy import array, where
+from numpy.random import seed, RandomState
 from numpy.testing import assert_array_almost_equal
 from scipy.stats.distributions import lognorm, beta, norm
 
-# insert seed for the COMMAND_STR to get reproducbile results
-import generators.null as gn
-gn.COMMAND_STR = \
-"""#!/usr/bin/env Rscript
-library('gtools');
-prior_vals = %s
-total_prior_knowledge = %s
-prior_vals = total_prior_knowledge*(prior_vals/sum(prior_vals))
-taxa = length(prior_vals)
-samples = %s
-sequencing_depth = round(%s)
-d = matrix(0,nrow=taxa,ncol=samples)
-set.seed(0)
-for (i in 1:samples){
-    pvs = rdirichlet(1,alpha=prior_vals)
-    d[,i]=table(factor(sample(taxa,sequencing_depth,pvs,replace=TRUE),1:taxa))
-}
-write.table(d, file=%s, sep=',', quote=FALSE, col.names=FALSE, row.names=FALSE)
-"""
-
 class TestNullGenerators(TestCase):
     
     def setUp(self):
@@ -69,13 +51,27 @@ class TestNullGenerators(TestCase):
         obs = model1_table(inp, 5)
         assert_array_almost_equal(exp, obs)
     
+    def test_dirichlet_multinomial(self):
+        """Tests counts have the requested depth and expected proportions."""
+        obs = dirichlet_multinomial([1., 2., 3., 4.], 2000, 100, 
+            RandomState(0))
+        self.assertEqual(obs.shape, (4, 2000))
+        self.assertTrue(all(obs.sum(0)==100))
+        self.assertTrue((obs >= 0).all())
+        # expected proportions are alpha/alpha.sum()
+        assert_array_almost_equal(obs.mean(1)/100., [.1, .2, .3, .4], 2)
+        # a taxon with all the mass gets every count
+        obs = dirichlet_multinomial([1e-9, 1e9], 5, 30, RandomState(0))
+        assert_array_almost_equal(obs, [[0]*5, [30]*5])
+
     def test_model2_table(self):
         """Tests model2 table is created correctly."""
-        # seed R at 0 by altering the command str
-        exp = array([[33.,19.,53.,32.,4.,14.,17.,10.,9.,7.],
-                     [17.,29.,10.,34.,7.,30.,5.,14.,68.,51.],
-                     [10.,19.,16.,21.,54.,33.,43.,26.,12.,17.],
-                     [40.,33.,21.,13.,35.,23.,35.,50.,11.,25.]])
+        exp = model2_table([1,1.1,1.4,1.5],10,100,10,RandomState(0))
+        obs = model2_table([1,1.1,1.4,1.5],10,100,10,RandomState(0))
+        assert_array_almost_equal(exp, obs)
+        self.assertEqual(obs.shape, (4, 10))
+        # the global random state is used if no prng is passed
+        seed(0)
         obs = model2_table([1,1.1,1.4,1.5],10,100,10)
         assert_array_almost_equal(exp, obs)
         # test with a random array to make sure sequencing depth (col sums) are
@@ -85,11 +81,9 @@ class TestNullGenerators(TestCase):
 
     def test_model3_table(self):
         """Tests model3 table is created correctly."""
-        exp = array([[8.,0.,28.,7.,0.,0.,0.,0.,0.,0.],
-                     [0.,4.,0.,9.,0.,5.,0.,0.,43.,26.],
-                     [0.,0.,0.,0.,29.,8.,18.,1.,0.,0.],
-                     [15.,8.,0.,0.,10.,0.,10.,25.,0.,0.]])
-        obs = model3_table([1,1.1,1.4,1.5],10,100,10)
+        data = model2_table([1,1.1,1.4,1.5],10,100,10,RandomState(0))
+        exp = where(data-data.mean() > 0, data-data.mean(), 0)
+        obs = model3_table([1,1.1,1.4,1.5],10,100,10,RandomState(0))
         assert_array_almost_equal(obs, exp)
 
     def test_alter_table(self):
@@ -108,16 +102,56 @@ class TestNullGenerators(TestCase):
                    [0.,0.,0.,0.,0.74358974,0.61538462,0.64285714,0.03846154,0.,0.],
                    [0.65217391,0.66666667,0.,0.,0.25641026,0.,0.35714286,0.96153846,0.,0.]])
         assert_array_almost_equal(exp, obs)
-        seed(0) #seed for reproducibility of sparsity calculations
         inp = array([[33.,19.,53.,32.,4.,14.,17.,10.,9.,7.],
                      [17.,29.,10.,34.,7.,30.,5.,14.,68.,51.],
                      [10.,19.,16.,21.,54.,33.,43.,26.,12.,17.],
                      [40.,33.,21.,13.,35.,23.,35.,50.,11.,25.]])
-        exp = array([[ 33.,   0.,   0.,  32.,   0.,   0.,  17.,   0.,   0.,   7.],
-       [  0.,   0.,   0.,   0.,   0.,   0.,   0.,   0.,   0.,  51.],
-       [  0.,  19.,   0.,  21.,   0.,   0.,   0.,   0.,   0.,   0.],
-       [  0.,   0.,   0.,   0.,   0.,   0.,   0.,   0.,  11.,   0.]])
-        assert_array_almost_equal(alter_table(inp,sparsity=.8), exp)
+        obs = alter_table(inp.copy(), sparsity=.8, prng=RandomState(0))
+        # exactly int(40*.8) entries are set to 0, the rest are unchanged
+        self.assertEqual((obs==0).sum(), 32)
+        assert_array_almost_equal(obs[obs!=0], inp[obs!=0])
+        exp = alter_table(inp.copy(), sparsity=.8, prng=RandomState(0))
+        assert_array_almost_equal(obs, exp)
+
+    def test_null_tables(self):
+        """Tests null table batches are reproducible across procs."""
+        args = ([1,1.1,1.4,1.5], 10, 100, 10)
+        serial = null_tables('model2', args, 4, 7)
+        parallel = null_tables('model2', args, 4, 7, procs=2)
+        for a, b in zip(serial, parallel):
+            assert_array_almost_equal(a, b)
+        # each table comes from its own seed
+        exp = model2_table(*args, prng=RandomState(null_table_seeds(7, 4)[2]))
+        assert_array_almost_equal(serial[2], exp)
+        # the global state doesn't matter
+        seed(0)
+        obs = null_tables('model1', ([[lognorm,2,0],[norm,0,10]], 5), 2, 3,
+            alter_kwargs={'sparsity':.5})
+        seed(1)
+        exp = null_tables('model1', ([[lognorm,2,0],[norm,0,10]], 5), 2, 3,
+            alter_kwargs={'sparsity':.5})
+        assert_array_almost_equal(obs[1], exp[1])
+        self.assertEqual((obs[1]==0).sum(), 5)
+        self.assertRaises(ValueError, null_tables, 'model4', args, 1, 0)
+
+    def test_null_tables_written(self):
+        """Tests workers write text tables that read back exactly."""
+        out_dir = mkdtemp()
+        try:
+            args = ([1,1.1,1.4,1.5], 10, 100, 10)
+            fps = null_tables('model3', args, 3, 11, out_dir=out_dir, 
+                procs=2, output='txt')
+            tables = null_tables('model3', args, 3, 11)
+            self.assertEqual(fps[0], join(out_dir, 'null_table_0.txt'))
+            for fp, exp in zip(fps, tables):
+                lines = open(fp).readlines()
+                obs = array([map(float, l.split('\t')[1:]) for l in 
+                    lines[1:]])
+                assert_array_almost_equal(obs, exp, 12)
+            fps = null_tables('model3', args, 1, 11, out_dir=out_dir)
+            self.assertTrue(exists(fps[0]) and fps[0].endswith('.biom'))
+        finally:
+            rmtree(out_dir)
 
 
 if __name__ == "__main__":
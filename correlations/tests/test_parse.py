@@ -17,10 +17,11 @@ Tests parsers.
 from cogent.util.unit_test import TestCase, main
 from correlations.eval.parse import (CorrelationCalcs, CoNetResults, RMTResults,
     SparCCResults, LSAResults, NaiveResults, BrayCurtisResults, MICResults,
-    triu_from_flattened) 
+    triu_from_flattened, parse_matrix_lines, EnsembleResults) 
 from biom.parse import parse_biom_table
 from biom.table import table_factory
-from numpy import array
+from numpy import array, float32, float64
+from numpy.random import RandomState
 
 
 # lists of lines are the input for each parser. here we define some lol's so 
@@ -418,7 +419,7 @@ class BrayCurtisParserTests(TestCase):
 
     def test_getSignificantData(self):
         '''Test that _getSignificantDaa works as intended (as well as init).'''
-        sig_lvl = .3 # 7 unique vals in data, .2*7 = 2.1 -> 2 chosen.
+        sig_lvl = .2 # 10 vals in data, .2*10 = 2 -> 2nd smallest (12) chosen.
         ro = BrayCurtisResults(BC_LINES, sig_lvl)
         # tests begin
         exp_data = array([
@@ -439,6 +440,51 @@ class BrayCurtisParserTests(TestCase):
         self.assertEqual(exp_otu1, ro.otu1)
         self.assertEqual(exp_otu2, ro.otu2)
 
+    def test_fromCondensed(self):
+        '''Test init from a condensed array.'''
+        # 2/10 values -> 2nd smallest value (12) is the lower bound
+        sig_lvl = .2
+        ro = BrayCurtisResults.fromCondensed(
+            array([6, 12, 18, 24, 18, 24, 30, 30, 36, 42.]),
+            ['o1','o2','o3','o4','o5'], sig_lvl)
+        self.assertFloatEqual(2/10., ro.actual_sig_lvl)
+        self.assertFloatEqual((array([0, 0]), array([1,2])), ro.sig_edges)
+        self.assertEqual(['o1', 'o1'], ro.otu1)
+        self.assertEqual(['o2', 'o3'], ro.otu2)
+        self.assertEqual([('o1','o2'), ('o1','o3')], ro.edges)
+        self.assertFloatEqual(array([6, 12.]), ro.cvals)
+        self.assertEqual(['copresence']*2, ro.interactions)
+        # ties with the lower bound are kept, blocks give the same result
+        ro = BrayCurtisResults.fromCondensed(
+            array([6, 12, 18, 24, 18, 24, 30, 30, 36, 42.]),
+            ['o1','o2','o3','o4','o5'], .3, block_size=3)
+        self.assertFloatEqual(array([6, 12, 18, 18.]), ro.cvals)
+        self.assertFloatEqual((array([0, 0, 0, 1]), array([1, 2, 3, 2])), 
+            ro.sig_edges)
+
+    def test_fromCondensed_matches_lines(self):
+        '''Test lines and the condensed array give the same edges.'''
+        dissims = array([6, 12, 18, 24, 18, 24, 30, 30, 36, 42.])
+        for sig_lvl in [.05, .2, .3, .5, .65, 1.]:
+            exp = BrayCurtisResults(BC_LINES, sig_lvl)
+            obs = BrayCurtisResults.fromCondensed(dissims, exp.otu_ids, 
+                sig_lvl, block_size=4)
+            self.assertEqual(obs.edges, exp.edges)
+            self.assertFloatEqual(obs.sig_edges, exp.sig_edges)
+            self.assertFloatEqual(obs.cvals, exp.cvals)
+            self.assertFloatEqual(obs.actual_sig_lvl, exp.actual_sig_lvl)
+
+    def test_fromCondensed_float32(self):
+        '''Test the boundary value is kept for float32 dissimilarities.'''
+        # round(float32(.10000013), 7) cast back to float32 is below itself,
+        # with sig_lvl .5 it is the lower bound
+        dissims = array([.05, .9, .10000013, .7, .09, .8], dtype=float32)
+        ro = BrayCurtisResults.fromCondensed(dissims, ['o1','o2','o3','o4'], 
+            .5)
+        self.assertEqual(3, len(ro.edges))
+        self.assertFloatEqual(dissims[[0, 2, 4]], ro.cvals)
+        self.assertFloatEqual(.5, ro.actual_sig_lvl)
+
 
 class MICResultsParserTests(TestCase):
     """Test that the MIC parser is operating as intended."""
@@ -496,9 +542,68 @@ class MICResultsParserTests(TestCase):
         self.assertEqual(exp_otu2, ro.otu2)
 
 
+class PrecisionTests(TestCase):
+    '''Test float32 storage doesn't change which edges are significant.'''
 
-
-
+    def setUp(self):
+        '''Create symmetric pval and cval matrix lines.'''
+        prng = RandomState(0)
+        n = 60
+        ps = prng.uniform(0, .1, size=(n, n))**2
+        # pvals written with few digits sit exactly on the sig levels
+        ps[:10] = ps[:10].round(3)
+        ps[10:15, :] = .05
+        ps[15:20, :] = .01
+        ps[20:25, :] = .001
+        ps = ps.T.copy()
+        ps[:] = ps.T
+        cs = prng.uniform(-1, 1, size=(n, n))
+        cs[:] = cs.T
+        ids = ['o%s' % i for i in range(n)]
+        def lines(m):
+            return ['#OTU ID\t%s\n' % '\t'.join(ids)] + ['%s\t%s\n' % 
+                (ids[i], '\t'.join(map(repr, m[i]))) for i in range(n)]
+        self.plines = lines(ps)
+        self.clines = lines(cs)
+
+    def test_parse_matrix_lines(self):
+        '''Test matrix lines are parsed to the passed dtype.'''
+        ids, data = parse_matrix_lines(['x\ta\tb\n', 'a\t1\tnan\n', 
+            'b\t.5\t2\n', '\n'], float32)
+        self.assertEqual(ids, ['a', 'b'])
+        self.assertEqual(data.dtype, float32)
+        self.assertFloatEqual(data[0, 0], 1.)
+        self.assertFloatEqual(data[1], [.5, 2.])
+
+    def test_naive_and_sparcc_sig_edges(self):
+        '''Test float32 and float64 results agree at the sig levels we use.'''
+        for sig_lvl in [.05, .01, .001]:
+            ro64 = NaiveResults(self.clines, self.plines, sig_lvl)
+            ro32 = NaiveResults(self.clines, self.plines, sig_lvl, 
+                dtype=float32)
+            self.assertEqual(ro32.pdata.dtype, float32)
+            self.assertEqual(ro32.edges, ro64.edges)
+            self.assertEqual(ro32.interactions, ro64.interactions)
+            self.assertFloatEqual(ro32.pvals, ro64.pvals)
+            ro64 = SparCCResults(self.plines, self.clines, sig_lvl, .1)
+            ro32 = SparCCResults(self.plines, self.clines, sig_lvl, .1,
+                dtype=float32)
+            self.assertEqual(ro32.cdata.dtype, float32)
+            self.assertEqual(ro32.edges, ro64.edges)
+            self.assertEqual(ro32.interactions, ro64.interactions)
+        # pvals equal to the sig level are significant in both
+        self.assertContains(ro32.edges, ('o20', 'o21'))
+
+    def test_ensemble(self):
+        '''Test the ensemble of float32 results stores float32 values.'''
+        ros = [NaiveResults(self.clines, self.plines, .01, dtype=float32),
+            NaiveResults(self.clines, self.plines, .05, dtype=float32)]
+        ero = EnsembleResults(ros, dtype=float32)
+        exp = dict(zip(map(lambda e: tuple(sorted(e)), ros[0].edges), 
+            ros[0].pvals))
+        self.assertEqual(set(ero.edges), set(exp))
+        self.assertEqual(ero.pvals[0].dtype, float32)
+        self.assertFloatEqual(ero.pvals[1], [exp[e] for e in ero.edges])
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+# file created 10/18/2026
+
+__author__ = "Will Van Treuren"
+__copyright__ = "Copyright 2013, Will Van Treuren"
+__credits__ = ["Will Van Treuren, Sophie Weiss"]
+__license__ = "GPL"
+__url__ = ''
+__version__ = ".9-Dev"
+__maintainer__ = "Will Van Treuren"
+__email__ = "wdwvt1@gmail.com"
+
+'''
+Test the in process rarefaction and shared pairs pipeline.
+'''
+
+from cogent.util.unit_test import TestCase, main
+from correlations.eval.rarefaction import rarefy, rarefaction_shared_pairs
+from correlations.eval.result_eval import keys_to_edges
+from numpy import array, vstack, arange
+from numpy.random import RandomState
+
+
+class RarefactionTests(TestCase):
+    '''Test rarefaction and the shared pairs pipeline.'''
+
+    def setUp(self):
+        '''Define a table with two strongly correlated otus.'''
+        prng = RandomState(0)
+        base = prng.randint(50, 500, size=30)
+        self.data = vstack([base, base*2, prng.randint(50, 500, size=(3, 30)),
+            prng.randint(0, 3, size=30)]).astype(float)
+
+    def test_rarefy(self):
+        '''Test sample depth and otu bounds are respected.'''
+        for replace in [False, True]:
+            obs = rarefy(self.data, 100, replace=replace, 
+                prng=RandomState(1))
+            self.assertTrue((obs.sum(0) == 100).all())
+            self.assertTrue((obs >= 0).all())
+            if not replace:
+                self.assertTrue((obs <= self.data).all())
+        # depth equal to the sample totals returns the table
+        data = array([[3., 0., 1.], [2., 5., 4.]])
+        self.assertEqual(rarefy(data, 5), data)
+        self.assertRaises(ValueError, rarefy, data, 6)
+
+    def test_rarefaction_shared_pairs(self):
+        '''Test the engineered edge is found in every rarefaction.'''
+        keys, counts = rarefaction_shared_pairs(self.data, 200, 5, 'pearson', 
+            'parametric_t_distribution', sig_lvl=.001, seed=0)
+        i, j = keys_to_edges(keys, self.data.shape[0])
+        self.assertEqual((i[0], j[0], counts[0]), (0, 1, 5))
+        self.assertTrue((counts <= 5).all())
+        # same seed gives the same results
+        keys2, counts2 = rarefaction_shared_pairs(self.data, 200, 5, 'pearson',
+            'parametric_t_distribution', sig_lvl=.001, seed=0)
+        self.assertEqual(keys, keys2)
+        self.assertEqual(counts, counts2)
+
+
+if __name__ == '__main__':
+    main()
@@ -17,13 +17,16 @@ data.
 
 from cogent.util.unit_test import TestCase, main
 from correlations.eval.result_eval import (interacting_edges, shared_pairs,
+    block_interacting_edges,
     null_sig_node_locs_timeseries, timeseries_indices, 
-    null_edge_directionality_timeseries)
+    null_edge_directionality_timeseries, edge_keys, keys_to_edges,
+    merge_edge_counts, shared_pair_counts, shared_pairs_histogram)
 from correlations.generators.timeseries import (subsample_otu_evenly,
     subsample_otu_zero, cube_d5_indices)
 from biom.parse import parse_biom_table
 from biom.table import table_factory
 from numpy import array, pi, zeros, triu
+from numpy.random import RandomState
 
 
 class ResultEvaluationFunctions(TestCase):
@@ -142,6 +145,81 @@ class ResultEvaluationFunctions(TestCase):
             interacting_edges(start, stop, dim, edges, interactions))
 
 
+    def test_block_interacting_edges(self):
+        '''Test all blocks are counted as one block at a time would be.'''
+        def loop_counts(start, stop, dim, edges, interactions):
+            # straightforward per edge version of interacting_edges
+            counts = [0]*7
+            for (a, b), interaction in zip(edges, interactions):
+                o1, o2 = int(a[1:]), int(b[1:])
+                if not (start <= o1 < stop and start <= o2 < stop and 
+                    o1//(dim+1) == o2//(dim+1)):
+                    continue
+                k = 4 if dim in [o1%(dim+1), o2%(dim+1)] else 1
+                counts[0] += 1
+                counts[k] += 1
+                counts[k+1 if interaction == 'copresence' else k+2] += 1
+            return tuple(counts)
+        prng = RandomState(0)
+        starts, stops, dims = [0, 12, 12, 30, 33], [12, 12, 30, 33, 57], \
+            [2, 3, 1, 2, 3]
+        pairs = prng.randint(0, 60, size=(2000, 2))
+        edges = [('o%s' % a, 'o%s' % b) for a, b in pairs if a != b]
+        interactions = [['copresence', 'mutualExclusion'][k] for k in 
+            prng.randint(0, 2, len(edges))]
+        obs = block_interacting_edges(starts, stops, dims, edges, interactions)
+        exp = [loop_counts(starts[k], stops[k], dims[k], edges, interactions) 
+            for k in range(5)]
+        self.assertEqual(obs, exp)
+        self.assertEqual(obs[1], (0,)*7)
+        self.assertTrue(obs[0][0] > 0 and obs[4][0] > 0)
+        self.assertEqual(block_interacting_edges(starts, stops, dims, [], []),
+            [(0,)*7]*5)
+
+    def test_edge_keys(self):
+        '''Test that edge keys are canonical and drop self edges.'''
+        obs = edge_keys(array([0, 3, 2, 4]), array([3, 0, 2, 1]), 5)
+        self.assertEqual(obs, array([3, 3, 9]))
+        i, j = keys_to_edges(obs, 5)
+        self.assertEqual(i, array([0, 0, 1]))
+        self.assertEqual(j, array([3, 3, 4]))
+
+    def test_merge_edge_counts(self):
+        '''Test that streamed edge keys are counted correctly.'''
+        keys, counts = merge_edge_counts(array([], dtype=int), 
+            array([], dtype=int), array([7, 3, 7]))
+        self.assertEqual(keys, array([3, 7]))
+        self.assertEqual(counts, array([1, 2]))
+        keys, counts = merge_edge_counts(keys, counts, array([1, 7]), 
+            array([4, 1]))
+        self.assertEqual(keys, array([1, 3, 7]))
+        self.assertEqual(counts, array([4, 1, 3]))
+
+    def test_shared_pair_counts(self):
+        '''Test that the sparse shared pair counts match the dense ones.'''
+        class shared_pairs_test:
+            def __init__(self, edges):
+                self.edges = edges
+                self.sig_otus = list(set(sum(edges, ())))
+        ros = [shared_pairs_test([('o1','o2'), ('o3','o1')]),
+               shared_pairs_test([('o2','o1'), ('o3','o4')]),
+               shared_pairs_test([('o1','o2'), ('o1','o3')]),
+               shared_pairs_test([])]
+        uids, keys, counts = shared_pair_counts(ros)
+        self.assertEqual(list(uids), ['o1','o2','o3','o4'])
+        self.assertEqual(keys, array([1, 2, 11]))
+        self.assertEqual(counts, array([3, 2, 1]))
+        exp = zeros((4,4))
+        exp[0,1] = 3
+        exp[0,2] = 2
+        exp[2,3] = 1
+        self.assertEqual(shared_pairs(ros), exp)
+        # histogram is the same from the dense or sparse representation
+        self.assertEqual(shared_pairs_histogram(counts, 4), 
+            array([1, 1, 1, 0]))
+        self.assertEqual(shared_pairs_histogram(exp, 4), array([1, 1, 1, 0]))
+
+
 class Timeseries_definitions_test(TestCase):
 
     def setUp(self):
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# file created 10/18/2026
+
+__author__ = "Will Van Treuren"
+__copyright__ = "Copyright 2013, Will Van Treuren"
+__credits__ = ["Will Van Treuren, Sophie Weiss"]
+__license__ = "GPL"
+__url__ = ''
+__version__ = ".9-Dev"
+__maintainer__ = "Will Van Treuren"
+__email__ = "wdwvt1@gmail.com"
+
+'''
+Test the native RMT threshold engine.
+'''
+
+from cogent.util.unit_test import TestCase, main
+from correlations.eval.rmt import (poisson_cdf, goe_cdf, unfolded_spacings,
+    spacing_chisquare, rmt_threshold, rmt_lines, rmt_results)
+from correlations.eval.parse import RMTResults
+from numpy import array, arange, sort, vstack, corrcoef, isnan, exp, zeros
+from numpy.linalg import eigvalsh
+from numpy.random import RandomState
+
+
+class RMTTests(TestCase):
+    '''Test the RMT engine.'''
+
+    def setUp(self):
+        '''Define a table with 5 modules of 20 otus and 100 noise otus.'''
+        prng = RandomState(0)
+        latent = prng.randn(5, 300)
+        self.data = exp(vstack([latent[k//20] + prng.randn(300)*.6 for k in
+            range(100)] + [prng.randn(100, 300)]))
+        self.otu_ids = ['o%s' % i for i in range(200)]
+
+    def test_cdfs(self):
+        '''Test the spacing cdfs at known points.'''
+        self.assertFloatEqual(poisson_cdf(array([0., 1.])), [0., 1-exp(-1)])
+        self.assertFloatEqual(goe_cdf(array([0., 2.])), [0., 1-exp(-3.14159265)])
+
+    def test_spacing_chisquare(self):
+        '''Test GOE and Poisson spectra are told apart.'''
+        prng = RandomState(1)
+        a = prng.randn(300, 300)
+        s = unfolded_spacings(eigvalsh((a + a.T)/2.))
+        self.assertFloatEqual(s.mean(), 1.)
+        self.assertTrue(spacing_chisquare(s, goe_cdf)[1] > .05)
+        self.assertTrue(spacing_chisquare(s, poisson_cdf)[1] < .001)
+        s = unfolded_spacings(sort(prng.rand(300))*10)
+        self.assertTrue(spacing_chisquare(s, goe_cdf)[1] < .001)
+        self.assertTrue(spacing_chisquare(s, poisson_cdf)[1] > .05)
+
+    def test_rmt_threshold(self):
+        '''Test the sweep statistics and independence from procs.'''
+        cor = corrcoef(self.data)
+        thresholds = arange(5, 90, 5)/100.
+        threshold, stats = rmt_threshold(cor, thresholds)
+        self.assertEqual(stats.shape, (17, 6))
+        self.assertEqual(stats[:, 0], thresholds)
+        # fewer otus have edges as the threshold rises
+        self.assertTrue((stats[1:, 1] <= stats[:-1, 1]).all())
+        self.assertTrue(isnan(stats[-1, 2]))
+        # noise correlations are below the chosen threshold
+        self.assertTrue(.1 < threshold < .8)
+        self.assertTrue(stats[thresholds == threshold, 3] > .05)
+        threshold2, stats2 = rmt_threshold(cor, thresholds, procs=2)
+        self.assertEqual(threshold2, threshold)
+        self.assertFloatEqual(stats2[~isnan(stats2)], stats[~isnan(stats)])
+
+    def test_rmt_lines(self):
+        '''Test lines are parsed by RMTResults.'''
+        cor = array([[1., .5, -.7], [.5, 1., .1], [-.7, .1, 1.]])
+        ro = RMTResults(rmt_lines(cor, ['a', 'b', 'c'], .42))
+        self.assertEqual(ro.edges, [('a', 'b'), ('a', 'c')])
+        self.assertFloatEqual(ro.scores, [.5, -.7])
+        self.assertEqual(ro.interactions, ['copresence', 'mutualExclusion'])
+        self.assertFloatEqual(ro.sigs, [.42, .42])
+
+    def test_rmt_results(self):
+        '''Test every within module edge is found.'''
+        ro = rmt_results(self.data, self.otu_ids,
+            thresholds=arange(5, 90, 5)/100.)
+        self.assertTrue(isinstance(ro, RMTResults))
+        self.assertTrue(len(ro.edges) > 0)
+        within = [int(a[1:])//20 == int(b[1:])//20 and int(a[1:]) < 100 for 
+            a, b in ro.edges]
+        self.assertEqual(sum(within), 5*190)
+        self.assertTrue(sum(within) > .8*len(within))
+
+    def test_rmt_results_zero_otu(self):
+        '''Test an otu that is all 0 (nan correlations) gets no edges.'''
+        data = vstack([self.data, zeros((1, 300))])
+        ro = rmt_results(data, self.otu_ids + ['zero'],
+            thresholds=arange(5, 90, 5)/100.)
+        self.assertTrue(len(ro.edges) > 0)
+        self.assertFalse('zero' in ro.sig_otus)
+        self.assertEqual(ro.threshold, rmt_results(self.data, self.otu_ids,
+            thresholds=arange(5, 90, 5)/100.).threshold)
+
+
+if __name__ == '__main__':
+    main()
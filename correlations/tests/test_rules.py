@@ -17,9 +17,10 @@ from os.path import exists, join
 from cogent.util.unit_test import TestCase, main
 from qiime.test import initiate_timeout, disable_timeout
 from correlations.generators.rules import (model1_eval_rule, model1_eval_rules,
-    model1_otu, model2_eval_rules, model2_otu)
-from numpy import array, inf
-from numpy.random import seed
+    model1_otu, model2_eval_rules, model2_otu, model1_rules_matrix, 
+    model2_coefficients, model1_table, model2_table)
+from numpy import array, inf, vstack
+from numpy.random import seed, RandomState
 from numpy.testing import assert_array_almost_equal
 
 from scipy.stats.distributions import lognorm, uniform
@@ -87,6 +88,88 @@ class TestRulesGenerators(TestCase):
         obs = model2_otu(inducer_arr, rules)
         assert_array_almost_equal(obs, exp)
 
+    def test_model1_rules_matrix(self):
+        """Tests rules are evaluated for all inducers and samples at once."""
+        rules = [[0.0,100.0], [30,40], [0.0,0.0]]
+        vals = array([[0.,10.,101.,8.,0.,1.,0.,1.,2.,1.],
+                      [1.,0.,4.,2.,9.,40.,6.,30.,2.,35.],
+                      [0.,4.,9.,0.,0.,0.,2.,0.,0.,8.]])
+        lbs, ubs = zip(*rules)
+        obs = model1_rules_matrix(lbs, ubs, vals)
+        exp = [[model1_eval_rule(r[0], r[1], v) for v in row] for r, row in
+            zip(rules, vals)]
+        assert_array_almost_equal(obs, exp)
+        assert_array_almost_equal(obs.sum(0), [2,1,0,2,2,2,1,3,2,2])
+
+    def test_model1_table(self):
+        """Tests batched model 1 otus match model1_otu."""
+        data = RandomState(0).randint(0, 50, size=(6, 20)).astype(float)
+        weights = array([1.0, .9, .5])
+        rules = [[0.0,25.0], [10,40]]
+        seed(0)
+        exp = model1_otu(data[[1,4]], [lognorm, 2, 0], weights, rules)
+        obs = model1_table(data, [[1,4]], [[0.,10]], [[25.,40]], [weights], 
+            [lognorm, 2, 0], RandomState(0))
+        seed(0)
+        obs2 = model1_table(data, [[1,4]], [[0.,10]], [[25.,40]], [weights], 
+            [lognorm, 2, 0])
+        assert_array_almost_equal(obs2[0], exp)
+        assert_array_almost_equal(obs, obs2)
+        # many otus, rules evaluated in blocks
+        inducers = RandomState(1).randint(0, 6, size=(7, 2))
+        lbs = [[0., 10]]*7
+        ubs = [[25., 40]]*7
+        obs = model1_table(data, inducers, lbs, ubs, [weights]*7, 
+            [lognorm, 2, 0], RandomState(2), otus_per_block=3)
+        exp = model1_table(data, inducers, lbs, ubs, [weights]*7, 
+            [lognorm, 2, 0], RandomState(2))
+        self.assertEqual(obs.shape, (7, 20))
+        assert_array_almost_equal(obs, exp)
+        # a probability of 0 for every count of satisfied rules gives 0s
+        obs = model1_table(data, inducers, lbs, ubs, [[0.,0,0]]*7, 
+            [lognorm, 2, 0], RandomState(2))
+        self.assertTrue((obs == 0).all())
+
+    def test_model2_table(self):
+        """Tests batched model 2 otus match model2_otu."""
+        rules = [[0.4, 'sub'], [2.0, 'add'], [0.5, 'add']]
+        assert_array_almost_equal(model2_coefficients(rules), [-.4, 2., .5])
+        data = array([[0.,10.,101.,8.,0.,1.,0.,1.,2.,1.],
+                      [1.,0.,4.,2.,9.,40.,6.,30.,2.,35.],
+                      [0.,4.,9.,0.,0.,0.,2.,0.,0.,8.]])
+        inducers = [[0,1,2], [2,0,1]]
+        coefs = [model2_coefficients(rules)]*2
+        seed(0)
+        obs = model2_table(data, inducers, coefs, otus_per_block=1)
+        seed(0)
+        exp = vstack([model2_otu(data, rules), model2_otu(data[[2,0,1]], 
+            rules)])
+        assert_array_almost_equal(obs, exp)
+
+    def test_table_manifests(self):
+        """Tests batched rule otus return a manifest of their inducers."""
+        data = RandomState(0).randint(0, 50, size=(3, 10)).astype(float)
+        ids = ['a', 'b', 'c', 'n0', 'n1']
+        coefs = [[-.4, 2.], [.5, 1.]]
+        obs, m = model2_table(data, [[0, 1], [2, 0]], coefs, RandomState(0),
+            otu_ids=ids)
+        assert_array_almost_equal(obs, model2_table(data, [[0, 1], [2, 0]], 
+            coefs, RandomState(0)))
+        self.assertEqual(m.blocks[0][:4], ('rules_model2', 3, 5, 2))
+        self.assertEqual(list(m.i), [0, 1, 2, 0])
+        self.assertEqual(list(m.j), [3, 3, 4, 4])
+        self.assertEqual(list(m.signs), [-1, 1, 1, 1])
+        assert_array_almost_equal(m.strengths, [.4, 2., .5, 1.])
+        obs, m = model1_table(data, [[1, 2]], [[0., 10]], [[25., 40]], 
+            [[1., .9, .5]], [lognorm, 2, 0], RandomState(0), 
+            otu_ids=ids[:4])
+        self.assertEqual(obs.shape, (1, 10))
+        self.assertEqual((list(m.i), list(m.j), list(m.signs)), ([1, 2], 
+            [3, 3], [0, 0]))
+        self.assertRaises(ValueError, model2_table, data, [[0, 1]], [[1., 1]],
+            otu_ids=ids)
+
+
 
 
 
@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+# file created 10/18/2026
+
+__author__ = "Will Van Treuren"
+__copyright__ = "Copyright 2013, Will Van Treuren"
+__credits__ = ["Will Van Treuren, Sophie Weiss"]
+__license__ = "GPL"
+__url__ = ''
+__version__ = ".9-Dev"
+__maintainer__ = "Will Van Treuren"
+__email__ = "wdwvt1@gmail.com"
+
+'''
+Test the native SparCC implementation.
+'''
+
+from cogent.util.unit_test import TestCase, main
+from correlations.eval.sparcc import (dirichlet_fractions, variation_matrix,
+    basis_variances, sparcc, sparcc_pvals, sparcc_results, permute_table,
+    clr_correlation)
+from correlations.eval.parse import SparCCResults
+from numpy import vstack, log, var, ones, diag, sort, corrcoef
+from numpy.linalg import solve
+from numpy.random import RandomState
+
+
+class SparCCTests(TestCase):
+    '''Test the SparCC engine.'''
+
+    def setUp(self):
+        '''Define a table where otus 0 and 1 are strongly correlated.'''
+        prng = RandomState(0)
+        base = prng.randint(50, 500, size=40)
+        self.counts = vstack([base, base*2 + prng.randint(0, 20, size=40),
+            prng.randint(50, 500, size=(28, 40))]).astype(float)
+        self.otu_ids = ['o%s' % i for i in range(30)]
+
+    def test_dirichlet_fractions(self):
+        '''Test fractions sum to one in every sample.'''
+        obs = dirichlet_fractions(self.counts, RandomState(1))
+        self.assertEqual(obs.shape, self.counts.shape)
+        self.assertFloatEqual(obs.sum(0), ones(40))
+        obs = dirichlet_fractions(self.counts, RandomState(1), size=3)
+        self.assertEqual(obs.shape, (3, 30, 40))
+        self.assertFloatEqual(obs.sum(1), ones((3, 40)))
+
+    def test_variation_matrix(self):
+        '''Test variation matrix matches the pairwise definition.'''
+        lf = log(dirichlet_fractions(self.counts, RandomState(1), size=2))
+        obs = variation_matrix(lf)
+        for b in range(2):
+            for i in range(0, 30, 7):
+                for j in range(30):
+                    self.assertFloatEqual(obs[b, i, j],
+                        var(lf[b, i] - lf[b, j], ddof=1))
+        self.assertFloatEqual(variation_matrix(lf[0]), obs[0])
+
+    def test_basis_variances(self):
+        '''Test the Woodbury solve matches a dense solve of the system.'''
+        lf = log(dirichlet_fractions(self.counts, RandomState(1)))
+        T = variation_matrix(lf)
+        excluded = [(0, 1), (2, 5)]
+        M = ones((30, 30)) + diag(ones(30)*28.)
+        for i, j in excluded:
+            T[i, j] = T[j, i] = 0.
+            M[i, i] -= 1
+            M[j, j] -= 1
+            M[i, j] -= 1
+            M[j, i] -= 1
+        exp = solve(M, T.sum(1))
+        exp[exp <= 0] = 1e-10
+        self.assertFloatEqual(basis_variances(T, excluded), exp)
+        # dropped components are replaced by identity rows
+        T[3, :] = T[:, 3] = 0.
+        M[3, :] = M[:, 3] = 0.
+        M[3, 3] = 1.
+        exp = solve(M, T.sum(1))
+        exp[exp <= 0] = 1e-10
+        self.assertFloatEqual(basis_variances(T, excluded, [3]), exp)
+
+    def test_clr_correlation(self):
+        '''Test clr correlations from T match those of the clr data.'''
+        lf = log(dirichlet_fractions(self.counts, RandomState(1)))
+        clr = lf - lf.mean(0)
+        self.assertFloatEqual(clr_correlation(variation_matrix(lf)),
+            corrcoef(clr))
+
+    def test_permute_table(self):
+        '''Test otu values are shuffled within their own row.'''
+        obs = permute_table(self.counts, RandomState(1))
+        self.assertEqual(sort(obs, 1), sort(self.counts, 1))
+        self.assertFalse((obs == self.counts).all())
+
+    def test_sparcc(self):
+        '''Test the correlated pair is recovered and result is deterministic.'''
+        obs = sparcc(self.counts, iterations=10, batch=3, prng=RandomState(1))
+        self.assertEqual(obs.shape, (30, 30))
+        self.assertFloatEqual(obs, obs.T)
+        self.assertFloatEqual(obs.diagonal(), ones(30))
+        self.assertTrue(obs[0, 1] > .9)
+        off = abs(obs - diag(obs.diagonal()))
+        off[0, 1] = off[1, 0] = 0.
+        self.assertTrue(off.max() < .6)
+        # batching changes memory use, not the draws
+        self.assertFloatEqual(obs, sparcc(self.counts, iterations=10,
+            batch=1, prng=RandomState(1)))
+
+    def test_sparcc_pvals(self):
+        '''Test pseudo p-values and independence from the number of procs.'''
+        cor = sparcc(self.counts, iterations=5, prng=RandomState(1))
+        obs = sparcc_pvals(self.counts, cor, num_bootstraps=20, seed=2,
+            iterations=5)
+        self.assertEqual(obs[0, 1], 0.)
+        self.assertTrue(((obs >= 0) & (obs <= 1)).all())
+        obs2 = sparcc_pvals(self.counts, cor, num_bootstraps=20, procs=2,
+            seed=2, iterations=5)
+        self.assertFloatEqual(obs, obs2)
+
+    def test_sparcc_results(self):
+        '''Test a SparCCResults object with the correlated edge is made.'''
+        obs = sparcc_results(self.counts, self.otu_ids, sig_lvl=.05,
+            num_bootstraps=20, seed=3, iterations=5)
+        self.assertTrue(isinstance(obs, SparCCResults))
+        self.assertTrue(('o0', 'o1') in obs.edges)
+        self.assertEqual(obs.interactions[obs.edges.index(('o0', 'o1'))],
+            'copresence')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+# file created 10/18/2026
+
+__author__ = "Will Van Treuren"
+__copyright__ = "Copyright 2013, Will Van Treuren"
+__credits__ = ["Will Van Treuren, Sophie Weiss"]
+__license__ = "GPL"
+__url__ = ''
+__version__ = ".9-Dev"
+__maintainer__ = "Will Van Treuren"
+__email__ = "wdwvt1@gmail.com"
+
+'''
+Test generator utilities and the blocked selection they use.
+'''
+
+from cogent.util.unit_test import TestCase, main
+from correlations.generators.util import (choose_indices, zero_inflate,
+    coercive_zero_inflation, subtraction_zero_inflation)
+from correlations.util import kth_range, kth_smallest
+from numpy import arange, zeros, unique, float64, sort, where
+from numpy.lib.format import open_memmap
+from numpy.random import RandomState
+from numpy.testing import assert_array_almost_equal
+from tempfile import mkdtemp
+from shutil import rmtree
+from os.path import join
+
+class TestZeroInflation(TestCase):
+
+    def setUp(self):
+        '''Data used by several tests.'''
+        self.data = arange(1., 51.).reshape(5, 10)
+
+    def test_choose_indices(self):
+        '''Test distinct indices are chosen uniformly.'''
+        prng = RandomState(0)
+        for n, k in [(10, 0), (10, 3), (10, 8), (10, 10), (1000, 17)]:
+            obs = choose_indices(n, k, prng)
+            self.assertEqual(len(unique(obs)), k)
+            self.assertTrue(((obs >= 0) & (obs < n)).all())
+        counts = zeros(10)
+        for i in range(3000):
+            counts[choose_indices(10, 3, prng)] += 1
+        assert_array_almost_equal(counts/3000., [.3]*10, 1)
+        self.assertRaises(ValueError, choose_indices, 3, 4)
+
+    def test_zero_inflate(self):
+        '''Test zero_inflate sets exactly the requested entries to 0.'''
+        obs = zero_inflate(self.data.copy(), 20, prng=RandomState(0))
+        self.assertEqual((obs == 0).sum(), 20)
+        assert_array_almost_equal(obs[obs != 0], self.data[obs != 0])
+        # only nonzero entries are chosen
+        data = self.data.copy()
+        data[:, :5] = 0
+        obs = zero_inflate(data, 20, nonzero_only=True, prng=RandomState(0))
+        self.assertEqual((obs == 0).sum(), 45)
+        self.assertRaises(ValueError, zero_inflate, data, 26, True)
+
+    def test_zero_inflate_blocks(self):
+        '''Test blocks of rows give an exact, uniform sample of entries.'''
+        prng = RandomState(1)
+        counts = zeros(self.data.shape)
+        for i in range(2000):
+            obs = zero_inflate(self.data.copy(), 15, rows_per_block=2,
+                prng=prng)
+            self.assertEqual((obs == 0).sum(), 15)
+            counts += obs == 0
+        assert_array_almost_equal(counts/2000., zeros(counts.shape)+.3, 1)
+
+    def test_coercive_zero_inflation(self):
+        '''Test coercive_zero_inflation on arrays and memmaps.'''
+        obs = coercive_zero_inflation(self.data, .4, prng=RandomState(0))
+        self.assertEqual((obs == 0).sum(), 20)
+        self.assertEqual((self.data == 0).sum(), 0)
+        data = self.data.copy()
+        data[0] = 0
+        obs = coercive_zero_inflation(data, .5, exact=True,
+            prng=RandomState(0))
+        self.assertEqual((obs == 0).sum(), 25)
+        self.assertRaises(ValueError, coercive_zero_inflation, data, .1, True)
+        tmp_dir = mkdtemp()
+        try:
+            mm = open_memmap(join(tmp_dir, 'd.npy'), mode='w+', dtype=float64,
+                shape=self.data.shape)
+            mm[:] = self.data
+            coercive_zero_inflation(mm, .4, rows_per_block=2, in_place=True,
+                prng=RandomState(0))
+            self.assertEqual((mm == 0).sum(), 20)
+            del mm
+        finally:
+            rmtree(tmp_dir)
+
+    def test_kth_smallest(self):
+        '''Test selection with and without blocks matches sorting.'''
+        prng = RandomState(0)
+        data = prng.lognormal(size=(40, 25)).round(1)
+        exp = sort(data.ravel())
+        for k in [0, 1, 333, 500, 999]:
+            self.assertEqual(kth_smallest(data, k), exp[k])
+            self.assertEqual(kth_smallest(data, k, rows_per_block=7,
+                bins=8, max_candidates=10), exp[k])
+        self.assertEqual(kth_smallest(zeros((4, 4))+2., 5, 2), 2.)
+        self.assertRaises(ValueError, kth_smallest, data, 1000)
+
+    def test_kth_range(self):
+        '''Test the candidate range holds the kth value and few others.'''
+        prng = RandomState(0)
+        data = prng.rand(200, 50)
+        exp = sort(data.ravel())
+        for k in [0, 4321, 9999]:
+            for max_candidates in [2**22, 500, 10]:
+                lo, hi, closed, below = kth_range(data, k, 30, 16, 
+                    max_candidates)
+                in_range = (data >= lo) & ((data <= hi) if closed else 
+                    (data < hi))
+                self.assertTrue(in_range.sum() <= max_candidates)
+                self.assertEqual(below, (data < lo).sum())
+                self.assertTrue(lo <= exp[k] and (exp[k] < hi or closed))
+        # ties can't be split below max_candidates
+        lo, hi, closed, below = kth_range(zeros((4, 4)) + 2., 5, 2, 16, 3)
+        self.assertEqual((lo, hi, closed, below), (2., 2., True, 0))
+
+    def test_subtraction_zero_inflation(self):
+        '''Test the threshold is subtracted in one pass or in place.'''
+        prng = RandomState(0)
+        data = prng.lognormal(size=(40, 25))
+        x = sort(data.ravel())[599]
+        obs, obs_x = subtraction_zero_inflation(data, .6)
+        self.assertEqual(obs_x, x)
+        assert_array_almost_equal(obs, where(data - x > 0, data - x, 0))
+        self.assertEqual((obs == 0).sum(), 600)
+        tmp = data.copy()
+        obs, obs_x = subtraction_zero_inflation(tmp, .6, out=tmp,
+            rows_per_block=3)
+        self.assertTrue(obs is tmp)
+        self.assertEqual(obs_x, x)
+        assert_array_almost_equal(tmp, where(data - x > 0, data - x, 0))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
 #!/usr/bin/env python
 
 import re
+from numpy import zeros, concatenate, int64, linspace, searchsorted, bincount
 
 def find_table_number(fp, ind=0):
     '''find the table number from a filepath.'''
@@ -21,4 +22,78 @@ def get_table_fp_with_number(tables, number):
         file_name = table.rsplit('/', 1)[-1]
         if find_table_number(file_name) == number:
             return table #table is the file name plus the full path
-    raise ValueError('Table with number: %s not found' % number)
\ No newline at end of file
+    raise ValueError('Table with number: %s not found' % number)
+
+def _in_range(block, lo, hi, closed):
+    '''Return a mask of values of block in [lo, hi] (closed) or [lo, hi).'''
+    return (block >= lo) & ((block <= hi) if closed else (block < hi))
+
+def kth_range(data, k, rows_per_block, bins=1024, max_candidates=2**22):
+    '''Return a range holding the kth smallest value and few other values.
+
+    Each pass over the blocks of rows of data histograms the values in the 
+    current range and narrows it to the bin holding the kth value, until at 
+    most max_candidates values are in range (or the bin can't be split any 
+    further, e.g. ties).
+    Outputs:
+     lo, hi, closed - the range is [lo, hi] if closed, otherwise [lo, hi).
+     below - int, number of values of data smaller than lo.
+    '''
+    blocks = range(0, data.shape[0], rows_per_block)
+    lo = min([data[a:a+rows_per_block].min() for a in blocks])
+    hi = max([data[a:a+rows_per_block].max() for a in blocks])
+    closed, below = True, 0
+    while lo != hi:
+        # number of values below lo and in each bin of the range. bins are
+        # [edges[b], edges[b+1]), the last one is closed if the range is.
+        # edges have the dtype of data so all comparisons are made the same way
+        edges = linspace(lo, hi, bins+1).astype(data.dtype)
+        below, counts = 0, zeros(bins, dtype=int64)
+        for a in blocks:
+            block = data[a:a+rows_per_block]
+            below += (block < lo).sum()
+            vals = block[_in_range(block, lo, hi, closed)]
+            inds = (searchsorted(edges, vals, 'right') - 1).clip(0, bins-1)
+            counts += bincount(inds, minlength=bins)
+        b = (below + counts.cumsum() > k).argmax()
+        if b < bins-1:
+            new = edges[b], edges[b+1], False
+        else:
+            new = edges[b], hi, closed
+        if new == (lo, hi, closed):
+            # bins are too narrow to split in floating point
+            break
+        below += counts[:b].sum()
+        lo, hi, closed = new
+        if counts[b] <= max_candidates:
+            break
+    return lo, hi, closed, below
+
+def kth_smallest(data, k, rows_per_block=None, bins=1024, 
+    max_candidates=2**22):
+    '''Return the kth smallest (0 indexed) value of data.
+
+    Without rows_per_block the flattened data is partitioned (linear time, 
+    one copy of data). With rows_per_block data is only read in blocks of 
+    rows: kth_range narrows the range holding the kth value until at most 
+    max_candidates values are in it, and those are collected and 
+    partitioned. Memory is bounded by a block and the candidates.
+    '''
+    if not 0 <= k < data.size:
+        raise ValueError('k must be in [0, %s).' % data.size)
+    if rows_per_block is None:
+        tmp = data.ravel().copy()
+        tmp.partition(k)
+        return tmp[k]
+    lo, hi, closed, below = kth_range(data, k, rows_per_block, bins, 
+        max_candidates)
+    if lo == hi:
+        return lo
+    # every value in range is a candidate, k - below of them are smaller
+    candidates = []
+    for a in range(0, data.shape[0], rows_per_block):
+        block = data[a:a+rows_per_block]
+        candidates.append(block[_in_range(block, lo, hi, closed)])
+    candidates = concatenate(candidates)
+    candidates.partition(k - below)
+    return candidates[k - below]
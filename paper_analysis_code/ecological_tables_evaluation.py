@@ -3,7 +3,8 @@
 from biom.parse import parse_biom_table
 from correlations.eval.parse import (sparcc_maker, conet_maker, rmt_maker, 
     lsa_maker, naive_maker, bray_curtis_maker, mic_maker)
-from correlations.eval.result_eval import (interacting_edges)
+from correlations.eval.result_eval import (block_interacting_edges, 
+    manifest_edge_counts)
 import os
 from numpy import cumsum
 from collections import Counter
@@ -234,7 +235,7 @@ def get_params_from_methods(methods):
     method_names, strengths, dims = map(list, zip(*tmp))
     return method_names, strengths, dims
 
-def count_ecological_edges(methods, num_ees, ro):
+def count_ecological_edges(methods, num_ees, ro, manifest=None):
     '''Automates counting of ecological edges.
 
     Inputs:
@@ -244,12 +245,18 @@ def count_ecological_edges(methods, num_ees, ro):
      num_ees - list of ints. numbers of otus that are generated by each 
       method in the methods list.
      ro - result object.
+     manifest - Manifest or None, ground truth of the table. if passed edges
+      are joined against it rather than found from otu names.
     '''
+    method_names, strengths, dims = get_params_from_methods(methods)
+    if manifest is not None:
+        edge_counts = manifest_edge_counts(manifest, ro.edges, 
+            ro.interactions)
+        return (method_names, strengths, dims, edge_counts, len(ro.edges))
     starts = cumsum([0]+num_ees[:-1]) #add a 0 entry for start indices
     stops = cumsum(num_ees)
-    method_names, strengths, dims = get_params_from_methods(methods)
-    edge_counts = [interacting_edges(starts[i], stops[i], dims[i], ro.edges, 
-        ro.interactions) for i in range(len(num_ees))] 
+    edge_counts = block_interacting_edges(starts, stops, dims, ro.edges, 
+        ro.interactions)
     return (method_names, strengths, dims, edge_counts, len(ro.edges))
 
 def calc_tpe(ee, dim):